@@ -1,7 +1,8 @@
 import multiprocessing
+import os
 
 bind = "0.0.0.0:42110"
-workers = 4
+workers = int(os.getenv("WEB_CONCURRENCY", 4))
 worker_class = "uvicorn.workers.UvicornWorker"
 timeout = 120
 keep_alive = 60
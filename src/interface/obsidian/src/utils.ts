@@ -36,9 +36,13 @@ export async function updateContentIndex(vault: Vault, setting: KhojSetting, las
     let countOfFilesToIndex = 0;
     let countOfFilesToDelete = 0;
 
+    // Only upload files that are new or changed since they were last indexed on the Khoj server
+    const filesToIndex = regenerate ? null : await getFilesToUpload(vault, setting, files, binaryFileTypes);
+
     // Add all files to index as multipart form data
     const formData = new FormData();
     for (const file of files) {
+        if (filesToIndex && !filesToIndex.has(file.path)) continue;
         countOfFilesToIndex++;
         const encoding = binaryFileTypes.includes(file.extension) ? "binary" : "utf8";
         const mimeType = fileExtensionToMimeType(file.extension) + (encoding === "utf8" ? "; charset=UTF-8" : "");
@@ -54,6 +58,11 @@ export async function updateContentIndex(vault: Vault, setting: KhojSetting, las
         }
     }
 
+    if (countOfFilesToIndex === 0 && countOfFilesToDelete === 0) {
+        console.log(`✅ Khoj content index is up to date.`);
+        return files;
+    }
+
     // Call Khoj backend to update index with all markdown, pdf files
     const response = await fetch(`${setting.khojUrl}/api/v1/index/update?force=${regenerate}&client=obsidian`, {
         method: 'POST',
@@ -72,6 +81,38 @@ export async function updateContentIndex(vault: Vault, setting: KhojSetting, las
     return files;
 }
 
+async function hashContent(content: string | ArrayBuffer): Promise<string> {
+    const data = typeof content === 'string' ? new TextEncoder().encode(content) : content;
+    const digest = await crypto.subtle.digest('SHA-256', data);
+    return Array.from(new Uint8Array(digest)).map(byte => byte.toString(16).padStart(2, '0')).join('');
+}
+
+async function getFilesToUpload(vault: Vault, setting: KhojSetting, files: TFile[], binaryFileTypes: string[]): Promise<Set<string> | null> {
+    // Send content hashes of files to Khoj server to get files it needs to index
+    const fileHashes: { path: string, hash: string }[] = [];
+    for (const file of files) {
+        const fileContent = binaryFileTypes.includes(file.extension) ? await vault.readBinary(file) : await vault.read(file);
+        fileHashes.push({ path: file.path, hash: await hashContent(fileContent) });
+    }
+
+    try {
+        const response = await fetch(`${setting.khojUrl}/api/v1/index/sync?client=obsidian`, {
+            method: 'POST',
+            headers: {
+                'Authorization': `Bearer ${setting.khojApiKey}`,
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ files: fileHashes }),
+        });
+        // Upload all files if Khoj server does not support syncing only changed files
+        if (!response.ok) return null;
+        return new Set((await response.json()).upload);
+    } catch (error) {
+        console.error(`Khoj: Failed to get files to sync from Khoj server. Uploading all files.\n${error}`);
+        return null;
+    }
+}
+
 export async function createNote(name: string, newLeaf = false): Promise<void> {
     try {
       let pathPrefix: string
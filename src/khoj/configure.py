@@ -19,17 +19,27 @@ from starlette.requests import HTTPConnection
 
 from khoj.database.adapters import (
     ConversationAdapters,
+    EntryAdapters,
     SubscriptionState,
     aget_user_subscription_state,
     get_all_users,
     get_or_create_search_models,
+    get_search_model,
+    get_user_search_model_or_default,
 )
 from khoj.database.models import KhojUser, Subscription
 from khoj.processor.embeddings import CrossEncoderModel, EmbeddingsModel
-from khoj.routers.indexer import configure_content, configure_search, load_content
+from khoj.processor.inference import RemoteCrossEncoderModel, RemoteEmbeddingsModel
+from khoj.routers.indexer import (
+    configure_content,
+    configure_search,
+    load_content,
+    notify_index_workers,
+)
 from khoj.utils import constants, state
 from khoj.utils.config import SearchType
 from khoj.utils.fs_syncer import collect_files
+from khoj.utils.helpers import ModelRegistry
 from khoj.utils.rawconfig import FullConfig
 
 logger = logging.getLogger(__name__)
@@ -119,6 +129,9 @@ def initialize_server(config: Optional[FullConfig]):
     except Exception as e:
         logger.error(f"🚨 Failed to configure server on app load: {e}", exc_info=True)
 
+    # Resume processing index jobs queued before the server restarted
+    notify_index_workers()
+
 
 def configure_server(
     config: FullConfig,
@@ -139,13 +152,23 @@ def configure_server(
 
     # Initialize Search Models from Config and initialize content
     try:
-        search_models = get_or_create_search_models()
-        state.embeddings_model = dict()
-        state.cross_encoder_model = dict()
-
-        for model in search_models:
-            state.embeddings_model.update({model.name: EmbeddingsModel(model.bi_encoder)})
-            state.cross_encoder_model.update({model.name: CrossEncoderModel(model.cross_encoder)})
+        get_or_create_search_models()
+        # Load search models on first use. Evict least recently used models to stay within the memory budget
+        models_memory_bytes = int(os.getenv("KHOJ_SEARCH_MODELS_MEMORY_MB", 1024)) * 1024 * 1024
+        if state.inference_client:
+            # Use search models served by the inference server, shared by all server workers on this machine
+            client = state.inference_client
+            state.embeddings_model = ModelRegistry(lambda name: RemoteEmbeddingsModel(name, client))
+            state.cross_encoder_model = ModelRegistry(lambda name: RemoteCrossEncoderModel(name, client))
+        else:
+            state.embeddings_model = ModelRegistry(load_embeddings_model, models_memory_bytes, name="embeddings models")
+            state.cross_encoder_model = ModelRegistry(
+                load_cross_encoder_model, models_memory_bytes, name="cross-encoder models"
+            )
+            # Load the default search model in the background to serve the first search request faster
+            default_search_model = get_user_search_model_or_default()
+            state.embeddings_model.preload(default_search_model.name)
+            state.cross_encoder_model.preload(default_search_model.name)
 
         state.SearchType = configure_search_types()
         state.search_models = configure_search(state.search_models, state.config.search_type)
@@ -154,6 +177,17 @@ def configure_server(
         raise e
 
 
+def load_embeddings_model(name: str) -> EmbeddingsModel:
+    search_model = get_search_model(name)
+    embeddings_model = EmbeddingsModel(search_model.bi_encoder, search_model.bi_encoder_backend)
+    EntryAdapters.set_search_model_dimensions(search_model, embeddings_model.dimensions)
+    return embeddings_model
+
+
+def load_cross_encoder_model(name: str) -> CrossEncoderModel:
+    return CrossEncoderModel(get_search_model(name).cross_encoder)
+
+
 def initialize_content(regenerate: bool, search_type: Optional[SearchType] = None, init=False, user: KhojUser = None):
     # Initialize Content from Config
     if state.search_models:
@@ -163,7 +197,7 @@ def initialize_content(regenerate: bool, search_type: Optional[SearchType] = Non
                 state.content_index = load_content(state.config.content_type, state.content_index, state.search_models)
             else:
                 logger.info("📬 Updating content index...")
-                all_files = collect_files(user=user)
+                all_files = collect_files(user=user, regenerate=regenerate)
                 state.content_index, status = configure_content(
                     state.content_index,
                     state.config.content_type,
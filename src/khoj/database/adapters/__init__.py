@@ -1,27 +1,51 @@
+from __future__ import annotations  # to avoid quoting type hints
+
+import hashlib
 import math
 import random
 import secrets
 import sys
 from datetime import date, datetime, timedelta, timezone
 from enum import Enum
-from typing import List, Optional, Type
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set, Type
 
+import numpy as np
 from asgiref.sync import sync_to_async
 from django.contrib.sessions.backends.db import SessionStore
-from django.db import models
-from django.db.models import Q
+from django.db import connection, models, transaction
+from django.db.models import (
+    BooleanField,
+    Case,
+    Exists,
+    F,
+    FloatField,
+    Func,
+    OuterRef,
+    Q,
+    Value,
+    When,
+)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
 from django.db.models.manager import BaseManager
 from fastapi import HTTPException
-from pgvector.django import CosineDistance
-from torch import Tensor
+from pgvector.django import CosineDistance, VectorField
+from pgvector.utils import to_db
 
 from khoj.database.models import (
+    BitVectorField,
     ChatModelOptions,
     Conversation,
+    EmbeddingsCache,
     Entry,
+    EntryDates,
     GithubConfig,
     GithubRepoConfig,
     GoogleUser,
+    HalfVectorField,
+    IndexedFile,
+    IndexJob,
     KhojApiUser,
     KhojUser,
     NotionConfig,
@@ -40,7 +64,17 @@ from khoj.search_filter.file_filter import FileFilter
 from khoj.search_filter.word_filter import WordFilter
 from khoj.utils import state
 from khoj.utils.config import GPT4AllProcessorModel
-from khoj.utils.helpers import generate_random_name
+from khoj.utils.helpers import batcher, generate_random_name
+from khoj.utils.vector_index import UserVectorIndex
+
+if TYPE_CHECKING:
+    from torch import Tensor
+
+
+class HammingDistance(Func):
+    function = ""
+    arg_joiner = " <~> "
+    output_field = FloatField()
 
 
 class SubscriptionState(Enum):
@@ -261,6 +295,11 @@ def get_user_search_model_or_default(user=None):
     return SearchModelConfig.objects.first()
 
 
+async def aget_user_search_model_or_default(user=None):
+    # Not thread sensitive to look up search models of concurrent requests in parallel
+    return await sync_to_async(get_user_search_model_or_default, thread_sensitive=False)(user)
+
+
 def get_or_create_search_models():
     search_models = SearchModelConfig.objects.all()
     if search_models.count() == 0:
@@ -270,6 +309,13 @@ def get_or_create_search_models():
     return search_models
 
 
+def get_search_model(name: str) -> SearchModelConfig:
+    search_model = SearchModelConfig.objects.filter(name=name).first()
+    if not search_model:
+        raise KeyError(f"Search model {name} not found")
+    return search_model
+
+
 async def aset_user_search_model(user: KhojUser, search_model_config_id: int):
     config = await SearchModelConfig.objects.filter(id=search_model_config_id).afirst()
     if not config:
@@ -456,6 +502,22 @@ class EntryAdapters:
     word_filer = WordFilter()
     file_filter = FileFilter()
     date_filter = DateFilter()
+    # Key of Postgres advisory lock held while building vector indexes
+    vector_index_lock_id = 5_640_002
+    _pgvector_version: Optional[tuple[int, ...]] = None
+
+    @staticmethod
+    def bump_index_generation(user: KhojUser):
+        "Mark index of user as changed. Invalidates search results cached for the previous index generation"
+        if user is None:
+            return
+        KhojUser.objects.filter(id=user.id).update(index_generation=F("index_generation") + 1)
+
+    @staticmethod
+    async def abump_index_generation(user: KhojUser):
+        if user is None:
+            return
+        await KhojUser.objects.filter(id=user.id).aupdate(index_generation=F("index_generation") + 1)
 
     @staticmethod
     def does_entry_exist(user: KhojUser, hashed_value: str) -> bool:
@@ -480,6 +542,7 @@ class EntryAdapters:
             deleted_count, _ = Entry.objects.filter(user=user).delete()
         else:
             deleted_count, _ = Entry.objects.filter(user=user, file_source=file_source).delete()
+        EntryAdapters.bump_index_generation(user)
         return deleted_count
 
     @staticmethod
@@ -490,6 +553,40 @@ class EntryAdapters:
     def delete_entry_by_hash(user: KhojUser, hashed_values: List[str]):
         Entry.objects.filter(user=user, hashed_value__in=hashed_values).delete()
 
+    @staticmethod
+    def get_existing_entry_hashes(user: KhojUser, file_type: str, hashed_values: Iterable[str]) -> Set[str]:
+        "Get which of the entry hashes are already indexed for user in a single query"
+        existing_entries = Entry.objects.filter(user=user, file_type=file_type).filter(
+            RawSQL(f'"{Entry._meta.db_table}"."hashed_value" = ANY(%s)', (list(hashed_values),), BooleanField())
+        )
+        return set(existing_entries.values_list("hashed_value", flat=True))
+
+    @staticmethod
+    def delete_stale_entries_by_file(user: KhojUser, hashes_by_file: Dict[str, Set[str]]) -> int:
+        "Delete indexed entries of files that are not in their current entries. Compare all files in a single query"
+        file_paths = [file_path for file_path, hashes in hashes_by_file.items() for _ in hashes]
+        hashed_values = [hashed_value for hashes in hashes_by_file.values() for hashed_value in hashes]
+        table = Entry._meta.db_table
+        is_current_entry = RawSQL(
+            f"EXISTS (SELECT 1 FROM unnest(%s::text[], %s::text[]) AS current_entry(file_path, hashed_value) "
+            f'WHERE current_entry.file_path = "{table}"."file_path" '
+            f'AND current_entry.hashed_value = "{table}"."hashed_value")',
+            (file_paths, hashed_values),
+            BooleanField(),
+        )
+        stale_entries = (
+            Entry.objects.filter(user=user)
+            .filter(RawSQL(f'"{table}"."file_path" = ANY(%s)', (list(hashes_by_file),), BooleanField()))
+            .exclude(is_current_entry)
+        )
+        _, deleted_count_by_model = stale_entries.delete()
+        return deleted_count_by_model.get(Entry._meta.label, 0)
+
+    @staticmethod
+    def delete_entries_by_files(user: KhojUser, file_paths: Iterable[str]) -> int:
+        _, deleted_count_by_model = Entry.objects.filter(user=user, file_path__in=list(file_paths)).delete()
+        return deleted_count_by_model.get(Entry._meta.label, 0)
+
     @staticmethod
     def get_entries_by_date_filter(entry: BaseManager[Entry], start_date: date, end_date: date):
         return entry.filter(
@@ -507,7 +604,9 @@ class EntryAdapters:
 
     @staticmethod
     async def adelete_entry_by_file(user: KhojUser, file_path: str):
-        return await Entry.objects.filter(user=user, file_path=file_path).adelete()
+        deleted = await Entry.objects.filter(user=user, file_path=file_path).adelete()
+        await EntryAdapters.abump_index_generation(user)
+        return deleted
 
     @staticmethod
     def aget_all_filenames_by_source(user: KhojUser, file_source: str):
@@ -519,7 +618,9 @@ class EntryAdapters:
 
     @staticmethod
     async def adelete_all_entries(user: KhojUser):
-        return await Entry.objects.filter(user=user).adelete()
+        deleted = await Entry.objects.filter(user=user).adelete()
+        await EntryAdapters.abump_index_generation(user)
+        return deleted
 
     @staticmethod
     def get_size_of_indexed_data_in_mb(user: KhojUser):
@@ -527,6 +628,22 @@ class EntryAdapters:
         total_size = sum(sys.getsizeof(entry.compiled) for entry in entries)
         return total_size / 1024 / 1024
 
+    @staticmethod
+    def word_filter_condition(word: str) -> Q:
+        "Case-insensitive match of word in raw entry. Uses ILIKE over the raw entry to use its trigram index"
+        pattern = f"%{EntryAdapters.word_filer.escape_like(word)}%"
+        return Q(RawSQL(f'"{Entry._meta.db_table}"."raw" ILIKE %s', (pattern,), output_field=BooleanField()))
+
+    @staticmethod
+    def file_filter_condition(matcher: Dict[str, str]) -> Q:
+        "Match file path of entries. Substring and regex matches use the trigram index on file path"
+        condition = Q()
+        if "contains" in matcher:
+            condition &= Q(file_path__contains=matcher["contains"])
+        if "regex" in matcher:
+            condition &= Q(file_path__regex=matcher["regex"])
+        return condition
+
     @staticmethod
     def apply_filters(user: KhojUser, query: str, file_type_filter: str = None):
         q_filter_terms = Q()
@@ -540,28 +657,34 @@ class EntryAdapters:
 
         for term in explicit_word_terms:
             if term.startswith("+"):
-                q_filter_terms &= Q(raw__icontains=term[1:])
+                q_filter_terms &= EntryAdapters.word_filter_condition(term[1:])
             elif term.startswith("-"):
-                q_filter_terms &= ~Q(raw__icontains=term[1:])
+                q_filter_terms &= ~EntryAdapters.word_filter_condition(term[1:])
 
         q_file_filter_terms = Q()
 
         if len(file_filters) > 0:
-            for term in file_filters:
-                q_file_filter_terms |= Q(file_path__regex=term)
+            for matcher in EntryAdapters.file_filter.get_file_path_matchers(query):
+                q_file_filter_terms |= EntryAdapters.file_filter_condition(matcher)
 
             q_filter_terms &= q_file_filter_terms
 
         if len(date_filters) > 0:
             min_date, max_date = date_filters
+            # Use indexed date bounds of entries to find candidate entries.
+            # Then check candidate entries have a date in range, without joining (and multiplying) entries with their dates
+            dates_in_range = EntryDates.objects.filter(entry=OuterRef("pk"))
             if min_date is not None:
                 # Convert the min_date timestamp to yyyy-mm-dd format
                 formatted_min_date = date.fromtimestamp(min_date).strftime("%Y-%m-%d")
-                q_filter_terms &= Q(embeddings_dates__date__gte=formatted_min_date)
+                q_filter_terms &= Q(max_date__gte=formatted_min_date)
+                dates_in_range = dates_in_range.filter(date__gte=formatted_min_date)
             if max_date is not None:
                 # Convert the max_date timestamp to yyyy-mm-dd format
                 formatted_max_date = date.fromtimestamp(max_date).strftime("%Y-%m-%d")
-                q_filter_terms &= Q(embeddings_dates__date__lte=formatted_max_date)
+                q_filter_terms &= Q(min_date__lte=formatted_max_date)
+                dates_in_range = dates_in_range.filter(date__lte=formatted_max_date)
+            q_filter_terms &= Q(Exists(dates_in_range))
 
         relevant_entries = Entry.objects.filter(user=user).filter(
             q_filter_terms,
@@ -571,25 +694,445 @@ class EntryAdapters:
         return relevant_entries
 
     @staticmethod
-    def search_with_embeddings(
+    def get_vector_index_name(search_model: SearchModelConfig, storage: str = None) -> str:
+        storage = storage or search_model.embeddings_storage
+        if storage == SearchModelConfig.EmbeddingsStorage.FLOAT:
+            return f"{Entry._meta.db_table}_embeddings_hnsw_{search_model.id}"
+        return f"{Entry._meta.db_table}_embeddings_{storage}_hnsw_{search_model.id}"
+
+    @staticmethod
+    def get_vector_index_expression(search_model: SearchModelConfig) -> str:
+        "Get the expression and operator class to index entry embeddings with, based on the storage of the search model"
+        dimensions = int(search_model.bi_encoder_dimensions)
+        if search_model.embeddings_storage == SearchModelConfig.EmbeddingsStorage.HALFVEC:
+            return f"(embeddings::halfvec({dimensions})) halfvec_cosine_ops"
+        elif search_model.embeddings_storage == SearchModelConfig.EmbeddingsStorage.BINARY:
+            return f"(binary_quantize(embeddings::vector({dimensions}))::bit({dimensions})) bit_hamming_ops"
+        return f"(embeddings::vector({dimensions})) vector_cosine_ops"
+
+    @staticmethod
+    def create_vector_index(search_model: SearchModelConfig):
+        """Create HNSW index over the entry embeddings generated by the search model.
+        Embeddings column has no fixed dimensions, so the index is built on embeddings cast to the
+        dimensions of the search model and restricted to the entries generated by it"""
+        if search_model.bi_encoder_dimensions is None:
+            return
+
+        # Build index without blocking writes to entries table, unless running inside a transaction
+        in_transaction = connection.in_atomic_block
+        concurrently = "" if in_transaction else "CONCURRENTLY"
+        index_name = EntryAdapters.get_vector_index_name(search_model)
+        lock_key = [EntryAdapters.vector_index_lock_id, search_model.id]
+        with connection.cursor() as cursor:
+            # Build each index once, even if all server workers start up at the same time.
+            # Outside a transaction, hold a session lock as transaction level locks are released after each statement
+            lock_function = "pg_advisory_xact_lock" if in_transaction else "pg_advisory_lock"
+            cursor.execute(f"SELECT {lock_function}(%s, %s)", lock_key)
+            try:
+                cursor.execute(
+                    "SELECT pg_index.indisvalid FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid "
+                    "WHERE pg_class.relname = %s",
+                    [index_name],
+                )
+                existing_index = cursor.fetchone()
+                if existing_index is not None and existing_index[0]:
+                    return
+                if existing_index is not None:
+                    # Interrupted concurrent builds leave an invalid index behind. Rebuild it
+                    cursor.execute(f"DROP INDEX {concurrently} IF EXISTS {index_name}")
+                cursor.execute(
+                    f"CREATE INDEX {concurrently} IF NOT EXISTS {index_name} "
+                    f"ON {Entry._meta.db_table} "
+                    f"USING hnsw ({EntryAdapters.get_vector_index_expression(search_model)}) "
+                    f"WHERE search_model_id = {int(search_model.id)}"
+                )
+            finally:
+                if not in_transaction:
+                    cursor.execute("SELECT pg_advisory_unlock(%s, %s)", lock_key)
+
+    @staticmethod
+    def set_search_model_dimensions(search_model: SearchModelConfig, dimensions: int):
+        "Record embedding dimensions of the search model and (re)build its vector index if they changed"
+        if search_model.bi_encoder_dimensions != dimensions:
+            if search_model.bi_encoder_dimensions is not None:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"DROP INDEX IF EXISTS {EntryAdapters.get_vector_index_name(search_model)}")
+            search_model.bi_encoder_dimensions = dimensions
+            search_model.save()
+        EntryAdapters.create_vector_index(search_model)
+
+    @staticmethod
+    def set_search_model_storage(search_model: SearchModelConfig, storage: str):
+        """Switch the representation of entry embeddings used by vector search for the search model.
+        The vector index for the new storage is built before the search model switches to it,
+        so searches keep using the previous index until the new one is ready"""
+        previous_index_name = EntryAdapters.get_vector_index_name(search_model)
+        search_model.embeddings_storage = storage
+        EntryAdapters.create_vector_index(search_model)
+        search_model.save()
+
+        if previous_index_name != EntryAdapters.get_vector_index_name(search_model):
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP INDEX IF EXISTS {previous_index_name}")
+
+    @staticmethod
+    def is_quantized_search(search_model: SearchModelConfig) -> bool:
+        return (
+            search_model is not None
+            and search_model.bi_encoder_dimensions is not None
+            and search_model.embeddings_storage != SearchModelConfig.EmbeddingsStorage.FLOAT
+        )
+
+    @staticmethod
+    def get_num_vector_candidates(max_results: int, search_model: SearchModelConfig = None) -> int:
+        "Get the number of entries to retrieve from the vector index to find the top results"
+        if EntryAdapters.is_quantized_search(search_model):
+            return max_results * state.vector_rescore_factor
+        return max_results
+
+    @staticmethod
+    def get_quantized_distance(search_model: SearchModelConfig, embeddings: Tensor):
+        "Distance between the compact representations of the entry embeddings and the query embeddings"
+        dimensions = int(search_model.bi_encoder_dimensions)
+        if not hasattr(embeddings, "resolve_expression"):
+            embeddings = Value(to_db(embeddings))
+
+        if search_model.embeddings_storage == SearchModelConfig.EmbeddingsStorage.HALFVEC:
+            return CosineDistance(
+                Cast("embeddings", HalfVectorField(dimensions=dimensions)),
+                Cast(embeddings, HalfVectorField(dimensions=dimensions)),
+            )
+
+        def binary_quantize(vector):
+            quantized_vector = Func(
+                Cast(vector, VectorField(dimensions=dimensions)),
+                function="binary_quantize",
+                output_field=BitVectorField(),
+            )
+            return Cast(quantized_vector, BitVectorField(dimensions=dimensions))
+
+        return HammingDistance(binary_quantize("embeddings"), binary_quantize(embeddings))
+
+    @staticmethod
+    def sync_vector_index(
+        user: KhojUser,
+        search_model: SearchModelConfig,
+        generation: int = None,
+        added_entries: List[Entry] = None,
+    ) -> UserVectorIndex:
+        """Update the in-process vector index of the user with changes to their entries since it was last synced.
+        Embeddings of newly added entries can be passed in to avoid reading them back from the database"""
+        vector_index = state.vector_index.get(user.uuid, search_model.id)
+        if generation is None:
+            generation = KhojUser.objects.values_list("index_generation", flat=True).get(id=user.id)
+        if vector_index.generation == generation:
+            return vector_index
+
+        # Serialize syncs across threads and server processes to avoid adding the same entries to the index twice
+        with vector_index.locked():
+            if vector_index.generation == generation:
+                return vector_index
+
+            current_ids = set(Entry.objects.filter(user=user, search_model=search_model).values_list("id", flat=True))
+            indexed_ids = vector_index.get_ids()
+            vector_index.remove(indexed_ids - current_ids)
+
+            missing_ids = current_ids - indexed_ids
+            added_entries = [entry for entry in added_entries or [] if entry.id in missing_ids]
+            if added_entries:
+                vector_index.add(
+                    np.array([entry.id for entry in added_entries]),
+                    np.array([entry.embeddings for entry in added_entries]),
+                )
+            missing_ids -= {entry.id for entry in added_entries}
+            for batch in batcher(missing_ids, 5000):
+                ids, embeddings = zip(*Entry.objects.filter(id__in=list(batch)).values_list("id", "embeddings"))
+                vector_index.add(np.array(ids), np.array(embeddings))
+
+            vector_index.set_generation(generation)
+        return vector_index
+
+    @staticmethod
+    def get_vector_index_mask(
+        user: KhojUser,
+        vector_index: UserVectorIndex,
+        raw_query: str,
+        file_type_filter: str = None,
+    ) -> Optional[np.ndarray]:
+        """Get mask of the rows in the vector index of entries that pass the filters in the query.
+        Masks are cached until the index changes, so repeated filters do not query the database"""
+        raw_query = raw_query or ""
+        filter_terms = (
+            tuple(EntryAdapters.word_filer.get_filter_terms(raw_query)),
+            tuple(EntryAdapters.file_filter.get_filter_terms(raw_query)),
+            tuple(EntryAdapters.date_filter.get_query_date_range(raw_query)),
+        )
+        if not any(filter_terms) and not file_type_filter:
+            return None
+
+        mask_key = (
+            str(vector_index.directory),
+            vector_index.generation,
+            len(vector_index.ids),
+            file_type_filter,
+            filter_terms,
+        )
+        mask = state.vector_index.filter_masks.get(mask_key)
+        if mask is None:
+            relevant_entries = EntryAdapters.apply_filters(user, raw_query, file_type_filter).filter(user=user)
+            if file_type_filter:
+                relevant_entries = relevant_entries.filter(file_type=file_type_filter)
+            relevant_ids = np.fromiter(relevant_entries.values_list("id", flat=True), dtype=np.int64)
+            mask = np.isin(vector_index.ids, relevant_ids)
+            state.vector_index.filter_masks[mask_key] = mask
+        return mask
+
+    @staticmethod
+    def search_with_vector_index(
         user: KhojUser,
         embeddings: Tensor,
         max_results: int = 10,
         file_type_filter: str = None,
         raw_query: str = None,
         max_distance: float = math.inf,
+        search_model: SearchModelConfig = None,
     ):
-        relevant_entries = EntryAdapters.apply_filters(user, raw_query, file_type_filter)
-        relevant_entries = relevant_entries.filter(user=user).annotate(
-            distance=CosineDistance("embeddings", embeddings)
+        "Find relevant entries with the in-process vector index instead of scanning entry embeddings in the database"
+        vector_index = EntryAdapters.sync_vector_index(user, search_model, generation=user.index_generation)
+        mask = EntryAdapters.get_vector_index_mask(user, vector_index, raw_query, file_type_filter)
+        if hasattr(embeddings, "cpu"):
+            # Convert torch tensor to numpy array
+            embeddings = embeddings.cpu().numpy()
+        ids, distances = vector_index.search(embeddings, max_results, mask=mask, max_distance=max_distance)
+
+        # Fetch entries of the closest embeddings by their primary key
+        distance_by_id = Case(
+            *[When(id=int(id), then=Value(float(distance))) for id, distance in zip(ids, distances)],
+            output_field=FloatField(),
         )
-        relevant_entries = relevant_entries.filter(distance__lte=max_distance)
+        return (
+            Entry.objects.filter(
+                RawSQL(f'"{Entry._meta.db_table}"."id" = ANY(%s)', ([int(id) for id in ids],), BooleanField())
+            )
+            .annotate(distance=distance_by_id)
+            .order_by("distance")
+        )
+
+    @staticmethod
+    def get_pgvector_version() -> tuple[int, ...]:
+        "Get version of the pgvector extension installed in the database"
+        if EntryAdapters._pgvector_version is None:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+                row = cursor.fetchone()
+            EntryAdapters._pgvector_version = tuple(int(part) for part in row[0].split(".")) if row else (0,)
+        return EntryAdapters._pgvector_version
+
+    @staticmethod
+    def has_iterative_index_scan() -> bool:
+        return EntryAdapters.get_pgvector_version() >= (0, 8)
+
+    @staticmethod
+    def set_vector_search_accuracy(ef_search: int = None, exact: bool = False):
+        """Set the number of candidates explored by HNSW index scans in the current transaction.
+        Index scans gather candidates across all users before entries of other users are filtered out.
+        Continue scanning the index until enough entries pass the filters, if pgvector supports it.
+        Else search exactly without the index, if requested"""
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT set_config('hnsw.ef_search', %s, true)", [str(ef_search or state.vector_search_ef)])
+            if EntryAdapters.has_iterative_index_scan():
+                cursor.execute("SELECT set_config('hnsw.iterative_scan', 'strict_order', true)")
+            if exact:
+                cursor.execute("SELECT set_config('enable_indexscan', 'off', true)")
+
+    @staticmethod
+    def fetch_vector_search_hits(hits, max_results: int = None, ef_search: int = None) -> List[Entry]:
+        """Run vector search query with the configured search accuracy.
+        Without iterative index scans, the index scan may find fewer than max results entries of the user
+        when other users have closer entries. Search exactly then"""
+        with transaction.atomic():
+            EntryAdapters.set_vector_search_accuracy(ef_search)
+            results = list(hits)
+            if max_results is not None and len(results) < max_results and not EntryAdapters.has_iterative_index_scan():
+                EntryAdapters.set_vector_search_accuracy(ef_search, exact=True)
+                hits = (
+                    hits.all() if isinstance(hits, models.QuerySet) else Entry.objects.raw(hits.raw_query, hits.params)
+                )
+                results = list(hits)
+        return results
+
+    @staticmethod
+    def search_with_embeddings(
+        user: KhojUser,
+        embeddings: Tensor,
+        max_results: int = 10,
+        file_type_filter: str = None,
+        raw_query: str = None,
+        max_distance: float = math.inf,
+        search_model: SearchModelConfig = None,
+    ):
+        if (
+            state.vector_index is not None
+            and search_model is not None
+            and not hasattr(embeddings, "resolve_expression")
+        ):
+            return EntryAdapters.search_with_vector_index(
+                user, embeddings, max_results, file_type_filter, raw_query, max_distance, search_model
+            )
 
+        relevant_entries = EntryAdapters.apply_filters(user, raw_query, file_type_filter).filter(user=user)
         if file_type_filter:
             relevant_entries = relevant_entries.filter(file_type=file_type_filter)
+
+        if EntryAdapters.is_quantized_search(search_model):
+            # Find candidate entries closest to the query by their compact embeddings, using the vector index of the search model.
+            # Then rescore the candidates by the exact distance of their full precision embeddings to the query
+            candidate_entries = (
+                relevant_entries.filter(search_model=search_model)
+                .annotate(quantized_distance=EntryAdapters.get_quantized_distance(search_model, embeddings))
+                .order_by("quantized_distance")
+                .values("id")[: EntryAdapters.get_num_vector_candidates(max_results, search_model)]
+            )
+            relevant_entries = Entry.objects.filter(id__in=candidate_entries)
+            embeddings_field = "embeddings"
+        elif search_model and search_model.bi_encoder_dimensions:
+            # Compare against embeddings cast to fixed dimensions to use the HNSW index of the search model
+            embeddings_field = Cast("embeddings", VectorField(dimensions=search_model.bi_encoder_dimensions))
+            relevant_entries = relevant_entries.filter(search_model=search_model)
+        else:
+            embeddings_field = "embeddings"
+        relevant_entries = relevant_entries.annotate(distance=CosineDistance(embeddings_field, embeddings))
+        relevant_entries = relevant_entries.filter(distance__lte=max_distance)
         relevant_entries = relevant_entries.order_by("distance")
         return relevant_entries[:max_results]
 
+    @staticmethod
+    def search_with_hybrid_ranking(
+        user: KhojUser,
+        embeddings: Tensor,
+        query: str,
+        max_results: int = 10,
+        file_type_filter: str = None,
+        raw_query: str = None,
+        max_distance: float = math.inf,
+        search_model: SearchModelConfig = None,
+        rank_constant: int = 60,
+    ):
+        """Find relevant entries by fusing the ranks of entries retrieved via vector and full text search.
+        Both searches are run in a single query. Their results are merged with reciprocal rank fusion"""
+        # Find entries semantically closest to the query
+        semantic_entries = EntryAdapters.search_with_embeddings(
+            user=user,
+            embeddings=embeddings,
+            max_results=max_results,
+            file_type_filter=file_type_filter,
+            raw_query=raw_query,
+            max_distance=max_distance,
+            search_model=search_model,
+        )
+        semantic_sql, semantic_params = semantic_entries.query.get_compiler(using=semantic_entries.db).as_sql()
+
+        # Find entries with the most relevant keyword matches to the query
+        search_vector = f'"{Entry._meta.db_table}"."search_vector"'
+        text_query = "websearch_to_tsquery('english', %s)"
+        lexical_entries = (
+            EntryAdapters.apply_filters(user, raw_query, file_type_filter)
+            .filter(user=user)
+            .filter(RawSQL(f"{search_vector} @@ {text_query}", (query,), output_field=BooleanField()))
+            .annotate(lexical_rank=RawSQL(f"ts_rank_cd({search_vector}, {text_query})", (query,), FloatField()))
+            .order_by("-lexical_rank")[:max_results]
+        )
+        lexical_sql, lexical_params = lexical_entries.query.get_compiler(using=lexical_entries.db).as_sql()
+
+        # Fuse ranks of entries from both searches. Normalize the fused score to a distance in [0, 1]
+        hybrid_sql = (
+            f"WITH semantic AS ("
+            f"SELECT hits.id, ROW_NUMBER() OVER (ORDER BY hits.distance) AS rank FROM ({semantic_sql}) AS hits"
+            f"), lexical AS ("
+            f"SELECT hits.id, ROW_NUMBER() OVER (ORDER BY hits.lexical_rank DESC) AS rank FROM ({lexical_sql}) AS hits"
+            f"), fused AS ("
+            f"SELECT COALESCE(semantic.id, lexical.id) AS id, "
+            f"COALESCE(1.0 / (%s + semantic.rank), 0) + COALESCE(1.0 / (%s + lexical.rank), 0) AS score "
+            f"FROM semantic FULL OUTER JOIN lexical ON semantic.id = lexical.id"
+            f") "
+            f"SELECT entry.*, 1 - fused.score * (%s + 1) / 2.0 AS distance "
+            f"FROM {Entry._meta.db_table} AS entry JOIN fused ON entry.id = fused.id "
+            f"ORDER BY fused.score DESC LIMIT %s"
+        )
+        params = [*semantic_params, *lexical_params, rank_constant, rank_constant, rank_constant, max_results]
+        return Entry.objects.raw(hybrid_sql, params)
+
+    @staticmethod
+    def search_with_embeddings_batch(
+        user: KhojUser,
+        embeddings: List[Tensor],
+        max_results: int = 10,
+        file_type_filter: str = None,
+        raw_query: str = None,
+        max_distance: float = math.inf,
+        search_model: SearchModelConfig = None,
+        ef_search: int = None,
+    ) -> List[List[Entry]]:
+        "Find the most relevant entries for each of the query embeddings in a single round trip to the database"
+        if len(embeddings) == 0:
+            return []
+
+        # Search in-process vector index for each query embedding, if configured
+        if state.vector_index is not None and search_model is not None:
+            return [
+                list(
+                    EntryAdapters.search_with_embeddings(
+                        user, query_embeddings, max_results, file_type_filter, raw_query, max_distance, search_model
+                    )
+                )
+                for query_embeddings in embeddings
+            ]
+
+        # Construct vector search query for a single query embedding, referenced from the outer query
+        relevant_entries = EntryAdapters.search_with_embeddings(
+            user=user,
+            embeddings=RawSQL("query_embeddings.embeddings", ()),
+            max_results=max_results,
+            file_type_filter=file_type_filter,
+            raw_query=raw_query,
+            max_distance=max_distance,
+            search_model=search_model,
+        )
+        hits_sql, hits_params = relevant_entries.query.get_compiler(using=relevant_entries.db).as_sql()
+
+        # Run vector search query laterally for each query embedding
+        if search_model and search_model.bi_encoder_dimensions:
+            vector_type = f"vector({int(search_model.bi_encoder_dimensions)})"
+        else:
+            vector_type = "vector"
+        batch_sql = (
+            f"SELECT hits.*, query_embeddings.query_index FROM ("
+            f"SELECT embeddings::{vector_type} AS embeddings, query_index "
+            f"FROM unnest(%s::text[]) WITH ORDINALITY AS query(embeddings, query_index)"
+            f") AS query_embeddings "
+            f"CROSS JOIN LATERAL ({hits_sql}) AS hits "
+            f"ORDER BY query_embeddings.query_index, hits.distance"
+        )
+        params = [[to_db(query_embeddings) for query_embeddings in embeddings], *hits_params]
+
+        with transaction.atomic():
+            EntryAdapters.set_vector_search_accuracy(ef_search)
+            hits_by_query = EntryAdapters._group_hits_by_query(Entry.objects.raw(batch_sql, params), len(embeddings))
+            # Index scans may miss entries of the user without iterative index scans. Search exactly then
+            if not EntryAdapters.has_iterative_index_scan() and any(len(hits) < max_results for hits in hits_by_query):
+                EntryAdapters.set_vector_search_accuracy(ef_search, exact=True)
+                hits_by_query = EntryAdapters._group_hits_by_query(
+                    Entry.objects.raw(batch_sql, params), len(embeddings)
+                )
+        return hits_by_query
+
+    @staticmethod
+    def _group_hits_by_query(hits, num_queries: int) -> List[List[Entry]]:
+        hits_by_query: List[List[Entry]] = [[] for _ in range(num_queries)]
+        for hit in hits:
+            hits_by_query[hit.query_index - 1].append(hit)
+        return hits_by_query
+
     @staticmethod
     def get_unique_file_types(user: KhojUser):
         return Entry.objects.filter(user=user).values_list("file_type", flat=True).distinct()
@@ -597,3 +1140,246 @@ class EntryAdapters:
     @staticmethod
     def get_unique_file_sources(user: KhojUser):
         return Entry.objects.filter(user=user).values_list("file_source", flat=True).distinct().all()
+
+
+class IndexJobAdapters:
+    # Key of Postgres advisory lock held while claiming index jobs
+    claim_lock_id = 5_640_001
+
+    @staticmethod
+    def enqueue_job(
+        user: KhojUser,
+        kind: str = IndexJob.Kind.FILES,
+        content_type: str = "all",
+        regenerate: bool = False,
+        files: Dict[str, Dict[str, str]] = None,
+        spool_host: str = None,
+    ) -> IndexJob:
+        """Queue job to update content index. Coalesce with queued job of the user to update the same content type.
+        Jobs with files spooled on a host are only coalesced with jobs of files spooled on the same host"""
+        with transaction.atomic():
+            job = (
+                IndexJob.objects.select_for_update()
+                .filter(
+                    user=user,
+                    kind=kind,
+                    content_type=content_type,
+                    spool_host=spool_host,
+                    status=IndexJob.Status.QUEUED,
+                )
+                .order_by("created_at")
+                .first()
+            )
+            if job is None:
+                job = IndexJob(user=user, kind=kind, content_type=content_type, files={}, spool_host=spool_host)
+            # Newer uploads of a file replace its older uploads
+            for file_type, files_of_type in (files or {}).items():
+                queued_files = job.files.setdefault(file_type, {})
+                for file_name, spool_path in files_of_type.items():
+                    if file_name in queued_files and queued_files[file_name] != spool_path:
+                        Path(queued_files[file_name]).unlink(missing_ok=True)
+                    queued_files[file_name] = spool_path
+            job.num_files = sum(len(files_of_type) for files_of_type in job.files.values())
+            job.regenerate = job.regenerate or regenerate
+            job.save()
+        return job
+
+    @staticmethod
+    async def aenqueue_job(
+        user: KhojUser,
+        kind: str = IndexJob.Kind.FILES,
+        content_type: str = "all",
+        regenerate: bool = False,
+        files: Dict[str, Dict[str, str]] = None,
+        spool_host: str = None,
+    ) -> IndexJob:
+        return await sync_to_async(IndexJobAdapters.enqueue_job)(
+            user, kind, content_type, regenerate, files, spool_host
+        )
+
+    @staticmethod
+    def claim_next_job(stale_after: timedelta = timedelta(hours=1), spool_host: str = None) -> Optional[IndexJob]:
+        """Mark the oldest queued job as running and return it. Skip jobs claimed by other workers.
+        Skip jobs with files spooled on other hosts, as their files can only be read on that host"""
+        # Requeue jobs of workers that stopped before finishing them
+        IndexJob.objects.filter(
+            status=IndexJob.Status.RUNNING, updated_at__lt=datetime.now(tz=timezone.utc) - stale_after
+        ).update(status=IndexJob.Status.QUEUED)
+
+        with transaction.atomic():
+            # Serialize claims across workers. Else workers could claim jobs of the same user at the same time
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", [IndexJobAdapters.claim_lock_id])
+            job = (
+                IndexJob.objects.select_for_update(skip_locked=True)
+                .filter(status=IndexJob.Status.QUEUED)
+                .filter(Q(spool_host__isnull=True) | Q(spool_host=spool_host))
+                # Run jobs of a user one at a time to avoid concurrent updates to their entries
+                .exclude(Exists(IndexJob.objects.filter(user=OuterRef("user"), status=IndexJob.Status.RUNNING)))
+                .select_related("user")
+                .order_by("created_at")
+                .first()
+            )
+            if job is None:
+                return None
+            job.status = IndexJob.Status.RUNNING
+            job.started_at = datetime.now(tz=timezone.utc)
+            job.save(update_fields=["status", "started_at", "updated_at"])
+        return job
+
+    @staticmethod
+    def heartbeat_job(job_id: int):
+        "Mark running job as alive. Running jobs not updated within the stale timeout are requeued"
+        IndexJob.objects.filter(id=job_id, status=IndexJob.Status.RUNNING).update(
+            updated_at=datetime.now(tz=timezone.utc)
+        )
+
+    @staticmethod
+    def finish_job(job: IndexJob, error: str = None):
+        job.status = IndexJob.Status.FAILED if error else IndexJob.Status.COMPLETED
+        job.error = error
+        job.finished_at = datetime.now(tz=timezone.utc)
+        # Drop file content of finished jobs to free up space
+        job.files = {}
+        job.save(update_fields=["status", "error", "finished_at", "files", "updated_at"])
+
+    @staticmethod
+    async def aget_job(job_id: int, user: KhojUser = None) -> Optional[IndexJob]:
+        return await IndexJob.objects.filter(id=job_id, user=user).defer("files").afirst()
+
+    @staticmethod
+    async def aget_jobs(user: KhojUser, limit: int = 20) -> List[IndexJob]:
+        return [job async for job in IndexJob.objects.filter(user=user).defer("files").order_by("-created_at")[:limit]]
+
+
+class EmbeddingsCacheAdapters:
+    @staticmethod
+    def get_cached_embeddings(search_model: SearchModelConfig, hashed_values: Iterable[str]) -> Dict[str, np.ndarray]:
+        "Get previously computed embeddings of texts by their hash. Mark cache hits as recently used"
+        cached_embeddings = EmbeddingsCache.objects.filter(
+            bi_encoder=search_model.bi_encoder,
+            bi_encoder_backend=search_model.bi_encoder_backend,
+        ).filter(
+            RawSQL(
+                f'"{EmbeddingsCache._meta.db_table}"."hashed_value" = ANY(%s)', (list(hashed_values),), BooleanField()
+            )
+        )
+        embeddings_by_hash = dict(cached_embeddings.values_list("hashed_value", "embeddings"))
+        if embeddings_by_hash:
+            cached_embeddings.update(updated_at=datetime.now(tz=timezone.utc))
+        return embeddings_by_hash
+
+    @staticmethod
+    def cache_embeddings(
+        search_model: SearchModelConfig, embeddings_by_hash: Dict[str, List[float]], max_entries: int = None
+    ):
+        "Cache computed embeddings of texts by their hash. Cache may exceed max entries until embeddings are evicted"
+        max_entries = state.embeddings_cache_max_entries if max_entries is None else max_entries
+        if max_entries <= 0 or not embeddings_by_hash:
+            return
+        EmbeddingsCache.objects.bulk_create(
+            [
+                EmbeddingsCache(
+                    bi_encoder=search_model.bi_encoder,
+                    bi_encoder_backend=search_model.bi_encoder_backend,
+                    hashed_value=hashed_value,
+                    embeddings=embeddings,
+                )
+                for hashed_value, embeddings in embeddings_by_hash.items()
+            ],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+
+    @staticmethod
+    def evict_embeddings(max_entries: int = None) -> int:
+        """Evict least recently used embeddings beyond max entries.
+        Counts all cached embeddings. So evict once per indexing run rather than after caching each batch"""
+        max_entries = state.embeddings_cache_max_entries if max_entries is None else max_entries
+        num_excess_entries = EmbeddingsCache.objects.count() - max_entries
+        if num_excess_entries <= 0:
+            return 0
+        stale_ids = EmbeddingsCache.objects.order_by("updated_at").values_list("id", flat=True)[:num_excess_entries]
+        num_evicted, _ = EmbeddingsCache.objects.filter(id__in=list(stale_ids)).delete()
+        return num_evicted
+
+
+class IndexedFileAdapters:
+    @staticmethod
+    def hash_content(content: str | bytes) -> str:
+        "SHA-256 hash of file content. Clients hash their files the same way to sync only changed files"
+        return hashlib.sha256(content if isinstance(content, bytes) else bytes(content, encoding="utf-8")).hexdigest()
+
+    @staticmethod
+    def _get_indexed_files(user: KhojUser, file_paths: Iterable[str] = None):
+        "Get manifest of files whose entries are still indexed. Entries may be deleted without updating the manifest"
+        indexed_files = IndexedFile.objects.filter(user=user).filter(
+            Exists(Entry.objects.filter(user=OuterRef("user"), file_path=OuterRef("file_path")))
+        )
+        if file_paths is not None:
+            indexed_files = indexed_files.filter(
+                RawSQL(f'"{IndexedFile._meta.db_table}"."file_path" = ANY(%s)', (list(file_paths),), BooleanField())
+            )
+        return indexed_files
+
+    @staticmethod
+    def get_indexed_file_hashes(user: KhojUser, file_paths: Iterable[str]) -> Dict[str, str]:
+        indexed_files = IndexedFileAdapters._get_indexed_files(user, file_paths)
+        return dict(indexed_files.values_list("file_path", "content_hash"))
+
+    @staticmethod
+    def get_unchanged_files(user: KhojUser, files: Dict[str, str | bytes]) -> Set[str]:
+        "Get files with the same content as when they were last indexed"
+        indexed_hashes = IndexedFileAdapters.get_indexed_file_hashes(user, files)
+        return {
+            file_path
+            for file_path, content_hash in indexed_hashes.items()
+            if content_hash == IndexedFileAdapters.hash_content(files[file_path])
+        }
+
+    @staticmethod
+    def get_files_to_sync(user: KhojUser, file_hashes: Dict[str, str]) -> List[str]:
+        """Compare content hashes of files on a client with the indexed files of the user.
+        Return files the client needs to upload"""
+        indexed_hashes = IndexedFileAdapters.get_indexed_file_hashes(user, file_hashes)
+        return sorted(
+            file_path
+            for file_path, content_hash in file_hashes.items()
+            if indexed_hashes.get(file_path) != content_hash
+        )
+
+    @staticmethod
+    def get_indexed_file_stats(user: KhojUser) -> Dict[str, tuple[int, float]]:
+        "Get size and modification time of synced files when their content was last indexed"
+        indexed_files = IndexedFileAdapters._get_indexed_files(user).filter(file_mtime__isnull=False)
+        return {
+            file_path: (size, mtime)
+            for file_path, size, mtime in indexed_files.values_list("file_path", "file_size", "file_mtime")
+        }
+
+    @staticmethod
+    def update_indexed_files(user: KhojUser, files: Dict[str, str | bytes]):
+        "Record content hash of indexed files. Reset file stats as they are unknown for the indexed content"
+        IndexedFile.objects.bulk_create(
+            [
+                IndexedFile(user=user, file_path=file_path, content_hash=IndexedFileAdapters.hash_content(content))
+                for file_path, content in files.items()
+            ],
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=["user", "file_path"],
+            update_fields=["content_hash", "file_size", "file_mtime", "updated_at"],
+        )
+
+    @staticmethod
+    def update_indexed_file_stats(user: KhojUser, file_stats: Dict[str, tuple[int, float]]):
+        "Record size and modification time of synced files whose content is known to be indexed"
+        indexed_files = list(IndexedFile.objects.filter(user=user, file_path__in=list(file_stats)))
+        for indexed_file in indexed_files:
+            indexed_file.file_size, indexed_file.file_mtime = file_stats[indexed_file.file_path]
+        IndexedFile.objects.bulk_update(indexed_files, ["file_size", "file_mtime"], batch_size=1000)
+
+    @staticmethod
+    def delete_indexed_files(user: KhojUser, file_paths: Iterable[str]) -> int:
+        num_deleted, _ = IndexedFile.objects.filter(user=user, file_path__in=list(file_paths)).delete()
+        return num_deleted
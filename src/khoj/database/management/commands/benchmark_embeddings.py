@@ -0,0 +1,51 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from khoj.database.management.commands.benchmark_search_filters import VOCABULARY, time_query
+from khoj.database.models import SearchModelConfig
+from khoj.processor.embeddings import EmbeddingsModel, query_embeddings_cache
+
+
+class Command(BaseCommand):
+    help = "Benchmark throughput of embedding documents and latency of embedding queries with each model backend"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", default="thenlper/gte-small", help="Name of bi-encoder model to benchmark")
+        parser.add_argument("--documents", type=int, default=512, help="Number of documents to embed")
+        parser.add_argument("--words", type=int, default=200, help="Number of words per document")
+        parser.add_argument("--runs", type=int, default=50, help="Number of queries to embed")
+        parser.add_argument(
+            "--backends",
+            nargs="+",
+            choices=SearchModelConfig.ModelBackend.values,
+            default=SearchModelConfig.ModelBackend.values,
+            help="Model backends to benchmark",
+        )
+
+    def handle(self, *args, **options):
+        documents = [" ".join(random.choices(VOCABULARY, k=options["words"])) for _ in range(options["documents"])]
+        queries = iter(
+            [" ".join(random.choices(VOCABULARY, k=8)) for _ in range(len(options["backends"]) * options["runs"])]
+        )
+
+        self.stdout.write(
+            f"{'backend':<12}{'load (s)':>12}{'documents/s':>14}{'query p50 (ms)':>16}{'query p95 (ms)':>16}"
+        )
+        for backend in options["backends"]:
+            start = time.perf_counter()
+            embeddings_model = EmbeddingsModel(options["model"], backend=backend)
+            load_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            embeddings_model.embed_documents(documents)
+            documents_per_second = len(documents) / (time.perf_counter() - start)
+
+            # Embed unique queries to measure model latency instead of query embeddings cache hits
+            query_embeddings_cache.clear()
+            query_p50, query_p95 = time_query(lambda: embeddings_model.embed_query(next(queries)), options["runs"])
+
+            self.stdout.write(
+                f"{backend:<12}{load_time:>12.1f}{documents_per_second:>14.1f}{query_p50:>16.2f}{query_p95:>16.2f}"
+            )
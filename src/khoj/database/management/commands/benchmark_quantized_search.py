@@ -0,0 +1,79 @@
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from khoj.database.adapters import EntryAdapters
+from khoj.database.management.commands.benchmark_search_filters import (
+    create_benchmark_user,
+    create_synthetic_entries,
+    time_query,
+)
+from khoj.database.management.commands.quantize_embeddings import get_index_size
+from khoj.database.models import SearchModelConfig
+from khoj.utils import state
+
+
+class Command(BaseCommand):
+    help = "Benchmark recall and latency of vector search with each representation of entry embeddings"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--entries", type=int, default=100_000, help="Number of entries to create for user")
+        parser.add_argument("--dimensions", type=int, default=384, help="Dimensions of entry embeddings")
+        parser.add_argument("--queries", type=int, default=20, help="Number of queries to measure recall with")
+        parser.add_argument("--top-k", type=int, default=10, help="Number of results to retrieve per query")
+        parser.add_argument("--runs", type=int, default=5, help="Number of times to run each query")
+
+    def handle(self, *args, **options):
+        user = create_benchmark_user()
+        search_model = SearchModelConfig.objects.create(
+            name=f"benchmark-{user.username}", bi_encoder_dimensions=options["dimensions"]
+        )
+        top_k = options["top_k"]
+        try:
+            self.stdout.write(f"Creating {options['entries']} entries for {user.username}...")
+            create_synthetic_entries(user, options["entries"], options["dimensions"], search_model=search_model)
+
+            rng = np.random.default_rng(seed=7)
+            queries = [rng.standard_normal(options["dimensions"]) for _ in range(options["queries"])]
+
+            # Compute exact nearest neighbours of each query with a sequential scan over the full precision embeddings
+            exact_results = [
+                {entry.id for entry in EntryAdapters.search_with_embeddings(user, query_embeddings, max_results=top_k)}
+                for query_embeddings in queries
+            ]
+
+            self.stdout.write(
+                f"{'storage':<12}{'index (MB)':>12}{f'recall@{top_k}':>12}{'p50 (ms)':>12}{'p95 (ms)':>12}"
+            )
+            for storage in SearchModelConfig.EmbeddingsStorage.values:
+                EntryAdapters.set_search_model_storage(search_model, storage)
+                index_size = get_index_size(EntryAdapters.get_vector_index_name(search_model))
+                # Search accuracy is set for the current transaction only
+                with transaction.atomic():
+                    EntryAdapters.set_vector_search_accuracy(
+                        max(EntryAdapters.get_num_vector_candidates(top_k, search_model), state.vector_search_ef)
+                    )
+                    recalls, latencies_p50, latencies_p95 = [], [], []
+                    for query_embeddings, exact_ids in zip(queries, exact_results):
+
+                        def run_query():
+                            return EntryAdapters.search_with_embeddings(
+                                user, query_embeddings, max_results=top_k, search_model=search_model
+                            )
+
+                        result_ids = {entry.id for entry in run_query()}
+                        recalls.append(len(result_ids & exact_ids) / len(exact_ids))
+                        p50, p95 = time_query(lambda: list(run_query()), options["runs"])
+                        latencies_p50.append(p50)
+                        latencies_p95.append(p95)
+
+                self.stdout.write(
+                    f"{storage:<12}{index_size / 2**20:>12.1f}{np.mean(recalls):>12.3f}"
+                    f"{np.median(latencies_p50):>12.2f}{np.median(latencies_p95):>12.2f}"
+                )
+        finally:
+            # Drop vector index of benchmark search model before deleting it
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP INDEX IF EXISTS {EntryAdapters.get_vector_index_name(search_model)}")
+            user.delete()
+            search_model.delete()
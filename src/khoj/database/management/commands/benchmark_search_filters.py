@@ -0,0 +1,123 @@
+import random
+import statistics
+import time
+import uuid
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from khoj.database.adapters import EntryAdapters
+from khoj.database.models import Entry, KhojUser, SearchModelConfig
+from khoj.utils.helpers import batcher
+
+VOCABULARY = [
+    "project",
+    "meeting",
+    "notes",
+    "khoj",
+    "search",
+    "emacs",
+    "obsidian",
+    "python",
+    "release",
+    "deploy",
+    "design",
+    "review",
+    "journal",
+    "travel",
+    "budget",
+    "research",
+]
+
+
+def create_benchmark_user(prefix: str = "benchmark") -> KhojUser:
+    username = f"{prefix}-{uuid.uuid4()}"
+    return KhojUser.objects.create(username=username, email=f"{username}@example.com")
+
+
+def create_synthetic_entries(
+    user: KhojUser,
+    num_entries: int,
+    dimensions: int,
+    batch_size: int = 5000,
+    search_model: SearchModelConfig = None,
+):
+    "Create entries with random text and normalized random embeddings for the user"
+    rng = np.random.default_rng(seed=42)
+
+    def make_entry(index: int) -> Entry:
+        words = random.choices(VOCABULARY, k=50)
+        # Add a rare, unique word to a small fraction of entries to benchmark selective filters
+        if index % 1000 == 0:
+            words.append(f"ticket-{index}")
+        text = " ".join(words)
+        embeddings = rng.standard_normal(dimensions)
+        return Entry(
+            user=user,
+            embeddings=embeddings / np.linalg.norm(embeddings),
+            raw=text,
+            compiled=text,
+            heading=words[0],
+            file_path=f"/notes/{index % 5000}/{words[1]}.org",
+            file_type=Entry.EntryType.ORG,
+            hashed_value=uuid.uuid4().hex,
+            search_model=search_model,
+        )
+
+    for batch in batcher(range(num_entries), batch_size):
+        Entry.objects.bulk_create([make_entry(index) for index in batch])
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"ANALYZE {Entry._meta.db_table}")
+
+
+def time_query(run_query, runs: int) -> tuple[float, float]:
+    "Return median and 95th percentile latency of query in milliseconds"
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run_query()
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(0.95 * (len(latencies) - 1))]
+
+
+class Command(BaseCommand):
+    help = "Benchmark latency of search queries with word filters on a user with many synthetic entries"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--entries", type=int, default=500_000, help="Number of entries to create for user")
+        parser.add_argument("--dimensions", type=int, default=384, help="Dimensions of entry embeddings")
+        parser.add_argument("--runs", type=int, default=20, help="Number of times to run each query")
+        parser.add_argument("--keep", action="store_true", help="Keep benchmark user and entries after run")
+
+    def handle(self, *args, **options):
+        user = create_benchmark_user()
+        try:
+            self.stdout.write(f"Creating {options['entries']} entries for {user.username}...")
+            create_synthetic_entries(user, options["entries"], options["dimensions"])
+
+            query_embeddings = np.random.default_rng(seed=7).standard_normal(options["dimensions"])
+            filter_queries = {
+                "no filter": "notes",
+                "common include word": 'notes +"emacs"',
+                "rare include word": 'notes +"ticket-1000"',
+                "exclude word": 'notes -"budget"',
+                "include and exclude words": 'notes +"ticket-2000" -"travel"',
+            }
+
+            self.stdout.write(f"{'query':<30}{'filter p50 (ms)':>18}{'filter p95 (ms)':>18}{'search p50 (ms)':>18}")
+            for name, query in filter_queries.items():
+                filter_p50, filter_p95 = time_query(
+                    lambda: list(EntryAdapters.apply_filters(user, query).values_list("id", flat=True)[:10]),
+                    options["runs"],
+                )
+                search_p50, _ = time_query(
+                    lambda: list(EntryAdapters.search_with_embeddings(user, query_embeddings, raw_query=query)),
+                    options["runs"],
+                )
+                self.stdout.write(f"{name:<30}{filter_p50:>18.2f}{filter_p95:>18.2f}{search_p50:>18.2f}")
+        finally:
+            if not options["keep"]:
+                user.delete()
@@ -0,0 +1,33 @@
+import os
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from khoj.configure import load_cross_encoder_model, load_embeddings_model
+from khoj.database.adapters import get_or_create_search_models, get_user_search_model_or_default
+from khoj.processor.inference import InferenceServer
+from khoj.utils.helpers import ModelRegistry
+
+
+class Command(BaseCommand):
+    help = "Serve search and speech to text models to all server workers on this machine over a Unix socket"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--socket",
+            default=os.getenv("KHOJ_INFERENCE_SOCKET", "~/.khoj/inference.sock"),
+            help="Path of Unix socket to serve models at. Set KHOJ_INFERENCE_SOCKET to this path on the server",
+        )
+
+    def handle(self, *args, **options):
+        get_or_create_search_models()
+        models_memory_bytes = int(os.getenv("KHOJ_SEARCH_MODELS_MEMORY_MB", 1024)) * 1024 * 1024
+        embeddings_model = ModelRegistry(load_embeddings_model, models_memory_bytes, name="embeddings models")
+        cross_encoder_model = ModelRegistry(load_cross_encoder_model, models_memory_bytes, name="cross-encoder models")
+
+        default_search_model = get_user_search_model_or_default()
+        embeddings_model.preload(default_search_model.name)
+        cross_encoder_model.preload(default_search_model.name)
+
+        server = InferenceServer(Path(options["socket"]), embeddings_model, cross_encoder_model)
+        server.serve_forever()
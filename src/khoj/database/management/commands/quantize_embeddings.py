@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from khoj.database.adapters import EntryAdapters
+from khoj.database.models import SearchModelConfig
+
+
+def get_index_size(index_name: str) -> int:
+    "Get size of the index in bytes. Returns 0 if the index does not exist"
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT COALESCE(pg_relation_size(to_regclass(%s)), 0)", [index_name])
+        return cursor.fetchone()[0]
+
+
+class Command(BaseCommand):
+    help = "Switch the representation of entry embeddings used by vector search and build its vector index"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--storage",
+            choices=SearchModelConfig.EmbeddingsStorage.values,
+            default=SearchModelConfig.EmbeddingsStorage.HALFVEC,
+            help="Representation of entry embeddings to search with",
+        )
+        parser.add_argument("--search-model", help="Name of search model to update. Updates all search models if unset")
+
+    def handle(self, *args, **options):
+        search_models = SearchModelConfig.objects.all()
+        if options["search_model"]:
+            search_models = search_models.filter(name=options["search_model"])
+        if not search_models.exists():
+            raise CommandError("No search models to update")
+
+        for search_model in search_models:
+            if search_model.bi_encoder_dimensions is None:
+                self.stdout.write(
+                    self.style.WARNING(f"Skipping {search_model.name}. Start server to record its embedding dimensions")
+                )
+                continue
+
+            previous_index_name = EntryAdapters.get_vector_index_name(search_model)
+            previous_index_size = get_index_size(previous_index_name)
+
+            self.stdout.write(f"Building {options['storage']} vector index for {search_model.name}...")
+            start = time.perf_counter()
+            EntryAdapters.set_search_model_storage(search_model, options["storage"])
+            elapsed = time.perf_counter() - start
+
+            index_size = get_index_size(EntryAdapters.get_vector_index_name(search_model))
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Switched {search_model.name} to {options['storage']} embeddings in {elapsed:.1f}s. "
+                    f"Vector index size: {previous_index_size / 2**20:.1f} MB -> {index_size / 2**20:.1f} MB"
+                )
+            )
@@ -0,0 +1,86 @@
+# Generated by Django 4.2.7 on 2024-01-08 11:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_entry_search_model(apps, schema_editor):
+    "Attribute existing entries to the search model used to embed them"
+    Entry = apps.get_model("database", "Entry")
+    SearchModelConfig = apps.get_model("database", "SearchModelConfig")
+    UserSearchModelConfig = apps.get_model("database", "UserSearchModelConfig")
+
+    default_search_model = SearchModelConfig.objects.filter(name="default").first() or SearchModelConfig.objects.first()
+    if default_search_model is None:
+        return
+
+    # Entries of users with a selected search model were embedded by that model, the rest by the default model
+    for user_search_model in UserSearchModelConfig.objects.all():
+        Entry.objects.filter(user_id=user_search_model.user_id, search_model__isnull=True).update(
+            search_model_id=user_search_model.setting_id
+        )
+    Entry.objects.filter(search_model__isnull=True).update(search_model_id=default_search_model.id)
+
+    with schema_editor.connection.cursor() as cursor:
+        for search_model in SearchModelConfig.objects.all():
+            cursor.execute(
+                f"SELECT vector_dims(embeddings) FROM {Entry._meta.db_table} WHERE search_model_id = %s LIMIT 1",
+                [search_model.id],
+            )
+            row = cursor.fetchone()
+            if row is None:
+                continue
+            search_model.bi_encoder_dimensions = row[0]
+            search_model.save()
+
+
+def create_vector_indexes(apps, schema_editor):
+    "Create vector index of each search model without blocking writes to the entries table"
+    Entry = apps.get_model("database", "Entry")
+    SearchModelConfig = apps.get_model("database", "SearchModelConfig")
+    with schema_editor.connection.cursor() as cursor:
+        for search_model in SearchModelConfig.objects.filter(bi_encoder_dimensions__isnull=False):
+            cursor.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {Entry._meta.db_table}_embeddings_hnsw_{search_model.id} "
+                f"ON {Entry._meta.db_table} "
+                f"USING hnsw ((embeddings::vector({search_model.bi_encoder_dimensions})) vector_cosine_ops) "
+                f"WHERE search_model_id = {search_model.id}"
+            )
+
+
+def drop_vector_indexes(apps, schema_editor):
+    Entry = apps.get_model("database", "Entry")
+    SearchModelConfig = apps.get_model("database", "SearchModelConfig")
+    with schema_editor.connection.cursor() as cursor:
+        for search_model in SearchModelConfig.objects.all():
+            cursor.execute(f"DROP INDEX IF EXISTS {Entry._meta.db_table}_embeddings_hnsw_{search_model.id}")
+
+
+class Migration(migrations.Migration):
+    # Vector indexes are built concurrently, which can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ("database", "0024_alter_entry_embeddings"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="searchmodelconfig",
+            name="bi_encoder_dimensions",
+            field=models.IntegerField(blank=True, default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name="entry",
+            name="search_model",
+            field=models.ForeignKey(
+                blank=True,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to="database.searchmodelconfig",
+            ),
+        ),
+        migrations.RunPython(backfill_entry_search_model, migrations.RunPython.noop, atomic=True),
+        migrations.RunPython(create_vector_indexes, drop_vector_indexes, atomic=False),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2024-01-09 09:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("database", "0025_searchmodelconfig_bi_encoder_dimensions_entry_search_model"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="khojuser",
+            name="index_generation",
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2024-01-10 14:36
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("database", "0026_khojuser_index_generation"),
+    ]
+
+    # Full text search vector is generated by the database from the compiled entry.
+    # It is not tracked on the Entry model to avoid writing to it on insert
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                "ALTER TABLE database_entry ADD COLUMN search_vector tsvector "
+                "GENERATED ALWAYS AS (to_tsvector('english', compiled)) STORED",
+                "CREATE INDEX database_entry_search_vector_gin ON database_entry USING gin (search_vector)",
+            ],
+            reverse_sql=[
+                "DROP INDEX IF EXISTS database_entry_search_vector_gin",
+                "ALTER TABLE database_entry DROP COLUMN IF EXISTS search_vector",
+            ],
+        ),
+    ]
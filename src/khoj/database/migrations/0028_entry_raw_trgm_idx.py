@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2024-01-11 10:21
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("database", "0027_entry_search_vector"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name="entry",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["raw"], name="entry_raw_trgm_idx", opclasses=["gin_trgm_ops"]
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2024-01-12 08:47
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("database", "0028_entry_raw_trgm_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="entry",
+            index=models.Index(
+                fields=["file_path"], name="entry_file_path_pattern_idx", opclasses=["text_pattern_ops"]
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="entry",
+            index=models.Index(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Reverse("file_path"), name="text_pattern_ops"
+                ),
+                name="entry_file_path_reverse_idx",
+            ),
+        ),
+    ]
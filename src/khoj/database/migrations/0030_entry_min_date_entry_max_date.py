@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2024-01-13 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("database", "0029_entry_file_path_pattern_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="entry",
+            name="max_date",
+            field=models.DateField(blank=True, default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name="entry",
+            name="min_date",
+            field=models.DateField(blank=True, default=None, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="entry",
+            index=models.Index(fields=["min_date", "max_date"], name="entry_date_bounds_idx"),
+        ),
+        # Backfill date bounds of existing entries from their indexed dates
+        migrations.RunSQL(
+            sql="UPDATE database_entry SET min_date = entry_dates.min_date, max_date = entry_dates.max_date "
+            "FROM (SELECT entry_id, MIN(date) AS min_date, MAX(date) AS max_date "
+            "FROM database_entrydates GROUP BY entry_id) AS entry_dates "
+            "WHERE database_entry.id = entry_dates.entry_id",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
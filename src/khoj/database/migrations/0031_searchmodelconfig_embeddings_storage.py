@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2024-01-15 09:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("database", "0030_entry_min_date_entry_max_date"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="searchmodelconfig",
+            name="embeddings_storage",
+            field=models.CharField(
+                choices=[("float", "Float"), ("halfvec", "Halfvec"), ("binary", "Binary")],
+                default="float",
+                max_length=200,
+            ),
+        ),
+    ]
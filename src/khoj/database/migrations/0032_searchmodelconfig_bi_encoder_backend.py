@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2024-01-17 10:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("database", "0031_searchmodelconfig_embeddings_storage"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="searchmodelconfig",
+            name="bi_encoder_backend",
+            field=models.CharField(
+                choices=[("torch", "Torch"), ("onnx", "Onnx"), ("onnx-int8", "Onnx Int8")],
+                default="torch",
+                max_length=200,
+            ),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2024-01-20 11:38
+
+import pgvector.django
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("database", "0033_indexjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EmbeddingsCache",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("bi_encoder", models.CharField(max_length=200)),
+                ("bi_encoder_backend", models.CharField(default="torch", max_length=200)),
+                ("hashed_value", models.CharField(max_length=100)),
+                ("embeddings", pgvector.django.VectorField()),
+            ],
+            options={
+                "indexes": [models.Index(fields=["updated_at"], name="embeddings_cache_updated_idx")],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="embeddingscache",
+            constraint=models.UniqueConstraint(
+                fields=("bi_encoder", "bi_encoder_backend", "hashed_value"), name="unique_embeddings_cache_key"
+            ),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2024-01-22 09:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("database", "0034_embeddingscache"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IndexedFile",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("file_path", models.CharField(max_length=400)),
+                ("content_hash", models.CharField(max_length=100)),
+                ("file_size", models.BigIntegerField(blank=True, default=None, null=True)),
+                ("file_mtime", models.FloatField(blank=True, default=None, null=True)),
+                (
+                    "user",
+                    models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="indexedfile",
+            constraint=models.UniqueConstraint(fields=("user", "file_path"), name="unique_indexed_file_path"),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2024-01-24 10:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("database", "0035_indexedfile"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="indexjob",
+            name="spool_host",
+            field=models.CharField(blank=True, default=None, max_length=255, null=True),
+        ),
+    ]
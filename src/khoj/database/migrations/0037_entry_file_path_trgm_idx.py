@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2024-01-26 09:14
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("database", "0036_indexjob_spool_host"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="entry",
+            name="entry_file_path_pattern_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="entry",
+            name="entry_file_path_reverse_idx",
+        ),
+        migrations.AddIndex(
+            model_name="entry",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["file_path"], name="entry_file_path_trgm_idx", opclasses=["gin_trgm_ops"]
+            ),
+        ),
+    ]
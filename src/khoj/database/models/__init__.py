@@ -1,10 +1,33 @@
 import uuid
 
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 from pgvector.django import VectorField
 
 
+class HalfVectorField(models.Field):
+    "Half precision vector. Used to query compact representations of the entry embeddings"
+
+    def __init__(self, *args, dimensions: int = None, **kwargs):
+        self.dimensions = dimensions
+        super().__init__(*args, **kwargs)
+
+    def db_type(self, connection):
+        return f"halfvec({self.dimensions})" if self.dimensions else "halfvec"
+
+
+class BitVectorField(models.Field):
+    "Binary vector. Used to query binary quantized representations of the entry embeddings"
+
+    def __init__(self, *args, dimensions: int = None, **kwargs):
+        self.dimensions = dimensions
+        super().__init__(*args, **kwargs)
+
+    def db_type(self, connection):
+        return f"bit({self.dimensions})" if self.dimensions else "bit"
+
+
 class BaseModel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -15,6 +38,7 @@ class BaseModel(models.Model):
 
 class KhojUser(AbstractUser):
     uuid = models.UUIDField(models.UUIDField(default=uuid.uuid4, editable=False))
+    index_generation = models.IntegerField(default=0)
 
     def save(self, *args, **kwargs):
         if not self.uuid:
@@ -106,10 +130,25 @@ class SearchModelConfig(BaseModel):
     class ModelType(models.TextChoices):
         TEXT = "text"
 
+    class ModelBackend(models.TextChoices):
+        TORCH = "torch"
+        ONNX = "onnx"
+        ONNX_INT8 = "onnx-int8"
+
+    class EmbeddingsStorage(models.TextChoices):
+        FLOAT = "float"
+        HALFVEC = "halfvec"
+        BINARY = "binary"
+
     name = models.CharField(max_length=200, default="default")
     model_type = models.CharField(max_length=200, choices=ModelType.choices, default=ModelType.TEXT)
     bi_encoder = models.CharField(max_length=200, default="thenlper/gte-small")
     cross_encoder = models.CharField(max_length=200, default="cross-encoder/ms-marco-MiniLM-L-6-v2")
+    bi_encoder_dimensions = models.IntegerField(default=None, null=True, blank=True)
+    bi_encoder_backend = models.CharField(max_length=200, choices=ModelBackend.choices, default=ModelBackend.TORCH)
+    embeddings_storage = models.CharField(
+        max_length=200, choices=EmbeddingsStorage.choices, default=EmbeddingsStorage.FLOAT
+    )
 
 
 class TextToImageModelConfig(BaseModel):
@@ -186,6 +225,7 @@ class Entry(BaseModel):
 
     user = models.ForeignKey(KhojUser, on_delete=models.CASCADE, default=None, null=True, blank=True)
     embeddings = VectorField(dimensions=None)
+    search_model = models.ForeignKey(SearchModelConfig, on_delete=models.SET_NULL, default=None, null=True, blank=True)
     raw = models.TextField()
     compiled = models.TextField()
     heading = models.CharField(max_length=1000, default=None, null=True, blank=True)
@@ -196,6 +236,38 @@ class Entry(BaseModel):
     url = models.URLField(max_length=400, default=None, null=True, blank=True)
     hashed_value = models.CharField(max_length=100)
     corpus_id = models.UUIDField(default=uuid.uuid4, editable=False)
+    min_date = models.DateField(default=None, null=True, blank=True)
+    max_date = models.DateField(default=None, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Index date bounds of entries to speed up date filters on entries
+            models.Index(fields=["min_date", "max_date"], name="entry_date_bounds_idx"),
+            # Trigram index to speed up word filters on entries
+            GinIndex(fields=["raw"], name="entry_raw_trgm_idx", opclasses=["gin_trgm_ops"]),
+            # Trigram index to speed up file filters on entries
+            GinIndex(fields=["file_path"], name="entry_file_path_trgm_idx", opclasses=["gin_trgm_ops"]),
+        ]
+
+
+class EmbeddingsCache(BaseModel):
+    "Embeddings of previously indexed text. Keyed by bi-encoder model and md5 hash of the embedded text"
+
+    bi_encoder = models.CharField(max_length=200)
+    bi_encoder_backend = models.CharField(max_length=200, default=SearchModelConfig.ModelBackend.TORCH)
+    hashed_value = models.CharField(max_length=100)
+    embeddings = VectorField(dimensions=None)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["bi_encoder", "bi_encoder_backend", "hashed_value"], name="unique_embeddings_cache_key"
+            ),
+        ]
+        indexes = [
+            # Index last use of cached embeddings to evict least recently used embeddings
+            models.Index(fields=["updated_at"], name="embeddings_cache_updated_idx"),
+        ]
 
 
 class EntryDates(BaseModel):
@@ -206,3 +278,55 @@ class EntryDates(BaseModel):
         indexes = [
             models.Index(fields=["date"]),
         ]
+
+
+class IndexedFile(BaseModel):
+    "Manifest of files indexed for a user. Used to skip parsing files unchanged since they were last indexed"
+
+    user = models.ForeignKey(KhojUser, on_delete=models.CASCADE)
+    file_path = models.CharField(max_length=400)
+    content_hash = models.CharField(max_length=100)
+    # Size and modification time of file on server disk. Set once content of synced file is known to be indexed
+    file_size = models.BigIntegerField(default=None, null=True, blank=True)
+    file_mtime = models.FloatField(default=None, null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "file_path"], name="unique_indexed_file_path"),
+        ]
+
+
+class IndexJob(BaseModel):
+    "Request to update the content index of a user. Queued to be processed by background index workers"
+
+    class Kind(models.TextChoices):
+        # Index files uploaded by a client
+        FILES = "files"
+        # Index content sources configured on the server
+        SERVER = "server"
+
+    class Status(models.TextChoices):
+        QUEUED = "queued"
+        RUNNING = "running"
+        COMPLETED = "completed"
+        FAILED = "failed"
+
+    user = models.ForeignKey(KhojUser, on_delete=models.CASCADE, default=None, null=True, blank=True)
+    kind = models.CharField(max_length=30, choices=Kind.choices, default=Kind.FILES)
+    content_type = models.CharField(max_length=30, default="all")
+    regenerate = models.BooleanField(default=False)
+    # Paths of spooled uploaded files to index, keyed by file type and name of uploaded file
+    files = models.JSONField(default=dict)
+    # Host whose spool directory holds the uploaded files. Only index workers on this host can run the job
+    spool_host = models.CharField(max_length=255, default=None, null=True, blank=True)
+    num_files = models.IntegerField(default=0)
+    status = models.CharField(max_length=30, choices=Status.choices, default=Status.QUEUED)
+    error = models.TextField(default=None, null=True, blank=True)
+    started_at = models.DateTimeField(default=None, null=True, blank=True)
+    finished_at = models.DateTimeField(default=None, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Index queued jobs to quickly find the next job to process
+            models.Index(fields=["status", "created_at"], name="index_job_status_idx"),
+        ]
@@ -13,6 +13,18 @@ import logging
 import threading
 import warnings
 from importlib.metadata import version
+from time import perf_counter
+
+# Track time taken by each step of server startup
+startup_steps: list[tuple[str, float]] = []
+last_startup_step = perf_counter()
+
+
+def record_startup_step(step: str):
+    global last_startup_step
+    startup_steps.append((step, perf_counter() - last_startup_step))
+    last_startup_step = perf_counter()
+
 
 # Ignore non-actionable warnings
 warnings.filterwarnings("ignore", message=r"snapshot_download.py has been made private", category=FutureWarning)
@@ -30,19 +42,24 @@ import schedule
 from django.core.asgi import get_asgi_application
 from django.core.management import call_command
 
+record_startup_step("Import server frameworks")
+
 # Initialize Django
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "khoj.app.settings")
 django.setup()
+record_startup_step("Setup Django")
 
 # Initialize Django Database
 db_migrate_output = io.StringIO()
 with redirect_stdout(db_migrate_output):
     call_command("migrate", "--noinput")
+record_startup_step("Migrate database")
 
 # Initialize Django Static Files
 collectstatic_output = io.StringIO()
 with redirect_stdout(collectstatic_output):
     call_command("collectstatic", "--noinput")
+record_startup_step("Collect static files")
 
 # Initialize the Application Server
 app = FastAPI()
@@ -75,6 +92,8 @@ from khoj.utils import state
 from khoj.utils.cli import cli
 from khoj.utils.initialization import initialization
 
+record_startup_step("Import Khoj modules")
+
 # Setup Logger
 rich_handler = RichHandler(rich_tracebacks=True)
 rich_handler.setFormatter(fmt=logging.Formatter(fmt="%(message)s", datefmt="[%X]"))
@@ -103,6 +122,7 @@ def run(should_start_server=True):
     logger.debug(f"🌍 Initializing Web Client:\n{collectstatic_output.getvalue().strip()}")
 
     initialization()
+    record_startup_step("Initialize admin user and chat settings")
 
     # Create app directory, if it doesn't exist
     state.config_file.parent.mkdir(parents=True, exist_ok=True)
@@ -129,8 +149,13 @@ def run(should_start_server=True):
 
     # Configure Middleware
     configure_middleware(app)
+    record_startup_step("Configure routes and middleware")
 
     initialize_server(args.config)
+    record_startup_step("Initialize search models and content index")
+
+    if args.profile_startup:
+        log_startup_profile()
 
     # If the server is started through gunicorn (external to the script), don't start the server
     if should_start_server:
@@ -148,6 +173,19 @@ def set_state(args):
     state.chat_on_gpu = args.chat_on_gpu
 
 
+def log_startup_profile():
+    "Log time taken by each step of server startup and the heavy packages imported during startup"
+    total_time = sum(duration for _, duration in startup_steps)
+    profile = "\n".join(f"{step:<45}{duration:>8.2f}s" for step, duration in startup_steps)
+    heavy_packages = ["torch", "sentence_transformers", "transformers", "whisper", "gpt4all", "langchain", "openai"]
+    imported_packages = [package for package in heavy_packages if package in sys.modules] or ["none"]
+    logger.info(
+        f"⏱️  Startup profile:\n{profile}\n{'Total':<45}{total_time:>8.2f}s\n"
+        f"Heavy packages imported at startup: {', '.join(imported_packages)}\n"
+        f"Run with python -X importtime to see time taken to import each module"
+    )
+
+
 def start_server(app, host=None, port=None, socket=None):
     logger.info("🌖 Khoj is ready to use")
     if socket:
@@ -9,7 +9,7 @@ from khoj.database.models import Entry as DbEntry
 from khoj.database.models import KhojUser
 from khoj.processor.content.text_to_entries import TextToEntries
 from khoj.utils.constants import empty_escape_sequences
-from khoj.utils.helpers import timer
+from khoj.utils.helpers import parse_files, timer
 from khoj.utils.rawconfig import Entry
 
 logger = logging.getLogger(__name__)
@@ -64,15 +64,14 @@ class MarkdownToEntries(TextToEntries):
 
         entries = []
         entry_to_file_map = []
-        for markdown_file in markdown_files:
-            try:
-                markdown_content = markdown_files[markdown_file]
-                entries, entry_to_file_map = MarkdownToEntries.process_single_markdown_file(
-                    markdown_content, markdown_file, entries, entry_to_file_map
-                )
-            except Exception as e:
+        parsed_files = parse_files(MarkdownToEntries.extract_markdown_file_entries, markdown_files)
+        for markdown_file, markdown_entries_per_file, error in parsed_files:
+            if error:
                 logger.warning(f"Unable to process file: {markdown_file}. This file will not be indexed.")
-                logger.warning(e, exc_info=True)
+                logger.warning(error)
+                continue
+            entry_to_file_map += zip(markdown_entries_per_file, [markdown_file] * len(markdown_entries_per_file))
+            entries.extend(markdown_entries_per_file)
 
         return entries, dict(entry_to_file_map)
 
@@ -80,6 +79,14 @@ class MarkdownToEntries(TextToEntries):
     def process_single_markdown_file(
         markdown_content: str, markdown_file: Path, entries: List, entry_to_file_map: List
     ):
+        markdown_entries_per_file = MarkdownToEntries.extract_markdown_file_entries(markdown_content, markdown_file)
+        entry_to_file_map += zip(markdown_entries_per_file, [markdown_file] * len(markdown_entries_per_file))
+        entries.extend(markdown_entries_per_file)
+        return entries, entry_to_file_map
+
+    @staticmethod
+    def extract_markdown_file_entries(markdown_content: str, markdown_file: Path) -> List[str]:
+        "Split Markdown file into entries by heading"
         markdown_heading_regex = r"^#"
 
         markdown_entries_per_file = []
@@ -90,10 +97,7 @@ class MarkdownToEntries(TextToEntries):
             stripped_entry = entry.strip(empty_escape_sequences)
             if stripped_entry != "":
                 markdown_entries_per_file.append(f"{prefix}{stripped_entry}")
-
-        entry_to_file_map += zip(markdown_entries_per_file, [markdown_file] * len(markdown_entries_per_file))
-        entries.extend(markdown_entries_per_file)
-        return entries, entry_to_file_map
+        return markdown_entries_per_file
 
     @staticmethod
     def convert_markdown_entries_to_maps(parsed_entries: List[str], entry_to_file_map) -> List[Entry]:
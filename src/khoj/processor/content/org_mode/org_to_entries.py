@@ -7,7 +7,7 @@ from khoj.database.models import KhojUser
 from khoj.processor.content.org_mode import orgnode
 from khoj.processor.content.text_to_entries import TextToEntries
 from khoj.utils import state
-from khoj.utils.helpers import timer
+from khoj.utils.helpers import parse_files, timer
 from khoj.utils.rawconfig import Entry
 
 logger = logging.getLogger(__name__)
@@ -61,16 +61,13 @@ class OrgToEntries(TextToEntries):
         "Extract entries from specified Org files"
         entries = []
         entry_to_file_map: List[Tuple[orgnode.Orgnode, str]] = []
-        for org_file in org_files:
-            filename = org_file
-            file = org_files[org_file]
-            try:
-                org_file_entries = orgnode.makelist(file, filename)
-                entry_to_file_map += zip(org_file_entries, [org_file] * len(org_file_entries))
-                entries.extend(org_file_entries)
-            except Exception as e:
+        for org_file, org_file_entries, error in parse_files(orgnode.makelist, org_files):
+            if error:
                 logger.warning(f"Unable to process file: {org_file}. This file will not be indexed.")
-                logger.warning(e, exc_info=True)
+                logger.warning(error)
+                continue
+            entry_to_file_map += zip(org_file_entries, [org_file] * len(org_file_entries))
+            entries.extend(org_file_entries)
 
         return entries, dict(entry_to_file_map)
 
@@ -1,7 +1,7 @@
 import base64
 import logging
 import os
-from datetime import datetime
+import tempfile
 from typing import List, Tuple
 
 from langchain.document_loaders import PyMuPDFLoader
@@ -9,7 +9,7 @@ from langchain.document_loaders import PyMuPDFLoader
 from khoj.database.models import Entry as DbEntry
 from khoj.database.models import KhojUser
 from khoj.processor.content.text_to_entries import TextToEntries
-from khoj.utils.helpers import timer
+from khoj.utils.helpers import parse_files, timer
 from khoj.utils.rawconfig import Entry
 
 logger = logging.getLogger(__name__)
@@ -60,31 +60,34 @@ class PdfToEntries(TextToEntries):
 
         entries = []
         entry_to_location_map = []
-        for pdf_file in pdf_files:
-            try:
-                # Write the PDF file to a temporary file, as it is stored in byte format in the pdf_file object and the PDF Loader expects a file path
-                timestamp_now = datetime.utcnow().timestamp()
-                tmp_file = f"tmp_pdf_file_{timestamp_now}.pdf"
-                with open(f"{tmp_file}", "wb") as f:
-                    bytes = pdf_files[pdf_file]
-                    f.write(bytes)
-                try:
-                    loader = PyMuPDFLoader(f"{tmp_file}", extract_images=True)
-                    pdf_entries_per_file = [page.page_content for page in loader.load()]
-                except ImportError:
-                    loader = PyMuPDFLoader(f"{tmp_file}")
-                    pdf_entries_per_file = [page.page_content for page in loader.load()]
-                entry_to_location_map += zip(pdf_entries_per_file, [pdf_file] * len(pdf_entries_per_file))
-                entries.extend(pdf_entries_per_file)
-            except Exception as e:
+        for pdf_file, pdf_entries_per_file, error in parse_files(PdfToEntries.extract_pdf_file_entries, pdf_files):
+            if error:
                 logger.warning(f"Unable to process file: {pdf_file}. This file will not be indexed.")
-                logger.warning(e, exc_info=True)
-            finally:
-                if os.path.exists(f"{tmp_file}"):
-                    os.remove(f"{tmp_file}")
+                logger.warning(error)
+                continue
+            entry_to_location_map += zip(pdf_entries_per_file, [pdf_file] * len(pdf_entries_per_file))
+            entries.extend(pdf_entries_per_file)
 
         return entries, dict(entry_to_location_map)
 
+    @staticmethod
+    def extract_pdf_file_entries(pdf_content: bytes, pdf_file: str) -> List[str]:
+        "Extract text of each page from PDF file"
+        # Write the PDF file to a temporary file, as it is stored in byte format in the pdf_file object and the PDF Loader expects a file path
+        # Use a unique temporary file as PDF files may be parsed in parallel
+        with tempfile.NamedTemporaryFile(prefix="tmp_pdf_file_", suffix=".pdf", delete=False) as f:
+            f.write(pdf_content)
+            tmp_file = f.name
+        try:
+            try:
+                loader = PyMuPDFLoader(tmp_file, extract_images=True)
+                return [page.page_content for page in loader.load()]
+            except ImportError:
+                loader = PyMuPDFLoader(tmp_file)
+                return [page.page_content for page in loader.load()]
+        finally:
+            os.remove(tmp_file)
+
     @staticmethod
     def convert_pdf_entries_to_maps(parsed_entries: List[str], entry_to_file_map) -> List[Entry]:
         "Convert each PDF entries into a dictionary"
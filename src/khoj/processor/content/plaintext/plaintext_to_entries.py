@@ -7,7 +7,7 @@ from bs4 import BeautifulSoup
 from khoj.database.models import Entry as DbEntry
 from khoj.database.models import KhojUser
 from khoj.processor.content.text_to_entries import TextToEntries
-from khoj.utils.helpers import timer
+from khoj.utils.helpers import parse_files, timer
 from khoj.utils.rawconfig import Entry
 
 logger = logging.getLogger(__name__)
@@ -29,17 +29,12 @@ class PlaintextToEntries(TextToEntries):
             deletion_file_names = None
 
         with timer("Scrub plaintext files and extract text", logger):
-            for file in files:
-                try:
-                    plaintext_content = files[file]
-                    if file.endswith(("html", "htm", "xml")):
-                        plaintext_content = PlaintextToEntries.extract_html_content(
-                            plaintext_content, file.split(".")[-1]
-                        )
-                    files[file] = plaintext_content
-                except Exception as e:
+            for file, plaintext_content, error in parse_files(PlaintextToEntries.extract_plaintext_content, files):
+                if error:
                     logger.warning(f"Unable to read file: {file} as plaintext. Skipping file.")
-                    logger.warning(e, exc_info=True)
+                    logger.warning(error)
+                    continue
+                files[file] = plaintext_content
 
         # Extract Entries from specified plaintext files
         with timer("Parse entries from plaintext files", logger):
@@ -64,6 +59,13 @@ class PlaintextToEntries(TextToEntries):
 
         return num_new_embeddings, num_deleted_embeddings
 
+    @staticmethod
+    def extract_plaintext_content(plaintext_content: str, file: str) -> str:
+        "Extract text from markup files. Return other plaintext files as is"
+        if file.endswith(("html", "htm", "xml")):
+            return PlaintextToEntries.extract_html_content(plaintext_content, file.split(".")[-1])
+        return plaintext_content
+
     @staticmethod
     def extract_html_content(markup_content: str, markup_type: str):
         "Extract content from HTML"
@@ -2,14 +2,20 @@ import hashlib
 import logging
 import uuid
 from abc import ABC, abstractmethod
-from itertools import repeat
-from typing import Any, Callable, List, Set, Tuple
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Set, Tuple
 
+from django.db import transaction
 from tqdm import tqdm
 
-from khoj.database.adapters import EntryAdapters, get_user_search_model_or_default
+from khoj.database.adapters import (
+    EmbeddingsCacheAdapters,
+    EntryAdapters,
+    get_user_search_model_or_default,
+)
 from khoj.database.models import Entry as DbEntry
-from khoj.database.models import EntryDates, KhojUser
+from khoj.database.models import EntryDates, KhojUser, SearchModelConfig
 from khoj.search_filter.date_filter import DateFilter
 from khoj.utils import state
 from khoj.utils.helpers import batcher, is_none_or_empty, timer
@@ -87,8 +93,8 @@ class TextToEntries(ABC):
             hashes_by_file = dict[str, set[str]]()
             current_entry_hashes = list(map(TextToEntries.hash_func(key), current_entries))
             hash_to_current_entries = dict(zip(current_entry_hashes, current_entries))
-            for entry in tqdm(current_entries, desc="Hashing Entries"):
-                hashes_by_file.setdefault(entry.file, set()).add(TextToEntries.hash_func(key)(entry))
+            for entry, entry_hash in zip(current_entries, current_entry_hashes):
+                hashes_by_file.setdefault(entry.file, set()).add(entry_hash)
 
         num_deleted_entries = 0
         if regenerate:
@@ -96,77 +102,127 @@ class TextToEntries(ABC):
                 logger.debug(f"Deleting all entries for file type {file_type}")
                 num_deleted_entries = EntryAdapters.delete_all_entries_by_type(user, file_type)
 
-        hashes_to_process = set()
         with timer("Identified entries to add to database in", logger):
-            for file in tqdm(hashes_by_file, desc="Identify new entries"):
-                hashes_for_file = hashes_by_file[file]
-                existing_entries = DbEntry.objects.filter(
-                    user=user, hashed_value__in=hashes_for_file, file_type=file_type
+            existing_entry_hashes = EntryAdapters.get_existing_entry_hashes(user, file_type, hash_to_current_entries)
+            hashes_to_process = set(hash_to_current_entries) - existing_entry_hashes
+
+        model = get_user_search_model_or_default(user)
+        embeddings_model = self.embeddings_model[model.name]
+        hashes_to_process = list(hashes_to_process)
+        batch_size = 200
+        # Retain added entries to sync the in-process vector index. Else only count them to bound memory use
+        added_entries: list[DbEntry] = []
+        num_added_entries = 0
+        num_embedded_entries = 0
+
+        # Embed next batches of entries while adding embedded batches to the database.
+        # Number of batches in flight is bounded to bound memory used by embeddings.
+        # Each batch is committed when it is added. So progress is kept if indexing is interrupted
+        pending_batches: deque[tuple[list[str], dict, list[str], Optional[Future]]] = deque()
+
+        def add_oldest_batch():
+            nonlocal num_added_entries
+            batch_entries = self.add_embedded_entries(
+                *pending_batches.popleft(), hash_to_current_entries, file_type, file_source, model, user
+            )
+            num_added_entries += len(batch_entries)
+            if state.vector_index is not None:
+                added_entries.extend(batch_entries)
+
+        with timer("Embedded and added entries to database in", logger), ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="khoj-embed"
+        ) as embed_executor:
+            for hashes_batch in tqdm(batcher(hashes_to_process, batch_size), desc="Add entries to database"):
+                hashes_batch = list(hashes_batch)
+                # Reuse cached embeddings of entries. Embed the rest in the background
+                embeddings_by_hash = EmbeddingsCacheAdapters.get_cached_embeddings(model, hashes_batch)
+                hashes_to_embed = [hashed_val for hashed_val in hashes_batch if hashed_val not in embeddings_by_hash]
+                num_embedded_entries += len(hashes_to_embed)
+                data_to_embed = [getattr(hash_to_current_entries[hashed_val], key) for hashed_val in hashes_to_embed]
+                embed_future = (
+                    embed_executor.submit(embeddings_model.embed_documents, data_to_embed) if data_to_embed else None
                 )
-                existing_entry_hashes = set([entry.hashed_value for entry in existing_entries])
-                hashes_to_process |= hashes_for_file - existing_entry_hashes
+                pending_batches.append((hashes_batch, embeddings_by_hash, hashes_to_embed, embed_future))
 
-        embeddings = []
-        with timer("Generated embeddings for entries to add to database in", logger):
-            entries_to_process = [hash_to_current_entries[hashed_val] for hashed_val in hashes_to_process]
-            data_to_embed = [getattr(entry, key) for entry in entries_to_process]
-            model = get_user_search_model_or_default(user)
-            embeddings += self.embeddings_model[model.name].embed_documents(data_to_embed)
+                if len(pending_batches) >= state.index_pipeline_depth:
+                    add_oldest_batch()
 
-        added_entries: list[DbEntry] = []
-        with timer("Added entries to database in", logger):
-            num_items = len(hashes_to_process)
-            assert num_items == len(embeddings)
-            batch_size = min(200, num_items)
-            entry_batches = zip(hashes_to_process, embeddings)
-
-            for entry_batch in tqdm(batcher(entry_batches, batch_size), desc="Add entries to database"):
-                batch_embeddings_to_create = []
-                for entry_hash, new_entry in entry_batch:
-                    entry = hash_to_current_entries[entry_hash]
-                    batch_embeddings_to_create.append(
-                        DbEntry(
-                            user=user,
-                            embeddings=new_entry,
-                            raw=entry.raw,
-                            compiled=entry.compiled,
-                            heading=entry.heading[:1000],  # Truncate to max chars of field allowed
-                            file_path=entry.file,
-                            file_source=file_source,
-                            file_type=file_type,
-                            hashed_value=entry_hash,
-                            corpus_id=entry.corpus_id,
-                        )
-                    )
-                added_entries += DbEntry.objects.bulk_create(batch_embeddings_to_create)
-            logger.debug(f"Added {len(added_entries)} {file_type} entries to database")
-
-        new_dates = []
-        with timer("Indexed dates from added entries in", logger):
-            for added_entry in added_entries:
-                dates_in_entries = zip(self.date_filter.extract_dates(added_entry.raw), repeat(added_entry))
-                dates_to_create = [
-                    EntryDates(date=date, entry=added_entry)
-                    for date, added_entry in dates_in_entries
-                    if not is_none_or_empty(date)
-                ]
-                new_dates += EntryDates.objects.bulk_create(dates_to_create)
-            logger.debug(f"Indexed {len(new_dates)} dates from added {file_type} entries")
+            while pending_batches:
+                add_oldest_batch()
+        logger.debug(f"Added {num_added_entries} {file_type} entries to database")
+
+        if num_embedded_entries > 0 and state.embeddings_cache_max_entries > 0:
+            with timer("Evicted least recently used embeddings from cache in", logger):
+                EmbeddingsCacheAdapters.evict_embeddings()
 
         with timer("Deleted entries identified by server from database in", logger):
-            for file in hashes_by_file:
-                existing_entry_hashes = EntryAdapters.get_existing_entry_hashes_by_file(user, file)
-                to_delete_entry_hashes = set(existing_entry_hashes) - hashes_by_file[file]
-                num_deleted_entries += len(to_delete_entry_hashes)
-                EntryAdapters.delete_entry_by_hash(user, hashed_values=list(to_delete_entry_hashes))
+            if hashes_by_file:
+                num_deleted_entries += EntryAdapters.delete_stale_entries_by_file(user, hashes_by_file)
 
         with timer("Deleted entries requested by clients from database in", logger):
-            if deletion_filenames is not None:
-                for file_path in deletion_filenames:
-                    deleted_count = EntryAdapters.delete_entry_by_file(user, file_path)
-                    num_deleted_entries += deleted_count
+            if deletion_filenames:
+                num_deleted_entries += EntryAdapters.delete_entries_by_files(user, deletion_filenames)
+
+        if num_added_entries > 0 or num_deleted_entries > 0:
+            EntryAdapters.bump_index_generation(user)
+            if state.vector_index is not None and user is not None:
+                with timer("Synced in-process vector index in", logger):
+                    EntryAdapters.sync_vector_index(user, model, added_entries=added_entries)
+
+        return num_added_entries, num_deleted_entries
 
-        return len(added_entries), num_deleted_entries
+    def add_embedded_entries(
+        self,
+        hashes_batch: List[str],
+        embeddings_by_hash: dict,
+        hashes_to_embed: List[str],
+        embed_future: Optional[Future],
+        hash_to_current_entries: dict[str, Entry],
+        file_type: str,
+        file_source: str,
+        model: SearchModelConfig,
+        user: KhojUser,
+    ) -> List[DbEntry]:
+        "Add batch of entries to database once their embeddings are generated. Cache the generated embeddings"
+        new_embeddings_by_hash = dict(zip(hashes_to_embed, embed_future.result() if embed_future else []))
+        EmbeddingsCacheAdapters.cache_embeddings(model, new_embeddings_by_hash)
+        embeddings_by_hash.update(new_embeddings_by_hash)
+
+        entries_to_create = []
+        dates_by_hash: dict[str, list] = dict()
+        for entry_hash in hashes_batch:
+            entry = hash_to_current_entries[entry_hash]
+            dates_by_hash[entry_hash] = [
+                date.date() for date in self.date_filter.extract_dates(entry.raw) if not is_none_or_empty(date)
+            ]
+            entries_to_create.append(
+                DbEntry(
+                    user=user,
+                    embeddings=embeddings_by_hash[entry_hash],
+                    raw=entry.raw,
+                    compiled=entry.compiled,
+                    heading=entry.heading[:1000],  # Truncate to max chars of field allowed
+                    file_path=entry.file,
+                    file_source=file_source,
+                    file_type=file_type,
+                    hashed_value=entry_hash,
+                    corpus_id=entry.corpus_id,
+                    search_model=model,
+                    min_date=min(dates_by_hash[entry_hash], default=None),
+                    max_date=max(dates_by_hash[entry_hash], default=None),
+                )
+            )
+
+        with transaction.atomic():
+            added_entries = DbEntry.objects.bulk_create(entries_to_create)
+            EntryDates.objects.bulk_create(
+                [
+                    EntryDates(date=date, entry=added_entry)
+                    for added_entry in added_entries
+                    for date in dates_by_hash[added_entry.hashed_value]
+                ]
+            )
+        return added_entries
 
     @staticmethod
     def mark_entries_for_update(
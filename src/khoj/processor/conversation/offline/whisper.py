@@ -1,4 +1,5 @@
-import whisper
+import os
+
 from asgiref.sync import sync_to_async
 
 from khoj.utils import state
@@ -8,8 +9,14 @@ async def transcribe_audio_offline(audio_filename: str, model: str) -> str:
     """
     Transcribe audio file offline using Whisper
     """
+    # Transcribe with the Whisper model of the inference server, if configured
+    if state.inference_client:
+        return await state.inference_client.acall("transcribe", model, os.path.abspath(audio_filename))
+
     # Send the audio data to the Whisper API
     if not state.whisper_model:
+        import whisper
+
         state.whisper_model = whisper.load_model(model)
     response = await sync_to_async(state.whisper_model.transcribe)(audio_filename)
     return response["text"]
@@ -7,7 +7,6 @@ from typing import Any, Dict, List
 
 import tiktoken
 from langchain.schema import ChatMessage
-from transformers import AutoTokenizer
 
 from khoj.database.adapters import ConversationAdapters
 from khoj.database.models import KhojUser
@@ -165,6 +164,7 @@ def truncate_messages(
     messages: list[ChatMessage], max_prompt_size, model_name: str, tokenizer_name=None
 ) -> list[ChatMessage]:
     """Truncate messages to fit within max prompt size supported by model"""
+    from transformers import AutoTokenizer
 
     try:
         if model_name.startswith("gpt-"):
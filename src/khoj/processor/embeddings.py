@@ -1,21 +1,259 @@
-from typing import List
+from __future__ import annotations  # to avoid quoting type hints
 
-from sentence_transformers import CrossEncoder, SentenceTransformer
-from torch import nn
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Union
 
-from khoj.utils.helpers import get_device
+import numpy as np
+from tqdm import trange
+
+from khoj.utils.helpers import (
+    MicroBatcher,
+    SizedLRU,
+    get_device,
+    resolve_absolute_path,
+)
 from khoj.utils.rawconfig import SearchResponse
 
+try:
+    import fcntl
+except ImportError:
+    # File locks are unavailable on Windows. Only a single server process is expected to export models there
+    fcntl = None
+
+# Defer importing torch and sentence transformers until a model is loaded to start the server faster
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+    from torch import nn
+
+logger = logging.getLogger(__name__)
+
+# Query embeddings are shared across all embeddings models. Keyed by model name, backend and query.
+# Backends of the same model, like its quantized onnx variant, produce different embeddings for the same query
+query_embeddings_cache = SizedLRU(
+    capacity_bytes=int(os.getenv("KHOJ_QUERY_EMBEDDINGS_CACHE_MB", 32)) * 1024 * 1024,
+    sizeof=lambda item: item.nbytes if hasattr(item, "nbytes") else len(str(item)),
+)
+
+# Cross-encoder scores of recently reranked (query, entry) pairs. Keyed by model name, query and hash of entry
+cross_scores_cache = SizedLRU(
+    capacity_bytes=int(os.getenv("KHOJ_CROSS_SCORES_CACHE_MB", 8)) * 1024 * 1024,
+    sizeof=lambda item: len(str(item)),
+)
+
+
+class OnnxSentenceEncoder:
+    """Run the transformer of a sentence transformer model with ONNX Runtime on the CPU.
+    The transformer is exported to ONNX on first use and optionally quantized to int8 weights.
+    Exposes the subset of the SentenceTransformer interface used by EmbeddingsModel"""
+
+    def __init__(self, model_name: str, quantize: bool = False, model_directory: Path = None):
+        try:
+            import onnxruntime
+        except ModuleNotFoundError as e:
+            logger.info(
+                "There was an error importing onnxruntime. Please run pip install onnxruntime in order to install it."
+            )
+            raise e
+        from sentence_transformers import SentenceTransformer
+
+        sentence_transformer = SentenceTransformer(model_name, device="cpu")
+        self.tokenizer = sentence_transformer.tokenizer
+        self.max_seq_length = sentence_transformer.max_seq_length
+        self.dimensions = sentence_transformer.get_sentence_embedding_dimension()
+        self.normalize = OnnxSentenceEncoder.has_normalize_module(sentence_transformer)
+        self.pooling_mode = OnnxSentenceEncoder.get_pooling_mode(sentence_transformer)
+
+        model_directory = resolve_absolute_path(
+            model_directory or Path(os.getenv("KHOJ_ONNX_MODELS_DIR", "~/.khoj/search/onnx/"))
+        ) / model_name.replace("/", "_")
+        model_path = model_directory / ("model-int8.onnx" if quantize else "model.onnx")
+        self.model_path = model_path
+        if not model_path.exists():
+            OnnxSentenceEncoder.export(sentence_transformer, model_directory / "model.onnx", quantize)
+
+        session_options = onnxruntime.SessionOptions()
+        session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(
+            str(model_path), session_options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+
+    @staticmethod
+    def get_pooling_mode(sentence_transformer: SentenceTransformer) -> str:
+        "Get mode used by the sentence transformer to pool token embeddings into a sentence embedding"
+        pooling_config = sentence_transformer[1].get_config_dict()
+        for pooling_mode in ["cls_token", "mean_tokens", "max_tokens"]:
+            if pooling_config.get(f"pooling_mode_{pooling_mode}"):
+                return pooling_mode
+        raise ValueError(f"Unsupported pooling mode for ONNX backend: {pooling_config}")
+
+    @staticmethod
+    def has_normalize_module(sentence_transformer: SentenceTransformer) -> bool:
+        """Check if sentence transformer normalizes its pooled sentence embeddings.
+        Only transformer, pooling and normalize modules are run by the ONNX backend. Reject models with other modules,
+        like dense layers, as their embeddings would differ from the embeddings of the torch backend"""
+        module_names = [type(module).__name__ for module in sentence_transformer]
+        if module_names[:2] != ["Transformer", "Pooling"] or any(name != "Normalize" for name in module_names[2:]):
+            raise ValueError(f"Unsupported modules for ONNX backend: {module_names}")
+        return "Normalize" in module_names[2:]
+
+    @staticmethod
+    def export(sentence_transformer: SentenceTransformer, model_path: Path, quantize: bool = False):
+        """Export transformer of sentence transformer model to ONNX. Quantize its weights to int8, if requested.
+        Export under a file lock and move exported files into place once written. So server workers starting
+        at the same time export the model once and never load a partially written model"""
+        model_path.parent.mkdir(parents=True, exist_ok=True)
+        quantized_model_path = model_path.with_name("model-int8.onnx")
+        with open(model_path.parent / "export.lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # Model may have been exported by another worker while waiting for the lock
+            if not model_path.exists():
+                temp_model_path = model_path.with_name(f"{model_path.name}.tmp")
+                OnnxSentenceEncoder.export_transformer(sentence_transformer, temp_model_path)
+                os.replace(temp_model_path, model_path)
+            if quantize and not quantized_model_path.exists():
+                from onnxruntime.quantization import QuantType, quantize_dynamic
+
+                temp_quantized_model_path = quantized_model_path.with_name(f"{quantized_model_path.name}.tmp")
+                quantize_dynamic(model_path, temp_quantized_model_path, weight_type=QuantType.QInt8)
+                os.replace(temp_quantized_model_path, quantized_model_path)
+
+    @staticmethod
+    def export_transformer(sentence_transformer: SentenceTransformer, model_path: Path):
+        import torch
+        from torch import nn
+
+        class TokenEmbeddings(nn.Module):
+            def __init__(self, transformer: nn.Module):
+                super().__init__()
+                self.transformer = transformer
+
+            def forward(self, *features):
+                return self.transformer(*features, return_dict=False)[0]
+
+        features = sentence_transformer.tokenize(["Export sentence transformer model to ONNX"])
+        input_names = [name for name in ["input_ids", "attention_mask", "token_type_ids"] if name in features]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["token_embeddings"]}
+
+        logger.info(f"Exporting {model_path.parent.name} model to ONNX. This is a one-time step")
+        with torch.no_grad():
+            torch.onnx.export(
+                TokenEmbeddings(sentence_transformer[0].auto_model).eval(),
+                tuple(features[name] for name in input_names),
+                str(model_path),
+                input_names=input_names,
+                output_names=["token_embeddings"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+            )
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimensions
+
+    def pool(self, token_embeddings: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        "Pool token embeddings of each sentence into a sentence embedding, ignoring padding tokens"
+        if self.pooling_mode == "cls_token":
+            return token_embeddings[:, 0]
+        mask = np.expand_dims(attention_mask, -1).astype(token_embeddings.dtype)
+        if self.pooling_mode == "max_tokens":
+            return np.where(mask > 0, token_embeddings, -1e9).max(axis=1)
+        return (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(
+        self,
+        sentences: Union[str, List[str]],
+        batch_size: int = 32,
+        show_progress_bar: bool = False,
+        normalize_embeddings: bool = False,
+        **kwargs,
+    ) -> np.ndarray:
+        if isinstance(sentences, str):
+            return self.encode([sentences], batch_size, show_progress_bar, normalize_embeddings)[0]
+
+        embeddings = []
+        for start in trange(0, len(sentences), batch_size, desc="Batches", disable=not show_progress_bar):
+            features = self.tokenizer(
+                sentences[start : start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np",
+            )
+            inputs = {name: features[name].astype(np.int64) for name in self.input_names}
+            token_embeddings = self.session.run(None, inputs)[0]
+            embeddings.append(self.pool(token_embeddings, features["attention_mask"]))
+
+        if len(embeddings) == 0:
+            return np.empty((0, self.dimensions), dtype=np.float32)
+        embeddings = np.concatenate(embeddings).astype(np.float32)
+        if normalize_embeddings or self.normalize:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings
+
+
+def get_parameters_size(model: nn.Module) -> int:
+    "Get size of model parameters and buffers in bytes"
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
 
 class EmbeddingsModel:
-    def __init__(self, model_name: str = "thenlper/gte-small"):
+    def __init__(self, model_name: str = "thenlper/gte-small", backend: str = "torch"):
         self.encode_kwargs = {"normalize_embeddings": True}
         self.model_kwargs = {"device": get_device()}
         self.model_name = model_name
-        self.embeddings_model = SentenceTransformer(self.model_name, **self.model_kwargs)
+        self.backend = backend
+        if backend == "torch":
+            from sentence_transformers import SentenceTransformer
+
+            self.embeddings_model = SentenceTransformer(self.model_name, **self.model_kwargs)
+        elif backend in ["onnx", "onnx-int8"]:
+            self.embeddings_model = OnnxSentenceEncoder(self.model_name, quantize=backend == "onnx-int8")
+        else:
+            raise ValueError(f"Unsupported embeddings model backend: {backend}")
+        self.dimensions = self.embeddings_model.get_sentence_embedding_dimension()
+        # Coalesce queries encoded by concurrent requests into a single batch
+        self.query_batcher = MicroBatcher(
+            self.embed_queries,
+            max_batch_size=int(os.getenv("KHOJ_QUERY_BATCH_SIZE", 32)),
+            max_wait_ms=float(os.getenv("KHOJ_QUERY_BATCH_WAIT_MS", 0)),
+            name="query-encoder",
+        )
+
+    @property
+    def memory_bytes(self) -> int:
+        "Approximate memory used by model weights"
+        if isinstance(self.embeddings_model, OnnxSentenceEncoder):
+            return self.embeddings_model.model_path.stat().st_size
+        return get_parameters_size(self.embeddings_model)
+
+    def close(self):
+        self.query_batcher.close()
 
     def embed_query(self, query):
-        return self.embeddings_model.encode([query], show_progress_bar=False, **self.encode_kwargs)[0]
+        return self.query_batcher(query)
+
+    async def aembed_query(self, query):
+        return await self.query_batcher.acall(query)
+
+    def embed_queries(self, queries: List[str]):
+        "Encode queries with filter terms removed in a single batch. Reuse embeddings of recently encoded queries"
+        query_embeddings = {
+            query: query_embeddings_cache.get((self.model_name, self.backend, query)) for query in queries
+        }
+        new_queries = [query for query, embeddings in query_embeddings.items() if embeddings is None]
+        if new_queries:
+            new_embeddings = self.embeddings_model.encode(new_queries, show_progress_bar=False, **self.encode_kwargs)
+            for query, embeddings in zip(new_queries, new_embeddings):
+                query_embeddings[query] = embeddings
+                query_embeddings_cache[(self.model_name, self.backend, query)] = embeddings
+        if len(new_queries) < len(query_embeddings):
+            logger.debug(f"Reused cached query embeddings. Cache stats: {query_embeddings_cache.stats()}")
+        return [query_embeddings[query] for query in queries]
 
     def embed_documents(self, docs):
         return self.embeddings_model.encode(docs, show_progress_bar=True, **self.encode_kwargs).tolist()
@@ -24,9 +262,50 @@ class EmbeddingsModel:
 class CrossEncoderModel:
     def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"):
         self.model_name = model_name
+        from sentence_transformers import CrossEncoder
+
         self.cross_encoder_model = CrossEncoder(model_name=self.model_name, device=get_device())
+        # Coalesce results reranked by concurrent requests into a single batch
+        self.rerank_batcher = MicroBatcher(
+            self.predict_batch,
+            max_batch_size=int(os.getenv("KHOJ_RERANK_BATCH_SIZE", 8)),
+            max_wait_ms=float(os.getenv("KHOJ_RERANK_BATCH_WAIT_MS", 0)),
+            name="cross-encoder",
+        )
+
+    @property
+    def memory_bytes(self) -> int:
+        "Approximate memory used by model weights"
+        return get_parameters_size(self.cross_encoder_model.model)
+
+    def close(self):
+        self.rerank_batcher.close()
 
     def predict(self, query, hits: List[SearchResponse], key: str = "compiled"):
-        cross_inp = [[query, hit.additional[key]] for hit in hits]
-        cross_scores = self.cross_encoder_model.predict(cross_inp, activation_fct=nn.Sigmoid())
+        "Score relevance of hits to query"
+        return self.score(query, [hit.additional[key] for hit in hits])
+
+    def score(self, query: str, texts: List[str]) -> np.ndarray:
+        "Score relevance of texts to query. Reuse scores of recently scored (query, text) pairs"
+        cache_keys = [(self.model_name, query, hashlib.md5(text.encode("utf-8")).hexdigest()) for text in texts]
+        cross_scores = np.array([cross_scores_cache.get(cache_key, np.nan) for cache_key in cache_keys])
+
+        new_indices = np.flatnonzero(np.isnan(cross_scores))
+        if len(new_indices) > 0:
+            cross_inp = [[query, texts[idx]] for idx in new_indices]
+            cross_scores[new_indices] = self.rerank_batcher(cross_inp)
+            for idx in new_indices:
+                cross_scores_cache[cache_keys[idx]] = cross_scores[idx]
+        if len(new_indices) < len(texts):
+            logger.debug(f"Reused cached cross-encoder scores. Cache stats: {cross_scores_cache.stats()}")
         return cross_scores
+
+    def predict_batch(self, batch: List[List[List[str]]]) -> List[np.ndarray]:
+        "Score (query, entry) pairs of multiple requests in a single forward pass. Return scores of each request"
+        cross_inp = [pair for pairs in batch for pair in pairs]
+        if not cross_inp:
+            return [np.empty(0) for _ in batch]
+        from torch import nn
+
+        cross_scores = self.cross_encoder_model.predict(cross_inp, activation_fct=nn.Sigmoid())
+        return np.split(cross_scores, np.cumsum([len(pairs) for pairs in batch])[:-1])
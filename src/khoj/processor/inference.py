@@ -0,0 +1,219 @@
+import logging
+import os
+import secrets
+import threading
+from multiprocessing.connection import Client, Connection, Listener
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+from asgiref.sync import sync_to_async
+
+from khoj.utils.helpers import ModelRegistry, resolve_absolute_path
+from khoj.utils.rawconfig import SearchResponse
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceServer:
+    """Serve search and speech to text models to the server workers on this machine over a Unix socket.
+    Lets the server run multiple workers with a single copy of each model in memory"""
+
+    def __init__(
+        self,
+        socket_path: Path,
+        embeddings_model: ModelRegistry,
+        cross_encoder_model: ModelRegistry,
+        authkey: bytes = None,
+    ):
+        self.socket_path = resolve_absolute_path(socket_path)
+        self.embeddings_model = embeddings_model
+        self.cross_encoder_model = cross_encoder_model
+        # Requests are unpickled. So only serve workers that know the key
+        self.authkey = authkey or get_inference_authkey(self.socket_path, create=True)
+        self.whisper_models: Dict[str, Any] = {}
+        self.whisper_lock = threading.Lock()
+
+    def serve_forever(self):
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        self.socket_path.unlink(missing_ok=True)
+        # Only allow processes of the same user to connect to the inference server.
+        # Create socket with restricted permissions. Restricting them after binding leaves a window to connect
+        previous_umask = os.umask(0o077)
+        try:
+            listener = Listener(str(self.socket_path), family="AF_UNIX", authkey=self.authkey)
+        finally:
+            os.umask(previous_umask)
+        with listener:
+            logger.info(f"🧠 Serving models for inference at {self.socket_path}")
+            while True:
+                try:
+                    connection = listener.accept()
+                except Exception as e:
+                    logger.warning(f"Failed to accept connection to inference server: {e}")
+                    continue
+                threading.Thread(target=self.handle, args=(connection,), daemon=True).start()
+
+    def handle(self, connection: Connection):
+        "Serve requests of a worker thread until it disconnects"
+        with connection:
+            while True:
+                try:
+                    method, model_name, args = connection.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    response = (True, self.call(method, model_name, *args))
+                except Exception as e:
+                    logger.error(f"Failed to run {method} with {model_name} model: {e}", exc_info=True)
+                    response = (False, e)
+                try:
+                    connection.send(response)
+                except Exception:
+                    # Exception may not be picklable
+                    connection.send((False, RuntimeError(str(response[1]))))
+
+    def call(self, method: str, model_name: str, *args):
+        if method == "embed_query":
+            return self.embeddings_model[model_name].embed_query(*args)
+        elif method == "embed_queries":
+            return self.embeddings_model[model_name].embed_queries(*args)
+        elif method == "embed_documents":
+            return self.embeddings_model[model_name].embed_documents(*args)
+        elif method == "dimensions":
+            return self.embeddings_model[model_name].dimensions
+        elif method == "score":
+            return self.cross_encoder_model[model_name].score(*args)
+        elif method == "transcribe":
+            return self.transcribe(model_name, *args)
+        raise ValueError(f"Unsupported inference method: {method}")
+
+    def transcribe(self, model_name: str, audio_filename: str) -> str:
+        import whisper
+
+        with self.whisper_lock:
+            if model_name not in self.whisper_models:
+                self.whisper_models[model_name] = whisper.load_model(model_name)
+        return self.whisper_models[model_name].transcribe(audio_filename)["text"]
+
+
+class InferenceClient:
+    "Run models on the inference server. Each thread uses its own connection to the server"
+
+    def __init__(self, socket_path: Path, authkey: bytes = None):
+        self.socket_path = resolve_absolute_path(socket_path)
+        self.authkey = authkey
+        self._local = threading.local()
+
+    def _connect(self) -> Connection:
+        if getattr(self._local, "connection", None) is None:
+            # Read generated key on connect, as the inference server may start after the client
+            authkey = self.authkey or get_inference_authkey(self.socket_path)
+            self._local.connection = Client(str(self.socket_path), family="AF_UNIX", authkey=authkey)
+        return self._local.connection
+
+    def _disconnect(self):
+        connection = getattr(self._local, "connection", None)
+        self._local.connection = None
+        if connection is not None:
+            connection.close()
+
+    def call(self, method: str, model_name: str, *args):
+        for attempt in range(2):
+            try:
+                connection = self._connect()
+                connection.send((method, model_name, args))
+                success, result = connection.recv()
+                break
+            except (EOFError, OSError) as e:
+                # Reconnect once if the inference server was restarted
+                self._disconnect()
+                if attempt == 1:
+                    raise ConnectionError(f"Failed to reach inference server at {self.socket_path}: {e}") from e
+        if not success:
+            raise result
+        return result
+
+    async def acall(self, method: str, model_name: str, *args):
+        return await sync_to_async(self.call, thread_sensitive=False)(method, model_name, *args)
+
+
+class RemoteEmbeddingsModel:
+    "Embeddings model served by the inference server"
+
+    memory_bytes = 0
+
+    def __init__(self, model_name: str, client: InferenceClient):
+        self.model_name = model_name
+        self.client = client
+        self._dimensions: int = None
+
+    @property
+    def dimensions(self) -> int:
+        if self._dimensions is None:
+            self._dimensions = self.client.call("dimensions", self.model_name)
+        return self._dimensions
+
+    def embed_query(self, query):
+        return self.client.call("embed_query", self.model_name, query)
+
+    async def aembed_query(self, query):
+        return await self.client.acall("embed_query", self.model_name, query)
+
+    def embed_queries(self, queries: List[str]):
+        return self.client.call("embed_queries", self.model_name, queries)
+
+    def embed_documents(self, docs):
+        return self.client.call("embed_documents", self.model_name, docs)
+
+
+class RemoteCrossEncoderModel:
+    "Cross-encoder model served by the inference server"
+
+    memory_bytes = 0
+
+    def __init__(self, model_name: str, client: InferenceClient):
+        self.model_name = model_name
+        self.client = client
+
+    def predict(self, query, hits: List[SearchResponse], key: str = "compiled"):
+        return self.score(query, [hit.additional[key] for hit in hits])
+
+    def score(self, query: str, texts: List[str]) -> np.ndarray:
+        return self.client.call("score", self.model_name, query, texts)
+
+
+def get_inference_authkey(socket_path: Path, create: bool = False) -> bytes:
+    """Get key the server workers authenticate with to the inference server.
+    Use the key set via KHOJ_INFERENCE_AUTHKEY. Else the key generated by the inference server.
+    The generated key is shared via a file next to the socket that only its user can read"""
+    authkey = os.getenv("KHOJ_INFERENCE_AUTHKEY")
+    if authkey:
+        return authkey.encode()
+
+    key_path = resolve_absolute_path(socket_path).with_suffix(".key")
+    if create and not key_path.exists():
+        key_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            # Key generated by another inference server process
+            pass
+        else:
+            with os.fdopen(fd, "w") as f:
+                f.write(secrets.token_hex(32))
+    try:
+        return key_path.read_text().strip().encode()
+    except FileNotFoundError:
+        raise ConnectionError(
+            f"No key to authenticate with inference server at {socket_path}. "
+            "Set KHOJ_INFERENCE_AUTHKEY or start the inference server first"
+        )
+
+
+def initialize_inference_client() -> InferenceClient:
+    "Use models of the inference server if configured via environment variables. Else load models in process"
+    socket_path = os.getenv("KHOJ_INFERENCE_SOCKET")
+    if not socket_path:
+        return None
+    return InferenceClient(Path(socket_path))
@@ -1,4 +1,3 @@
-import concurrent.futures
 import json
 import logging
 import math
@@ -13,17 +12,18 @@ from fastapi.requests import Request
 from fastapi.responses import Response, StreamingResponse
 from starlette.authentication import requires
 
-from khoj.configure import configure_server
 from khoj.database import adapters
 from khoj.database.adapters import (
     ConversationAdapters,
     EntryAdapters,
-    get_user_search_model_or_default,
+    IndexJobAdapters,
+    aget_user_search_model_or_default,
 )
 from khoj.database.models import ChatModelOptions
 from khoj.database.models import Entry as DbEntry
 from khoj.database.models import (
     GithubConfig,
+    IndexJob,
     KhojUser,
     LocalMarkdownConfig,
     LocalOrgConfig,
@@ -50,6 +50,7 @@ from khoj.routers.helpers import (
     update_telemetry_state,
     validate_conversation_config,
 )
+from khoj.routers.indexer import notify_index_workers, wait_for_index_job
 from khoj.search_filter.date_filter import DateFilter
 from khoj.search_filter.file_filter import FileFilter
 from khoj.search_filter.word_filter import WordFilter
@@ -62,6 +63,7 @@ from khoj.utils.helpers import (
     command_descriptions,
     get_device,
     is_none_or_empty,
+    run_in_cpu_executor,
     timer,
 )
 from khoj.utils.rawconfig import (
@@ -403,6 +405,12 @@ def get_config_types(
     ]
 
 
+def get_search_cache_key(
+    user_query: str, n: int, t: SearchType, r: bool, max_distance: float, dedupe: bool, hybrid: bool
+) -> str:
+    return f"{user_query}-{n}-{t}-{r}-{max_distance}-{dedupe}-{hybrid}"
+
+
 @api.get("/search", response_model=List[SearchResponse])
 @requires(["authenticated"])
 async def search(
@@ -414,6 +422,7 @@ async def search(
     r: Optional[bool] = False,
     max_distance: Optional[Union[float, None]] = None,
     dedupe: Optional[bool] = True,
+    hybrid: Optional[bool] = False,
 ):
     user = request.user.object
     start_time = time.time()
@@ -428,14 +437,14 @@ async def search(
     user_query = q.strip()
     results_count = n or 5
     max_distance = max_distance or math.inf
-    search_futures: List[concurrent.futures.Future] = []
 
     # return cached results, if available
     if user:
-        query_cache_key = f"{user_query}-{n}-{t}-{r}-{max_distance}-{dedupe}"
-        if query_cache_key in state.query_cache[user.uuid]:
+        query_cache_key = get_search_cache_key(user_query, n, t, r, max_distance, dedupe, hybrid)
+        cached_results = state.query_cache.get(user, query_cache_key)
+        if cached_results is not None:
             logger.debug(f"Return response from query cache")
-            return state.query_cache[user.uuid][query_cache_key]
+            return cached_results
 
     # Encode query with filter terms removed
     defiltered_query = user_query
@@ -445,10 +454,11 @@ async def search(
     encoded_asymmetric_query = None
     if t != SearchType.Image:
         with timer("Encoding query took", logger=logger):
-            search_model = await sync_to_async(get_user_search_model_or_default)(user)
-            encoded_asymmetric_query = state.embeddings_model[search_model.name].embed_query(defiltered_query)
+            search_model = await aget_user_search_model_or_default(user)
+            embeddings_model = await state.embeddings_model.aget(search_model.name)
+            encoded_asymmetric_query = await embeddings_model.aembed_query(defiltered_query)
 
-    with concurrent.futures.ThreadPoolExecutor() as executor:
+    with timer("Query took", logger):
         if t in [
             SearchType.All,
             SearchType.Org,
@@ -459,56 +469,49 @@ async def search(
             SearchType.Pdf,
         ]:
             # query markdown notes
-            search_futures += [
-                executor.submit(
-                    text_search.query,
-                    user,
-                    user_query,
-                    t,
-                    question_embedding=encoded_asymmetric_query,
-                    max_distance=max_distance,
+            hits = await text_search.query(
+                user,
+                user_query,
+                t,
+                question_embedding=encoded_asymmetric_query,
+                max_distance=max_distance,
+                hybrid=hybrid,
+            )
+            # Collate results
+            results += text_search.collate_results(hits, dedupe=dedupe)
+
+            # Sort results across all content types and take top results
+            results = (
+                await run_in_cpu_executor(
+                    text_search.rerank_and_sort_results,
+                    results,
+                    query=defiltered_query,
+                    rank_results=r,
+                    search_model_name=search_model.name,
                 )
-            ]
+            )[:results_count]
 
         elif (t == SearchType.Image) and state.content_index.image and state.search_models.image_search:
             # query images
-            search_futures += [
-                executor.submit(
-                    image_search.query,
-                    user_query,
-                    results_count,
-                    state.search_models.image_search,
-                    state.content_index.image,
-                )
-            ]
-
-        # Query across each requested content types in parallel
-        with timer("Query took", logger):
-            for search_future in concurrent.futures.as_completed(search_futures):
-                if t == SearchType.Image and state.content_index.image:
-                    hits = await search_future.result()
-                    output_directory = constants.web_directory / "images"
-                    # Collate results
-                    results += image_search.collate_results(
-                        hits,
-                        image_names=state.content_index.image.image_names,
-                        output_directory=output_directory,
-                        image_files_url="/static/images",
-                        count=results_count,
-                    )
-                else:
-                    hits = await search_future.result()
-                    # Collate results
-                    results += text_search.collate_results(hits, dedupe=dedupe)
-
-                    # Sort results across all content types and take top results
-                    results = text_search.rerank_and_sort_results(
-                        results, query=defiltered_query, rank_results=r, search_model_name=search_model.name
-                    )[:results_count]
+            hits = await image_search.query(
+                user_query,
+                results_count,
+                state.search_models.image_search,
+                state.content_index.image,
+            )
+            output_directory = constants.web_directory / "images"
+            # Collate results
+            results += image_search.collate_results(
+                hits,
+                image_names=state.content_index.image.image_names,
+                output_directory=output_directory,
+                image_files_url="/static/images",
+                count=results_count,
+            )
 
     # Cache results
     if user:
-        state.query_cache[user.uuid][query_cache_key] = results
+        state.query_cache.set(user, query_cache_key, results)
 
     update_telemetry_state(
         request=request,
@@ -525,11 +528,12 @@ async def search(
 
 @api.get("/update")
 @requires(["authenticated"])
-def update(
+async def update(
     request: Request,
     common: CommonQueryParams,
     t: Optional[SearchType] = None,
     force: Optional[bool] = False,
+    wait: bool = True,
 ):
     user = request.user.object
     if not state.config:
@@ -537,7 +541,15 @@ def update(
         logger.warning(error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
     try:
-        configure_server(state.config, regenerate=force, search_type=t, user=user)
+        # Queue server update to run in the background
+        job = await IndexJobAdapters.aenqueue_job(
+            user, IndexJob.Kind.SERVER, content_type=t.value if t else "all", regenerate=force
+        )
+        notify_index_workers()
+        if wait:
+            job = await wait_for_index_job(job, user)
+            if job.status == IndexJob.Status.FAILED:
+                raise RuntimeError(job.error)
     except Exception as e:
         error_msg = f"🚨 Failed to update server via API: {e}"
         logger.error(error_msg, exc_info=True)
@@ -549,7 +561,7 @@ def update(
         if state.content_index:
             components.append("Content index")
         components_msg = ", ".join(components)
-        logger.info(f"📪 {components_msg} updated via API")
+        logger.info(f"📪 {components_msg} {'updated' if wait else 'update queued'} via API")
 
     update_telemetry_state(
         request=request,
@@ -558,7 +570,9 @@ def update(
         **common.__dict__,
     )
 
-    return {"status": "ok", "message": "khoj reloaded"}
+    if not wait:
+        return {"status": "ok", "message": "khoj reload queued", "job_id": job.id}
+    return {"status": "ok", "message": "khoj reloaded", "job_id": job.id}
 
 
 @api.get("/chat/starters", response_class=Response)
@@ -875,19 +889,33 @@ async def extract_references_and_questions(
     # Collate search results as context for GPT
     with timer("Searching knowledge base took", logger):
         result_list = []
-        for query in inferred_queries:
-            n_items = min(n, 3) if using_offline_chat else n
-            result_list.extend(
-                await search(
-                    f"{query} {filters_in_query}",
-                    request=request,
-                    n=n_items,
-                    r=True,
-                    max_distance=d,
-                    dedupe=False,
-                    common=common,
-                )
-            )
+        n_items = min(n, 3) if using_offline_chat else n
+        max_distance = d or math.inf
+        search_model = await aget_user_search_model_or_default(user)
+        # Apply filters in user message to each inferred query, in addition to filters in the inferred query
+        search_queries = [f"{query} {filters_in_query}".strip() for query in inferred_queries]
+        # Reuse cached results of queries recently searched with the same parameters. Search the rest in one batch
+        cache_keys = [
+            get_search_cache_key(query, n_items, SearchType.All, True, max_distance, False, False)
+            for query in search_queries
+        ]
+        cached_results = [state.query_cache.get(user, cache_key) if user else None for cache_key in cache_keys]
+        uncached_queries = [query for query, results in zip(search_queries, cached_results) if results is None]
+        hits_by_query = iter(await text_search.query_batch(user, uncached_queries, max_distance=max_distance))
+        for query, cache_key, results in zip(search_queries, cache_keys, cached_results):
+            if results is None:
+                results = (
+                    await run_in_cpu_executor(
+                        text_search.rerank_and_sort_results,
+                        list(text_search.collate_results(next(hits_by_query), dedupe=False)),
+                        query=text_search.defilter_query(query),
+                        rank_results=True,
+                        search_model_name=search_model.name,
+                    )
+                )[:n_items]
+                if user:
+                    state.query_cache.set(user, cache_key, results)
+            result_list.extend(results)
         result_list = text_search.deduplicated_search_responses(result_list)
         compiled_references = [item.additional["compiled"] for item in result_list]
 
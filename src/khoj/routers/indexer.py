@@ -1,12 +1,23 @@
 import asyncio
 import logging
-from typing import Dict, Optional, Union
-
-from fastapi import APIRouter, Depends, Header, Request, Response, UploadFile
+import os
+import shutil
+import socket
+import threading
+import uuid
+from datetime import timedelta
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connection
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, UploadFile
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from starlette.authentication import requires
 
-from khoj.database.models import GithubConfig, KhojUser, NotionConfig
+from khoj.database.adapters import EntryAdapters, IndexedFileAdapters, IndexJobAdapters
+from khoj.database.models import GithubConfig, IndexJob, KhojUser, NotionConfig
 from khoj.processor.content.github.github_to_entries import GithubToEntries
 from khoj.processor.content.markdown.markdown_to_entries import MarkdownToEntries
 from khoj.processor.content.notion.notion_to_entries import NotionToEntries
@@ -17,7 +28,7 @@ from khoj.routers.helpers import ApiIndexedDataLimiter, update_telemetry_state
 from khoj.search_type import image_search, text_search
 from khoj.utils import constants, state
 from khoj.utils.config import ContentIndex, SearchModels
-from khoj.utils.helpers import LRU, get_file_type
+from khoj.utils.helpers import get_file_type, resolve_absolute_path
 from khoj.utils.rawconfig import ContentConfig, FullConfig, SearchConfig
 from khoj.utils.yaml import save_config_to_file_updated_state
 
@@ -25,6 +36,16 @@ logger = logging.getLogger(__name__)
 
 indexer = APIRouter()
 
+# Index jobs are processed by background worker threads to avoid blocking requests on indexing
+index_job_workers: list[threading.Thread] = []
+index_job_workers_lock = threading.Lock()
+index_job_queued = threading.Event()
+# Uploaded files are spooled to disk until they are indexed
+index_spool_directory = resolve_absolute_path(os.getenv("KHOJ_INDEX_SPOOL_DIR", "~/.khoj/index_spool"))
+# Jobs of spooled files are only run by index workers on the host that spooled them.
+# Set the same spool host on all hosts if the spool directory is on storage shared by them
+index_spool_host = os.getenv("KHOJ_INDEX_SPOOL_HOST", socket.gethostname())
+
 
 class File(BaseModel):
     path: str
@@ -35,11 +56,14 @@ class IndexBatchRequest(BaseModel):
     files: list[File]
 
 
-class IndexerInput(BaseModel):
-    org: Optional[dict[str, str]] = None
-    markdown: Optional[dict[str, str]] = None
-    pdf: Optional[dict[str, bytes]] = None
-    plaintext: Optional[dict[str, str]] = None
+class FileHash(BaseModel):
+    path: str
+    # SHA-256 hash of file content
+    hash: str
+
+
+class IndexSyncRequest(BaseModel):
+    files: list[FileHash]
 
 
 @indexer.post("/update")
@@ -49,6 +73,7 @@ async def update(
     files: list[UploadFile],
     force: bool = False,
     t: Optional[Union[state.SearchType, str]] = state.SearchType.All,
+    wait: bool = True,
     client: Optional[str] = None,
     user_agent: Optional[str] = Header(None),
     referer: Optional[str] = Header(None),
@@ -65,36 +90,8 @@ async def update(
     user = request.user.object
     try:
         logger.info(f"📬 Updating content index via API call by {client} client")
-        org_files: Dict[str, str] = {}
-        markdown_files: Dict[str, str] = {}
-        pdf_files: Dict[str, bytes] = {}
-        plaintext_files: Dict[str, str] = {}
-
-        for file in files:
-            file_type, encoding = get_file_type(file.content_type)
-            dict_to_update = None
-            if file_type == "org":
-                dict_to_update = org_files
-            elif file_type == "markdown":
-                dict_to_update = markdown_files
-            elif file_type == "pdf":
-                dict_to_update = pdf_files  # type: ignore
-            elif file_type == "plaintext":
-                dict_to_update = plaintext_files
-
-            if dict_to_update is not None:
-                dict_to_update[file.filename] = (
-                    file.file.read().decode("utf-8") if encoding == "utf-8" else file.file.read()  # type: ignore
-                )
-            else:
-                logger.warning(f"Skipped indexing unsupported file type sent by {client} client: {file.filename}")
-
-        indexer_input = IndexerInput(
-            org=org_files,
-            markdown=markdown_files,
-            pdf=pdf_files,
-            plaintext=plaintext_files,
-        )
+        # Stream uploaded files to spool directory instead of reading them into memory
+        spooled_files = await sync_to_async(spool_uploaded_files, thread_sensitive=False)(files, user, client)
 
         if state.config == None:
             logger.info("📬 Initializing content index on first run.")
@@ -117,22 +114,23 @@ async def update(
             save_config_to_file_updated_state()
             configure_search(state.search_models, state.config.search_type)
 
-        # Extract required fields from config
-        loop = asyncio.get_event_loop()
-        state.content_index, success = await loop.run_in_executor(
-            None,
-            configure_content,
-            state.content_index,
-            state.config.content_type,
-            indexer_input.model_dump(),
-            state.search_models,
-            force,
-            t,
-            False,
+        # Queue files to be indexed in the background
+        job = await IndexJobAdapters.aenqueue_job(
             user,
+            IndexJob.Kind.FILES,
+            content_type=t.value if isinstance(t, state.SearchType) else t,
+            regenerate=force,
+            files=spooled_files,
+            spool_host=index_spool_host,
         )
-        if not success:
-            raise RuntimeError("Failed to update content index")
+        notify_index_workers()
+        if not wait:
+            logger.info(f"Queued batch indexing request as index job {job.id}")
+            return JSONResponse(content={"job_id": job.id, "status": job.status}, status_code=202)
+
+        job = await wait_for_index_job(job, user)
+        if job.status == IndexJob.Status.FAILED:
+            raise RuntimeError(f"Failed to update content index: {job.error}")
         logger.info(f"Finished processing batch indexing request")
     except Exception as e:
         logger.error(f"Failed to process batch indexing request: {e}", exc_info=True)
@@ -143,10 +141,10 @@ async def update(
         return Response(content="Failed", status_code=500)
 
     indexing_metadata = {
-        "num_org": len(org_files),
-        "num_markdown": len(markdown_files),
-        "num_pdf": len(pdf_files),
-        "num_plaintext": len(plaintext_files),
+        "num_org": len(spooled_files["org"]),
+        "num_markdown": len(spooled_files["markdown"]),
+        "num_pdf": len(spooled_files["pdf"]),
+        "num_plaintext": len(spooled_files["plaintext"]),
     }
 
     update_telemetry_state(
@@ -165,6 +163,239 @@ async def update(
     return Response(content="OK", status_code=200)
 
 
+@indexer.post("/sync")
+@requires(["authenticated"])
+async def sync(
+    request: Request,
+    body: IndexSyncRequest,
+    client: Optional[str] = None,
+    user_agent: Optional[str] = Header(None),
+    referer: Optional[str] = Header(None),
+    host: Optional[str] = Header(None),
+):
+    """Get files a client needs to upload to sync the content index with its files.
+    Clients send the path and content hash of their files. Only files that are new or changed need to be uploaded
+    to the update endpoint. Clients track files deleted on their side, as other clients may have indexed files
+    of the user that this client does not have"""
+    user = request.user.object
+    files_to_upload = await sync_to_async(IndexedFileAdapters.get_files_to_sync)(
+        user, {file.path: file.hash for file in body.files}
+    )
+
+    update_telemetry_state(
+        request=request,
+        telemetry_type="api",
+        api="index/sync",
+        client=client,
+        user_agent=user_agent,
+        referer=referer,
+        host=host,
+        metadata={"num_files": len(body.files), "num_upload": len(files_to_upload)},
+    )
+
+    logger.info(f"📬 {client} client needs to upload {len(files_to_upload)} of {len(body.files)} files to sync")
+    return {"upload": files_to_upload}
+
+
+@indexer.get("/jobs")
+@requires(["authenticated"])
+async def get_index_jobs(request: Request, limit: int = 20):
+    "Get recent index jobs of the user"
+    jobs = await IndexJobAdapters.aget_jobs(request.user.object, limit)
+    return [serialize_index_job(job) for job in jobs]
+
+
+@indexer.get("/jobs/{job_id}")
+@requires(["authenticated"])
+async def get_index_job(request: Request, job_id: int):
+    "Get status of an index job of the user"
+    job = await IndexJobAdapters.aget_job(job_id, request.user.object)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Index job {job_id} not found")
+    return serialize_index_job(job)
+
+
+def serialize_index_job(job: IndexJob) -> dict:
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "content_type": job.content_type,
+        "status": job.status,
+        "num_files": job.num_files,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+def spool_uploaded_files(files: list[UploadFile], user: KhojUser, client: str = None) -> dict[str, dict[str, str]]:
+    "Copy uploaded files to spool directory in chunks. Return paths of spooled files by file type and file name"
+    spool_directory = index_spool_directory / str(user.uuid if user else "default")
+    spool_directory.mkdir(parents=True, exist_ok=True)
+
+    spooled_files: dict[str, dict[str, str]] = {"org": {}, "markdown": {}, "pdf": {}, "plaintext": {}}
+    for file in files:
+        file_type, _ = get_file_type(file.content_type)
+        if file_type not in spooled_files:
+            logger.warning(f"Skipped indexing unsupported file type sent by {client} client: {file.filename}")
+            continue
+        spool_path = spool_directory / uuid.uuid4().hex
+        with open(spool_path, "wb") as spool_file:
+            shutil.copyfileobj(file.file, spool_file)
+        spooled_files[file_type][file.filename] = str(spool_path)
+    return spooled_files
+
+
+def read_spooled_files(
+    files: dict[str, dict[str, str]], max_batch_bytes: int
+) -> Iterator[tuple[str, dict[str, Union[str, bytes]]]]:
+    "Read spooled files of each file type in batches of bounded size"
+    for file_type, spool_paths in files.items():
+        batch: dict[str, Union[str, bytes]] = {}
+        batch_bytes = 0
+        for file_name, spool_path in spool_paths.items():
+            file_size = os.path.getsize(spool_path)
+            if batch and batch_bytes + file_size > max_batch_bytes:
+                yield file_type, batch
+                batch, batch_bytes = {}, 0
+            with open(spool_path, "rb") as spool_file:
+                content = spool_file.read()
+            batch[file_name] = content if file_type == "pdf" else content.decode("utf-8")
+            batch_bytes += file_size
+        if batch:
+            yield file_type, batch
+
+
+def remove_spooled_files(files: dict[str, dict[str, str]]):
+    for spool_paths in files.values():
+        for spool_path in spool_paths.values():
+            Path(spool_path).unlink(missing_ok=True)
+
+
+async def wait_for_index_job(job: IndexJob, user: KhojUser, poll_interval: float = 0.5) -> IndexJob:
+    "Wait for index job to finish without blocking the event loop"
+    while job.status not in [IndexJob.Status.COMPLETED, IndexJob.Status.FAILED]:
+        await asyncio.sleep(poll_interval)
+        job = await IndexJobAdapters.aget_job(job.id, user)
+    return job
+
+
+def notify_index_workers():
+    "Start index workers, if not already running, and wake them up to process queued jobs"
+    with index_job_workers_lock:
+        if not index_job_workers:
+            for worker_id in range(int(os.getenv("KHOJ_INDEX_WORKERS", 1))):
+                worker = threading.Thread(target=process_index_jobs, name=f"khoj-indexer-{worker_id}", daemon=True)
+                worker.start()
+                index_job_workers.append(worker)
+    index_job_queued.set()
+
+
+def process_index_jobs(poll_interval: float = 5.0):
+    "Process queued index jobs. Poll for jobs queued by other server workers"
+    stale_after = timedelta(minutes=int(os.getenv("KHOJ_INDEX_JOB_TIMEOUT_MINUTES", 60)))
+    while True:
+        index_job_queued.clear()
+        try:
+            job = IndexJobAdapters.claim_next_job(stale_after, spool_host=index_spool_host)
+            if job is not None:
+                run_index_job(job, heartbeat_interval=stale_after.total_seconds() / 4)
+        except Exception as e:
+            logger.error(f"🚨 Failed to process index jobs: {e}", exc_info=True)
+            job = None
+        finally:
+            close_old_connections()
+        if job is None:
+            index_job_queued.wait(timeout=poll_interval)
+
+
+def send_index_job_heartbeats(job_id: int, stopped: threading.Event, interval: float):
+    "Refresh running job until it is stopped. So other workers do not requeue it as stale while it runs"
+    try:
+        while not stopped.wait(interval):
+            IndexJobAdapters.heartbeat_job(job_id)
+    except Exception as e:
+        logger.error(f"🚨 Failed to send heartbeat of index job {job_id}: {e}", exc_info=True)
+    finally:
+        connection.close()
+
+
+def run_index_job(job: IndexJob, heartbeat_interval: float = 60):
+    logger.info(f"📬 Running index job {job.id} to update {job.content_type} content of {job.num_files} files")
+    # Finishing the job clears its files. So keep paths of its spooled files to remove them after
+    spooled_files = job.files
+    heartbeat_stopped = threading.Event()
+    heartbeat = threading.Thread(
+        target=send_index_job_heartbeats,
+        args=(job.id, heartbeat_stopped, heartbeat_interval),
+        name=f"khoj-index-job-{job.id}-heartbeat",
+        daemon=True,
+    )
+    heartbeat.start()
+    try:
+        if job.kind == IndexJob.Kind.SERVER:
+            from khoj.configure import configure_server
+
+            search_type = None if job.content_type == "all" else job.content_type
+            configure_server(state.config, regenerate=job.regenerate, search_type=search_type, user=job.user)
+        else:
+            index_files(job)
+    except Exception as e:
+        logger.error(f"🚨 Failed to run index job {job.id}: {e}", exc_info=True)
+        IndexJobAdapters.finish_job(job, error=str(e))
+    else:
+        IndexJobAdapters.finish_job(job)
+        logger.info(f"📪 Finished index job {job.id}")
+    finally:
+        heartbeat_stopped.set()
+        heartbeat.join()
+        remove_spooled_files(spooled_files)
+
+
+def index_files(job: IndexJob):
+    "Index spooled files of job in batches to bound memory used. Then update other content sources of the job"
+    max_batch_bytes = int(os.getenv("KHOJ_INDEX_BATCH_MB", 16)) * 1024 * 1024
+    regenerated_file_types = set()
+    success = True
+    for file_type, batch in read_spooled_files(job.files, max_batch_bytes):
+        if job.content_type not in [state.SearchType.All.value, file_type]:
+            continue
+        files = {"org": {}, "markdown": {}, "pdf": {}, "plaintext": {}, file_type: batch}
+        # Only regenerate index of file type with its first batch. Else it'd delete entries of its previous batches
+        regenerate = job.regenerate and file_type not in regenerated_file_types
+        regenerated_file_types.add(file_type)
+        state.content_index, batch_success = configure_content(
+            state.content_index,
+            state.config.content_type,
+            files,
+            state.search_models,
+            regenerate,
+            file_type,
+            False,
+            job.user,
+        )
+        success = success and batch_success
+
+    # Update content sources not uploaded as files, like images, Github and Notion
+    if job.content_type not in ["org", "markdown", "pdf", "plaintext"]:
+        empty_files: dict = {"org": {}, "markdown": {}, "pdf": {}, "plaintext": {}}
+        state.content_index, sources_success = configure_content(
+            state.content_index,
+            state.config.content_type,
+            empty_files,
+            state.search_models,
+            job.regenerate,
+            job.content_type,
+            False,
+            job.user,
+        )
+        success = success and sources_success
+
+    if not success:
+        raise RuntimeError("Failed to update content index")
+
+
 def configure_search(search_models: SearchModels, search_config: Optional[SearchConfig]) -> Optional[SearchModels]:
     # Run Validation Checks
     if search_models is None:
@@ -290,6 +521,7 @@ def configure_content(
             content_index.image = image_search.setup(
                 content_config.image, search_models.image_search.image_encoder, regenerate=regenerate
             )
+            EntryAdapters.bump_index_generation(user)
 
     except Exception as e:
         logger.error(f"🚨 Failed to setup images: {e}", exc_info=True)
@@ -335,10 +567,6 @@ def configure_content(
         logger.error(f"🚨 Failed to setup Notion: {e}", exc_info=True)
         success = False
 
-    # Invalidate Query Cache
-    if user:
-        state.query_cache[user.uuid] = LRU()
-
     return content_index, success
 
 
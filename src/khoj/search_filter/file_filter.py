@@ -2,7 +2,7 @@ import fnmatch
 import logging
 import re
 from collections import defaultdict
-from typing import List
+from typing import Dict, List
 
 from khoj.search_filter.base_filter import BaseFilter
 from khoj.utils.helpers import LRU, timer
@@ -22,6 +22,20 @@ class FileFilter(BaseFilter):
         "Get all filter terms in query"
         return [f"{self.convert_to_regex(term)}" for term in re.findall(self.file_filter_regex, query)]
 
+    def get_file_path_matchers(self, query: str) -> List[Dict[str, str]]:
+        "Get matchers for file paths of all file filters in query"
+        return [self.convert_to_matcher(term) for term in re.findall(self.file_filter_regex, query)]
+
+    def convert_to_matcher(self, file_filter: str) -> Dict[str, str]:
+        """Convert file filter to substring match on file path, where possible. Else to regex.
+        File filters match anywhere in the file path. So wildcards at the start or end of a filter match anything.
+        Substring matches are served by the trigram index on file paths without evaluating a regex"""
+        substring = file_filter.strip("*")
+        if substring and "*" not in substring and re.search(r"[\\^$|?+()\[\]{}]", substring) is None:
+            return {"contains": substring}
+        # Fallback to regex for more complex file filters
+        return {"regex": self.convert_to_regex(file_filter)}
+
     def convert_to_regex(self, file_filter: str) -> str:
         "Convert file filter to regex"
         return file_filter.replace(".", r"\.").replace("*", r".*")
@@ -27,3 +27,8 @@ class WordFilter(BaseFilter):
 
     def defilter(self, query: str) -> str:
         return re.sub(self.blocked_regex, "", re.sub(self.required_regex, "", query)).strip()
+
+    @staticmethod
+    def escape_like(word: str) -> str:
+        "Escape characters in word that have special meaning in SQL LIKE patterns"
+        return word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
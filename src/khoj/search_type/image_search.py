@@ -6,9 +6,7 @@ import pathlib
 import shutil
 from typing import List
 
-import torch
 from PIL import Image
-from sentence_transformers import SentenceTransformer, util
 from tqdm import trange
 
 from khoj.utils.config import ImageContent, ImageSearchModel
@@ -27,6 +25,8 @@ logger = logging.getLogger(__name__)
 
 
 def initialize_model(search_config: ImageSearchConfig):
+    from sentence_transformers import SentenceTransformer
+
     # Convert model directory to absolute path
     search_config.model_directory = resolve_absolute_path(search_config.model_directory)
 
@@ -68,6 +68,8 @@ def compute_embeddings(image_names, encoder, embeddings_file, batch_size=50, use
 
 
 def compute_image_embeddings(image_names, encoder, embeddings_file, batch_size=50, regenerate=False):
+    import torch
+
     # Load pre-computed image embeddings from file if exists
     if resolve_absolute_path(embeddings_file).exists() and not regenerate:
         image_embeddings = torch.load(embeddings_file)
@@ -97,6 +99,8 @@ def compute_image_embeddings(image_names, encoder, embeddings_file, batch_size=5
 def compute_metadata_embeddings(
     image_names, encoder, embeddings_file, batch_size=50, use_xmp_metadata=False, regenerate=False, verbose=0
 ):
+    import torch
+
     image_metadata_embeddings = None
 
     # Load pre-computed image metadata embedding file if exists
@@ -146,6 +150,8 @@ def extract_metadata(image_name):
 async def query(
     raw_query, count, search_model: ImageSearchModel, content: ImageContent, score_threshold: float = math.inf
 ):
+    from sentence_transformers import util
+
     # Set query to image content if query is of form file:/path/to/file.png
     if raw_query.startswith("file:") and pathlib.Path(raw_query[5:]).is_file():
         query_imagepath = resolve_absolute_path(pathlib.Path(raw_query[5:]), strict=True)
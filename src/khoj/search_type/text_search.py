@@ -1,23 +1,29 @@
 import logging
 import math
 from pathlib import Path
-from typing import List, Tuple, Type, Union
+from typing import TYPE_CHECKING, Dict, List, Tuple, Type, Union
 
-import torch
 from asgiref.sync import sync_to_async
-from sentence_transformers import util
 
-from khoj.database.adapters import EntryAdapters, get_user_search_model_or_default
+from khoj.database.adapters import (
+    EntryAdapters,
+    IndexedFileAdapters,
+    aget_user_search_model_or_default,
+)
 from khoj.database.models import Entry as DbEntry
 from khoj.database.models import KhojUser
 from khoj.processor.content.text_to_entries import TextToEntries
 from khoj.utils import state
-from khoj.utils.helpers import get_absolute_path, timer
+from khoj.utils.helpers import get_absolute_path, run_in_cpu_executor, timer
 from khoj.utils.jsonl import load_jsonl
 from khoj.utils.models import BaseEncoder
 from khoj.utils.rawconfig import Entry, SearchResponse
 from khoj.utils.state import SearchType
 
+if TYPE_CHECKING:
+    import torch
+
+
 logger = logging.getLogger(__name__)
 
 search_type_to_embeddings_type = {
@@ -30,6 +36,9 @@ search_type_to_embeddings_type = {
     SearchType.All.value: None,
 }
 
+# Count searches with results reranked by the cross-encoder and searches where reranking was skipped
+rerank_stats = {"reranked": 0, "skipped": 0}
+
 
 def extract_entries(jsonl_file) -> List[Entry]:
     "Load entries from compressed jsonl"
@@ -44,6 +53,9 @@ def compute_embeddings(
     normalize=True,
 ):
     "Compute (and Save) Embeddings or Load Pre-Computed Embeddings"
+    import torch
+    from sentence_transformers import util
+
     new_embeddings = torch.tensor([], device=state.device)
     existing_embeddings = torch.tensor([], device=state.device)
     create_index_msg = ""
@@ -87,6 +99,9 @@ def load_embeddings(
     embeddings_file: Path,
 ):
     "Load pre-computed embeddings from file if exists and update them if required"
+    import torch
+    from sentence_transformers import util
+
     if embeddings_file.exists():
         corpus_embeddings: torch.Tensor = torch.load(get_absolute_path(embeddings_file), map_location=state.device)
         logger.debug(f"Loaded {len(corpus_embeddings)} text embeddings from {embeddings_file}")
@@ -99,37 +114,129 @@ async def query(
     user: KhojUser,
     raw_query: str,
     type: SearchType = SearchType.All,
-    question_embedding: Union[torch.Tensor, None] = None,
+    question_embedding: Union["torch.Tensor", None] = None,
     max_distance: float = math.inf,
+    hybrid: bool = False,
 ) -> Tuple[List[dict], List[Entry]]:
-    "Search for entries that answer the query"
+    "Search for entries that answer the query. Use hybrid mode to also rank entries by keyword matches"
 
     file_type = search_type_to_embeddings_type[type.value]
 
     query = raw_query
+    search_model = await aget_user_search_model_or_default(user)
 
     # Encode the query using the bi-encoder
     if question_embedding is None:
         with timer("Query Encode Time", logger, state.device):
-            search_model = await sync_to_async(get_user_search_model_or_default)(user)
-            question_embedding = state.embeddings_model[search_model.name].embed_query(query)
+            embeddings_model = await state.embeddings_model.aget(search_model.name)
+            question_embedding = await embeddings_model.aembed_query(defilter_query(query))
 
     # Find relevant entries for the query
     top_k = 10
     with timer("Search Time", logger, state.device):
-        hits = EntryAdapters.search_with_embeddings(
-            user=user,
-            embeddings=question_embedding,
-            max_results=top_k,
-            file_type_filter=file_type,
-            raw_query=raw_query,
-            max_distance=max_distance,
-        ).all()
-        hits = await sync_to_async(list)(hits)  # type: ignore[call-arg]
+        if hybrid:
+            hits = EntryAdapters.search_with_hybrid_ranking(
+                user=user,
+                embeddings=question_embedding,
+                query=defilter_query(query),
+                max_results=top_k,
+                file_type_filter=file_type,
+                raw_query=raw_query,
+                max_distance=max_distance,
+                search_model=search_model,
+            )
+        else:
+            hits = EntryAdapters.search_with_embeddings(
+                user=user,
+                embeddings=question_embedding,
+                max_results=top_k,
+                file_type_filter=file_type,
+                raw_query=raw_query,
+                max_distance=max_distance,
+                search_model=search_model,
+            ).all()
+        num_candidates = EntryAdapters.get_num_vector_candidates(top_k, search_model)
+        hits = await sync_to_async(fetch_hits, thread_sensitive=False)(
+            hits, ef_search=max(num_candidates, state.vector_search_ef), max_results=top_k
+        )
 
     return hits
 
 
+async def query_batch(
+    user: KhojUser,
+    raw_queries: List[str],
+    type: SearchType = SearchType.All,
+    max_distance: float = math.inf,
+    hybrid: bool = False,
+) -> List[List[DbEntry]]:
+    """Search for entries that answer each of the queries. Encode all queries in a single batch.
+    Queries with the same filters are searched in a single round trip to the database"""
+    if not raw_queries:
+        return []
+    file_type = search_type_to_embeddings_type[type.value]
+    search_model = await aget_user_search_model_or_default(user)
+
+    # Encode the queries using the bi-encoder
+    with timer("Batch Query Encode Time", logger, state.device):
+        defiltered_queries = [defilter_query(query) for query in raw_queries]
+        embeddings_model = await state.embeddings_model.aget(search_model.name)
+        question_embeddings = await run_in_cpu_executor(embeddings_model.embed_queries, defiltered_queries)
+
+    # Hybrid ranking scores entries by keyword matches of each query. So search each query on its own
+    if hybrid:
+        return [
+            await query(user, raw_query, type, question_embedding, max_distance, hybrid=True)
+            for raw_query, question_embedding in zip(raw_queries, question_embeddings)
+        ]
+
+    # Find relevant entries for the queries. Each query is searched with its own filters
+    top_k = 10
+    queries_by_filters: Dict[Tuple[str, ...], List[int]] = {}
+    for query_index, raw_query in enumerate(raw_queries):
+        queries_by_filters.setdefault(get_filter_terms(raw_query), []).append(query_index)
+
+    hits_by_query: List[List[DbEntry]] = [[] for _ in raw_queries]
+    with timer("Batch Search Time", logger, state.device):
+        for query_indices in queries_by_filters.values():
+            filtered_hits_by_query = await sync_to_async(
+                EntryAdapters.search_with_embeddings_batch, thread_sensitive=False
+            )(
+                user=user,
+                embeddings=[question_embeddings[query_index] for query_index in query_indices],
+                max_results=top_k,
+                file_type_filter=file_type,
+                raw_query=raw_queries[query_indices[0]],
+                max_distance=max_distance,
+                search_model=search_model,
+                ef_search=max(EntryAdapters.get_num_vector_candidates(top_k, search_model), state.vector_search_ef),
+            )
+            for query_index, hits in zip(query_indices, filtered_hits_by_query):
+                hits_by_query[query_index] = hits
+
+    return hits_by_query
+
+
+def get_filter_terms(query: str) -> Tuple[str, ...]:
+    "Get filter terms in query. Queries with the same filter terms search the same entries"
+    filters = [EntryAdapters.date_filter, EntryAdapters.word_filer, EntryAdapters.file_filter]
+    return tuple(term for filter in filters for term in filter.get_filter_terms(query))
+
+
+def defilter_query(query: str) -> str:
+    "Remove filter terms from query"
+    defiltered_query = query
+    for filter in [EntryAdapters.date_filter, EntryAdapters.word_filer, EntryAdapters.file_filter]:
+        defiltered_query = filter.defilter(defiltered_query)
+    return defiltered_query
+
+
+def fetch_hits(hits, ef_search: int = None, max_results: int = None) -> List[DbEntry]:
+    """Run vector search query with the configured search accuracy on the same db connection.
+    Run it off the event loop without thread sensitivity, so concurrent searches query the database in parallel"""
+    return EntryAdapters.fetch_vector_search_hits(hits, max_results=max_results, ef_search=ef_search)
+
+
 def collate_results(hits, dedupe=True):
     hit_ids = set()
     for hit in hits:
@@ -176,10 +283,26 @@ def deduplicated_search_responses(hits: List[SearchResponse]):
             )
 
 
+def is_ranking_decisive(hits: List[SearchResponse]) -> bool:
+    "Check if bi-encoder ranks the top hit ahead of the rest by a margin large enough to skip reranking"
+    if state.rerank_skip_margin <= 0:
+        return False
+    best_score, next_best_score = sorted(hit["score"] for hit in hits)[:2]
+    return next_best_score - best_score >= state.rerank_skip_margin
+
+
 def rerank_and_sort_results(hits, query, rank_results, search_model_name):
     # If we have more than one result and reranking is enabled
     rank_results = rank_results and len(list(hits)) > 1
 
+    # Skip reranking if bi-encoder ranking is already decisive
+    if rank_results and is_ranking_decisive(hits):
+        rank_results = False
+        rerank_stats["skipped"] += 1
+        logger.debug(f"Skipped reranking results as bi-encoder ranking is decisive. Rerank stats: {rerank_stats}")
+    elif rank_results:
+        rerank_stats["reranked"] += 1
+
     # Score all retrieved entries using the cross-encoder
     if rank_results:
         hits = cross_encoder_score(query, hits, search_model_name)
@@ -198,14 +321,38 @@ def setup(
     user: KhojUser = None,
     config=None,
 ) -> None:
-    if config:
-        num_new_embeddings, num_deleted_embeddings = text_to_entries(config).process(
-            files=files, full_corpus=full_corpus, user=user, regenerate=regenerate
-        )
-    else:
-        num_new_embeddings, num_deleted_embeddings = text_to_entries().process(
-            files=files, full_corpus=full_corpus, user=user, regenerate=regenerate
-        )
+    # Skip parsing files unchanged since they were last indexed
+    files_to_process = files
+    if files and user and not regenerate:
+        with timer("Identified unchanged files to skip in", logger):
+            unchanged_files = IndexedFileAdapters.get_unchanged_files(user, files)
+            if not full_corpus:
+                # Empty files are requests to delete their indexed entries
+                unchanged_files = {file for file in unchanged_files if files[file] != ""}
+            files_to_process = {file: content for file, content in files.items() if file not in unchanged_files}
+        if unchanged_files:
+            logger.debug(f"Skipped {len(unchanged_files)} files unchanged since they were last indexed")
+
+    num_new_embeddings, num_deleted_embeddings = 0, 0
+    if files_to_process or not files:
+        # Pass copy of files as processors may rewrite file content in place. The manifest hashes the original content
+        files_copy = dict(files_to_process) if files_to_process is not None else None
+        if config:
+            num_new_embeddings, num_deleted_embeddings = text_to_entries(config).process(
+                files=files_copy, full_corpus=full_corpus, user=user, regenerate=regenerate
+            )
+        else:
+            num_new_embeddings, num_deleted_embeddings = text_to_entries().process(
+                files=files_copy, full_corpus=full_corpus, user=user, regenerate=regenerate
+            )
+
+    if files_to_process and user:
+        with timer("Updated manifest of indexed files in", logger):
+            deleted_files = set() if full_corpus else {file for file in files_to_process if files[file] == ""}
+            IndexedFileAdapters.delete_indexed_files(user, deleted_files)
+            IndexedFileAdapters.update_indexed_files(
+                user, {file: content for file, content in files_to_process.items() if file not in deleted_files}
+            )
 
     if files:
         file_names = [file_name for file_name in files]
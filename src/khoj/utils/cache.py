@@ -0,0 +1,134 @@
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Optional
+
+from khoj.utils.helpers import SizedLRU, resolve_absolute_path
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend(ABC):
+    "Key value store for cached results, bounded by the total memory used by the cached values"
+
+    def __init__(self, capacity_bytes: int):
+        self.capacity_bytes = capacity_bytes
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: Any):
+        ...
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+
+class InMemoryCacheBackend(CacheBackend):
+    "Cache results in the memory of the current process"
+
+    def __init__(self, capacity_bytes: int):
+        super().__init__(capacity_bytes)
+        self.cache = SizedLRU(capacity_bytes=capacity_bytes, sizeof=lambda item: len(pickle.dumps(item)))
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.cache.get(key)
+
+    def set(self, key: str, value: Any):
+        self.cache[key] = value
+
+    def clear(self):
+        self.cache.clear()
+
+
+class SqliteCacheBackend(CacheBackend):
+    "Cache results in a SQLite database on local disk. Shares the cache across all server workers on the host"
+
+    def __init__(self, capacity_bytes: int, path: Path):
+        super().__init__(capacity_bytes)
+        self.path = resolve_absolute_path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, size INTEGER, accessed_at REAL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)")
+
+    def get(self, key: str) -> Optional[Any]:
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.connection.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return pickle.loads(row[0])
+
+    def set(self, key: str, value: Any):
+        serialized_value = pickle.dumps(value)
+        if len(serialized_value) > self.capacity_bytes:
+            return
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, serialized_value, len(serialized_value), time.time()),
+            )
+            # Evict least recently used results until cache is within memory budget
+            self.connection.execute(
+                "DELETE FROM cache WHERE key IN ("
+                "SELECT key FROM ("
+                "SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC) AS cumulative_size FROM cache"
+                ") WHERE cumulative_size > ?)",
+                (self.capacity_bytes,),
+            )
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute("DELETE FROM cache")
+
+
+class SearchResultCache:
+    """Cache search results across all users.
+    Cache keys include the index generation of the user, so results are invalidated whenever their index changes"""
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(user, query_key: str) -> str:
+        return f"{user.uuid}:{user.index_generation}:{query_key}"
+
+    def get(self, user, query_key: str) -> Optional[Any]:
+        results = self.backend.get(self.make_key(user, query_key))
+        if results is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return results
+
+    def set(self, user, query_key: str, results: Any):
+        self.backend.set(self.make_key(user, query_key), results)
+
+
+def initialize_search_result_cache() -> SearchResultCache:
+    "Initialize search result cache with the backend configured via environment variables"
+    backend_type = os.getenv("KHOJ_SEARCH_CACHE_BACKEND", "memory")
+    capacity_bytes = int(os.getenv("KHOJ_SEARCH_CACHE_MB", 64)) * 1024 * 1024
+    if backend_type == "sqlite":
+        cache_path = Path(os.getenv("KHOJ_SEARCH_CACHE_PATH", "~/.khoj/cache/search_results.sqlite3"))
+        backend: CacheBackend = SqliteCacheBackend(capacity_bytes, cache_path)
+    else:
+        if backend_type != "memory":
+            logger.warning(f"Unknown search cache backend: {backend_type}. Using in-memory cache instead")
+        backend = InMemoryCacheBackend(capacity_bytes)
+    return SearchResultCache(backend)
@@ -44,6 +44,12 @@ def cli(args=None):
     parser.add_argument(
         "--disable-chat-on-gpu", action="store_true", default=False, help="Disable using GPU for the offline chat model"
     )
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        default=False,
+        help="Show time taken by each step of server startup. Default: false",
+    )
     parser.add_argument(
         "--anonymous-mode",
         action="store_true",
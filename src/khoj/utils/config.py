@@ -6,14 +6,13 @@ from dataclasses import dataclass
 from enum import Enum
 from typing import TYPE_CHECKING, Any, List, Optional, Union
 
-import torch
-
 from khoj.processor.conversation.offline.utils import download_model
 
 logger = logging.getLogger(__name__)
 
 
 if TYPE_CHECKING:
+    import torch
     from sentence_transformers import CrossEncoder
 
     from khoj.utils.models import BaseEncoder
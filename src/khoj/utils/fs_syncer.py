@@ -1,10 +1,12 @@
 import glob
 import logging
 import os
+import time
 from typing import Optional
 
 from bs4 import BeautifulSoup
 
+from khoj.database.adapters import IndexedFileAdapters
 from khoj.database.models import (
     LocalMarkdownConfig,
     LocalOrgConfig,
@@ -18,24 +20,64 @@ from khoj.utils.rawconfig import TextContentConfig
 logger = logging.getLogger(__name__)
 
 
-def collect_files(search_type: Optional[SearchType] = SearchType.All, user=None) -> dict:
+def collect_files(search_type: Optional[SearchType] = SearchType.All, user=None, regenerate: bool = False) -> dict:
     files = {}
+    # Skip reading files unchanged since they were last indexed. Regenerating the index needs all files
+    indexed_file_stats = IndexedFileAdapters.get_indexed_file_stats(user) if user and not regenerate else None
+    read_started_at = time.time()
 
     if search_type == SearchType.All or search_type == SearchType.Org:
         org_config = LocalOrgConfig.objects.filter(user=user).first()
-        files["org"] = get_org_files(construct_config_from_db(org_config)) if org_config else {}
+        files["org"] = get_org_files(construct_config_from_db(org_config), indexed_file_stats) if org_config else {}
     if search_type == SearchType.All or search_type == SearchType.Markdown:
         markdown_config = LocalMarkdownConfig.objects.filter(user=user).first()
-        files["markdown"] = get_markdown_files(construct_config_from_db(markdown_config)) if markdown_config else {}
+        files["markdown"] = (
+            get_markdown_files(construct_config_from_db(markdown_config), indexed_file_stats) if markdown_config else {}
+        )
     if search_type == SearchType.All or search_type == SearchType.Plaintext:
         plaintext_config = LocalPlaintextConfig.objects.filter(user=user).first()
-        files["plaintext"] = get_plaintext_files(construct_config_from_db(plaintext_config)) if plaintext_config else {}
+        files["plaintext"] = (
+            get_plaintext_files(construct_config_from_db(plaintext_config), indexed_file_stats)
+            if plaintext_config
+            else {}
+        )
     if search_type == SearchType.All or search_type == SearchType.Pdf:
         pdf_config = LocalPdfConfig.objects.filter(user=user).first()
-        files["pdf"] = get_pdf_files(construct_config_from_db(pdf_config)) if pdf_config else {}
+        files["pdf"] = get_pdf_files(construct_config_from_db(pdf_config), indexed_file_stats) if pdf_config else {}
+
+    if user:
+        record_indexed_file_stats(files, user, read_started_at)
     return files
 
 
+def is_file_unchanged(file: str, indexed_file_stats: dict[str, tuple[int, float]] = None) -> bool:
+    "Check if size and modification time of file are the same as when its content was last indexed"
+    if not indexed_file_stats or file not in indexed_file_stats:
+        return False
+    try:
+        stat = os.stat(file)
+    except OSError:
+        return False
+    return (stat.st_size, stat.st_mtime) == indexed_file_stats[file]
+
+
+def record_indexed_file_stats(files: dict[str, dict], user, read_started_at: float):
+    "Record stats of read files with content unchanged since last indexed. So the next sync can skip reading them"
+    files_by_path = {file: content for files_of_type in files.values() for file, content in files_of_type.items()}
+    unchanged_files = IndexedFileAdapters.get_unchanged_files(user, files_by_path) if files_by_path else set()
+
+    file_stats = {}
+    for file in unchanged_files:
+        try:
+            stat = os.stat(file)
+        except OSError:
+            continue
+        # Content of files modified while being read may differ from what was read. Check them again on next sync
+        if stat.st_mtime < read_started_at:
+            file_stats[file] = (stat.st_size, stat.st_mtime)
+    IndexedFileAdapters.update_indexed_file_stats(user, file_stats)
+
+
 def construct_config_from_db(db_config) -> TextContentConfig:
     return TextContentConfig(
         input_files=db_config.input_files,
@@ -44,7 +86,9 @@ def construct_config_from_db(db_config) -> TextContentConfig:
     )
 
 
-def get_plaintext_files(config: TextContentConfig) -> dict[str, str]:
+def get_plaintext_files(
+    config: TextContentConfig, indexed_file_stats: dict[str, tuple[int, float]] = None
+) -> dict[str, str]:
     def is_plaintextfile(file: str):
         "Check if file is plaintext file"
         return file.endswith(("txt", "md", "markdown", "org", "mbox", "rst", "html", "htm", "xml"))
@@ -90,6 +134,8 @@ def get_plaintext_files(config: TextContentConfig) -> dict[str, str]:
 
     filename_to_content_map = {}
     for file in all_target_files:
+        if is_file_unchanged(file, indexed_file_stats):
+            continue
         with open(file, "r", encoding="utf8") as f:
             try:
                 plaintext_content = f.read()
@@ -103,7 +149,7 @@ def get_plaintext_files(config: TextContentConfig) -> dict[str, str]:
     return filename_to_content_map
 
 
-def get_org_files(config: TextContentConfig):
+def get_org_files(config: TextContentConfig, indexed_file_stats: dict[str, tuple[int, float]] = None):
     # Extract required fields from config
     org_files, org_file_filters = (
         config.input_files,
@@ -137,6 +183,8 @@ def get_org_files(config: TextContentConfig):
 
     filename_to_content_map = {}
     for file in all_org_files:
+        if is_file_unchanged(file, indexed_file_stats):
+            continue
         with open(file, "r", encoding="utf8") as f:
             try:
                 filename_to_content_map[file] = f.read()
@@ -147,7 +195,7 @@ def get_org_files(config: TextContentConfig):
     return filename_to_content_map
 
 
-def get_markdown_files(config: TextContentConfig):
+def get_markdown_files(config: TextContentConfig, indexed_file_stats: dict[str, tuple[int, float]] = None):
     # Extract required fields from config
     markdown_files, markdown_file_filters = (
         config.input_files,
@@ -187,6 +235,8 @@ def get_markdown_files(config: TextContentConfig):
 
     filename_to_content_map = {}
     for file in all_markdown_files:
+        if is_file_unchanged(file, indexed_file_stats):
+            continue
         with open(file, "r", encoding="utf8") as f:
             try:
                 filename_to_content_map[file] = f.read()
@@ -197,7 +247,7 @@ def get_markdown_files(config: TextContentConfig):
     return filename_to_content_map
 
 
-def get_pdf_files(config: TextContentConfig):
+def get_pdf_files(config: TextContentConfig, indexed_file_stats: dict[str, tuple[int, float]] = None):
     # Extract required fields from config
     pdf_files, pdf_file_filters = (
         config.input_files,
@@ -232,6 +282,8 @@ def get_pdf_files(config: TextContentConfig):
 
     filename_to_content_map = {}
     for file in all_pdf_files:
+        if is_file_unchanged(file, indexed_file_stats):
+            continue
         with open(file, "rb") as f:
             try:
                 filename_to_content_map[file] = f.read()
@@ -1,32 +1,129 @@
 from __future__ import annotations  # to avoid quoting type hints
 
+import asyncio
 import datetime
 import logging
+import multiprocessing
 import os
 import platform
 import random
+import sys
+import threading
+import traceback
 import uuid
 from collections import OrderedDict
+from concurrent.futures import Future, InvalidStateError, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from enum import Enum
+from functools import partial
 from importlib import import_module
 from importlib.metadata import version
 from itertools import islice
 from os import path
 from pathlib import Path
 from time import perf_counter
-from typing import TYPE_CHECKING, Optional, Union
+from typing import TYPE_CHECKING, Any, Callable, List, Optional, Tuple, Union
 
-import torch
 from asgiref.sync import sync_to_async
 
 from khoj.utils import constants
 
 if TYPE_CHECKING:
+    import torch
     from sentence_transformers import CrossEncoder, SentenceTransformer
 
     from khoj.utils.models import BaseEncoder
     from khoj.utils.rawconfig import AppConfig
 
+logger = logging.getLogger(__name__)
+
+# Pool of threads shared by all requests to run cpu bound work like encoding queries and reranking results.
+# Bounded to avoid oversubscribing the cpu under many concurrent requests
+cpu_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("KHOJ_CPU_WORKERS", min(4, os.cpu_count() or 1))), thread_name_prefix="khoj-cpu"
+)
+
+
+async def run_in_cpu_executor(func: Callable, *args, **kwargs):
+    "Run blocking, cpu bound function on the shared executor without blocking the event loop"
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_executor, partial(func, *args, **kwargs))
+
+
+# Pool of processes to parse content files in parallel across cores. Started on first use
+# Processes to parse files with while indexing. Each server worker process, e.g. gunicorn worker, starts its own pool.
+# So default to an even share of the cpus among server worker processes, bounded like the cpu executor
+server_workers = max(1, int(os.getenv("WEB_CONCURRENCY", 1)))
+parse_workers = int(os.getenv("KHOJ_PARSE_WORKERS", max(1, min(4, (os.cpu_count() or 1) // server_workers))))
+parse_executor: ProcessPoolExecutor = None
+parse_executor_lock = threading.Lock()
+
+
+def initialize_parse_worker():
+    "Setup Django in parse worker process. Parsers are defined in modules that import the database models"
+    import django
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "khoj.app.settings")
+    django.setup()
+
+
+def get_parse_executor() -> ProcessPoolExecutor:
+    global parse_executor
+    with parse_executor_lock:
+        if parse_executor is None:
+            # Spawn instead of fork worker processes as the server runs threads with held locks and db connections
+            parse_executor = ProcessPoolExecutor(
+                max_workers=parse_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=initialize_parse_worker,
+            )
+        return parse_executor
+
+
+def reset_parse_executor():
+    global parse_executor
+    with parse_executor_lock:
+        if parse_executor is not None:
+            parse_executor.shutdown(wait=False, cancel_futures=True)
+        parse_executor = None
+
+
+def parse_file(parse: Callable[[Any, str], Any], file: str, content: Any) -> Tuple[Any, Optional[str]]:
+    "Parse file. Return error as string if parsing fails, as exceptions may not be picklable across processes"
+    try:
+        return parse(content, file), None
+    except Exception:
+        return None, traceback.format_exc()
+
+
+def parse_files_chunk(
+    parse: Callable[[Any, str], Any], chunk: List[Tuple[str, Any]]
+) -> List[Tuple[Any, Optional[str]]]:
+    return [parse_file(parse, file, content) for file, content in chunk]
+
+
+def parse_files(
+    parse: Callable[[Any, str], Any], files: dict[str, Any], chunk_size: int = 16
+) -> List[Tuple[str, Any, Optional[str]]]:
+    """Parse content and name of files with the parse function in parallel across processes, if there are enough files.
+    Return (file, parsed result, error) for each file in order of the files.
+    The parse function must be importable by name from a module to be run in the parse worker processes"""
+    items = list(files.items())
+    if parse_workers <= 1 or len(items) <= chunk_size:
+        return [(file, *parse_file(parse, file, content)) for file, content in items]
+
+    chunks = [items[idx : idx + chunk_size] for idx in range(0, len(items), chunk_size)]
+    try:
+        # Executor map yields results in order of the chunks. So results are deterministic
+        chunk_results = list(get_parse_executor().map(partial(parse_files_chunk, parse), chunks))
+    except BrokenProcessPool as e:
+        logger.warning(f"Parse worker process crashed. Parsing {len(items)} files in this process instead: {e}")
+        reset_parse_executor()
+        chunk_results = [parse_files_chunk(parse, chunk) for chunk in chunks]
+
+    results = (result for chunk_result in chunk_results for result in chunk_result)
+    return [(file, *result) for (file, _), result in zip(items, results)]
+
 
 class AsyncIteratorWrapper:
     def __init__(self, obj):
@@ -175,6 +272,240 @@ class LRU(OrderedDict):
             del self[oldest]
 
 
+class SizedLRU:
+    """Thread-safe LRU cache bounded by the approximate memory used by its items instead of their count.
+    Tracks cache hits and misses to help tune its capacity"""
+
+    def __init__(self, capacity_bytes: int = 64 * 1024 * 1024, sizeof: Callable[[Any], int] = sys.getsizeof):
+        self.capacity_bytes = capacity_bytes
+        self.sizeof = sizeof
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._items.move_to_end(key)
+            return self._items[key][0]
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def __setitem__(self, key, value):
+        size = self.sizeof(key) + self.sizeof(value)
+        if size > self.capacity_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self.size_bytes -= self._items.pop(key)[1]
+            self._items[key] = (value, size)
+            self.size_bytes += size
+            # Evict least recently used items until cache is within memory budget
+            while self.size_bytes > self.capacity_bytes:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self.size_bytes -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.size_bytes = 0
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "items": len(self._items), "size_bytes": self.size_bytes}
+
+
+class MicroBatcher:
+    """Coalesce concurrent calls into batches processed by a single call of the batch function.
+    Collects items for up to max_wait_ms after the first item arrives, or until max_batch_size items arrive.
+    Items that arrive while a batch is being processed are coalesced into the next batch.
+    Tracks how full batches are to help tune the batch size and wait time"""
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 0,
+        name: str = "batcher",
+    ):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        self.batches = 0
+        self.items = 0
+        self._pending: List[Tuple[Any, Future]] = []
+        self._first_arrival = 0.0
+        self._closed = False
+        self._batch_ready = threading.Condition()
+        self._worker = threading.Thread(target=self._run, name=f"khoj-{name}", daemon=True)
+        self._worker.start()
+
+    def submit(self, item) -> Future:
+        """Queue item to be processed in the next batch. Returns future resolving to the result for the item.
+        Items submitted after the batcher is closed are processed immediately in the calling thread"""
+        future: Future = Future()
+        with self._batch_ready:
+            if not self._closed:
+                if not self._pending:
+                    self._first_arrival = perf_counter()
+                self._pending.append((item, future))
+                self._batch_ready.notify()
+                return future
+        try:
+            future.set_result(self.process_batch([item])[0])
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    async def acall(self, item):
+        return await asyncio.wrap_future(self.submit(item))
+
+    def close(self):
+        "Stop worker thread once pending items are processed. Process later items in the calling thread instead"
+        with self._batch_ready:
+            self._closed = True
+            self._batch_ready.notify()
+
+    def _next_batch(self) -> Optional[List[Tuple[Any, Future]]]:
+        with self._batch_ready:
+            while not self._pending:
+                if self._closed:
+                    return None
+                self._batch_ready.wait()
+            while len(self._pending) < self.max_batch_size:
+                remaining_wait = self._first_arrival + self.max_wait - perf_counter()
+                if remaining_wait <= 0:
+                    break
+                self._batch_ready.wait(remaining_wait)
+            batch, self._pending = self._pending[: self.max_batch_size], self._pending[self.max_batch_size :]
+            self._first_arrival = perf_counter()
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            # Skip items whose callers stopped waiting, e.g. on client disconnect. Their futures are cancelled
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            try:
+                results = self.process_batch([item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    self._resolve(future, exception=e)
+                continue
+            for (_, future), result in zip(batch, results):
+                self._resolve(future, result=result)
+            if self.batches % 100 == 0:
+                logger.debug(f"Batched calls to {self.name}. Batch stats: {self.stats()}")
+
+    def _resolve(self, future: Future, result=None, exception: Exception = None):
+        "Set result of future. Never raise, as an error would stop the worker thread and hang all later callers"
+        try:
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+        except InvalidStateError:
+            logger.debug(f"Dropped result of {self.name} call already resolved")
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0,
+            "mean_batch_fill": self.items / (self.batches * self.max_batch_size) if self.batches else 0,
+        }
+
+
+class ModelRegistry:
+    """Load models by name on first use and keep them in memory for reuse.
+    Evicts the least recently used models once the loaded models exceed the memory budget"""
+
+    def __init__(
+        self,
+        load_model: Callable[[str], Any],
+        capacity_bytes: int = 1024 * 1024 * 1024,
+        sizeof: Callable[[Any], int] = lambda model: getattr(model, "memory_bytes", 0),
+        name: str = "models",
+    ):
+        self.load_model = load_model
+        self.capacity_bytes = capacity_bytes
+        self.sizeof = sizeof
+        self.name = name
+        self._models: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading_locks: dict[str, threading.Lock] = {}
+
+    def __getitem__(self, name: str):
+        with self._lock:
+            if name in self._models:
+                self._models.move_to_end(name)
+                return self._models[name]
+            loading_lock = self._loading_locks.setdefault(name, threading.Lock())
+
+        # Load each model once, even if it is requested by concurrent requests
+        with loading_lock:
+            with self._lock:
+                if name in self._models:
+                    return self._models[name]
+            with timer(f"Loaded {name} {self.name} in", logger):
+                model = self.load_model(name)
+            self[name] = model
+            return model
+
+    async def aget(self, name: str):
+        "Get model without blocking the event loop if it needs to be loaded"
+        with self._lock:
+            if name in self._models:
+                self._models.move_to_end(name)
+                return self._models[name]
+        return await run_in_cpu_executor(self.__getitem__, name)
+
+    def __setitem__(self, name: str, model):
+        with self._lock:
+            self._models[name] = model
+            self._models.move_to_end(name)
+            # Evict least recently used models until loaded models are within memory budget. Always keep the latest
+            while len(self._models) > 1 and sum(map(self.sizeof, self._models.values())) > self.capacity_bytes:
+                evicted_name, evicted_model = self._models.popitem(last=False)
+                if hasattr(evicted_model, "close"):
+                    evicted_model.close()
+                logger.info(f"Evicted {evicted_name} from loaded {self.name} to stay within memory budget")
+
+    def __contains__(self, name: str):
+        return name in self._models
+
+    def __len__(self):
+        return len(self._models)
+
+    def update(self, models: dict):
+        for name, model in models.items():
+            self[name] = model
+
+    def preload(self, name: str) -> threading.Thread:
+        "Load model in the background"
+        thread = threading.Thread(target=self.__getitem__, args=(name,), name=f"khoj-preload-{name}", daemon=True)
+        thread.start()
+        return thread
+
+
 def get_server_id():
     """Get, Generate Persistent, Random ID per server install.
     Helps count distinct khoj servers deployed.
@@ -254,6 +585,8 @@ def log_telemetry(
 
 def get_device() -> torch.device:
     """Get device to run model on"""
+    import torch
+
     if torch.cuda.is_available():
         # Use CUDA GPU
         return torch.device("cuda:0")
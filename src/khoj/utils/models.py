@@ -1,12 +1,16 @@
+from __future__ import annotations  # to avoid quoting type hints
+
 from abc import ABC, abstractmethod
-from typing import List
+from typing import TYPE_CHECKING, List
 
-import openai
-import torch
 from tqdm import trange
 
 from khoj.utils import state
 
+if TYPE_CHECKING:
+    import openai
+    import torch
+
 
 class BaseEncoder(ABC):
     @abstractmethod
@@ -25,6 +29,8 @@ class OpenAI(BaseEncoder):
         self.embedding_dimensions = None
 
     def encode(self, entries, device=None, **kwargs):
+        import torch
+
         embedding_tensors = []
 
         for index in trange(0, len(entries)):
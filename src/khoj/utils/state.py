@@ -1,23 +1,28 @@
+from __future__ import annotations  # to avoid quoting type hints
+
 import os
 import threading
-from collections import defaultdict
 from pathlib import Path
-from typing import Dict, List
-
-from openai import OpenAI
-from whisper import Whisper
+from typing import TYPE_CHECKING, Dict, List
 
-from khoj.processor.embeddings import CrossEncoderModel, EmbeddingsModel
+from khoj.processor.inference import InferenceClient, initialize_inference_client
 from khoj.utils import config as utils_config
 from khoj.utils.config import ContentIndex, GPT4AllProcessorModel, SearchModels
-from khoj.utils.helpers import LRU, get_device
+from khoj.utils.cache import SearchResultCache, initialize_search_result_cache
+from khoj.utils.helpers import ModelRegistry, get_device
 from khoj.utils.rawconfig import FullConfig
+from khoj.utils.vector_index import MmapVectorIndex, initialize_vector_index
+
+if TYPE_CHECKING:
+    import torch
+    from openai import OpenAI
+    from whisper import Whisper
 
 # Application Global State
 config = FullConfig()
 search_models = SearchModels()
-embeddings_model: Dict[str, EmbeddingsModel] = None
-cross_encoder_model: Dict[str, CrossEncoderModel] = None
+embeddings_model: ModelRegistry = None
+cross_encoder_model: ModelRegistry = None
 content_index = ContentIndex()
 openai_client: OpenAI = None
 gpt4all_processor_config: GPT4AllProcessorModel = None
@@ -27,16 +32,32 @@ verbose: int = 0
 host: str = None
 port: int = None
 cli_args: List[str] = None
-query_cache: Dict[str, LRU] = defaultdict(LRU)
+query_cache: SearchResultCache = initialize_search_result_cache()
 chat_lock = threading.Lock()
 SearchType = utils_config.SearchType
 telemetry: List[Dict[str, str]] = []
 khoj_version: str = None
-device = get_device()
+device: torch.device  # Detected on first use
 chat_on_gpu: bool = True
+vector_search_ef: int = int(os.getenv("KHOJ_VECTOR_SEARCH_EF", 40))
+vector_rescore_factor: int = int(os.getenv("KHOJ_VECTOR_RESCORE_FACTOR", 4))
+vector_index: MmapVectorIndex = initialize_vector_index()
+inference_client: InferenceClient = initialize_inference_client()
+rerank_skip_margin: float = float(os.getenv("KHOJ_RERANK_SKIP_MARGIN", 0))
+embeddings_cache_max_entries: int = int(os.getenv("KHOJ_EMBEDDINGS_CACHE_MAX_ENTRIES", 500000))
+index_pipeline_depth: int = max(1, int(os.getenv("KHOJ_INDEX_PIPELINE_DEPTH", 2)))
 anonymous_mode: bool = False
 billing_enabled: bool = (
     os.getenv("STRIPE_API_KEY") is not None
     and os.getenv("STRIPE_SIGNING_SECRET") is not None
     and os.getenv("KHOJ_CLOUD_SUBSCRIPTION_URL") is not None
 )
+
+
+def __getattr__(name: str):
+    # Detect device to run models on when first used. Avoids importing torch at startup
+    if name == "device":
+        global device
+        device = get_device()
+        return device
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
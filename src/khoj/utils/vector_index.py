@@ -0,0 +1,238 @@
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from khoj.utils.helpers import SizedLRU, resolve_absolute_path
+
+try:
+    import fcntl
+except ImportError:
+    # File locks are unavailable on Windows. Only a single server process is expected to update the index there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class UserVectorIndex:
+    """Embeddings of the entries of a user, stored as a contiguous matrix in a memory-mapped file.
+    The entry id of each row is stored in a sidecar file. Rows of deleted entries are marked with id -1
+    until the index is compacted"""
+
+    def __init__(self, directory: Path, dtype: str = "float16"):
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.ids_path = directory / "ids.bin"
+        self.embeddings_path = directory / "embeddings.bin"
+        self.metadata_path = directory / "metadata.json"
+        self.lock_path = directory / "lock"
+        self.lock = threading.RLock()
+        self._lock_file = None
+        self._lock_depth = 0
+        self.metadata = self._load_metadata(dtype)
+        self.ids: np.ndarray = np.empty(0, dtype=np.int64)
+        self.embeddings: np.ndarray = np.empty((0, 0), dtype=self.metadata["dtype"])
+        # Load index under lock to not mistake an append in progress by another process for a corrupted index
+        with self.locked():
+            pass
+
+    @property
+    def generation(self) -> Optional[int]:
+        "Index generation of the user the vector index was last synced with"
+        return self.metadata["generation"]
+
+    @contextmanager
+    def locked(self):
+        """Lock index against changes by other threads and server processes sharing the index directory.
+        Reload the index on locking as other processes may have changed it since it was loaded"""
+        with self.lock:
+            self._lock_depth += 1
+            try:
+                if self._lock_depth == 1:
+                    self._lock_file = open(self.lock_path, "a")
+                    if fcntl is not None:
+                        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+                    self.metadata = self._load_metadata(self.metadata["dtype"])
+                    self._open()
+                yield self
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0 and self._lock_file is not None:
+                    # Closing the lock file releases its lock
+                    self._lock_file.close()
+                    self._lock_file = None
+
+    def _load_metadata(self, dtype: str) -> dict:
+        if self.metadata_path.exists():
+            with open(self.metadata_path) as f:
+                return json.load(f)
+        return {"dtype": dtype, "dimensions": None, "generation": None}
+
+    def _save_metadata(self):
+        temp_path = self.metadata_path.with_suffix(".tmp")
+        with open(temp_path, "w") as f:
+            json.dump(self.metadata, f)
+        os.replace(temp_path, self.metadata_path)
+
+    def _open(self):
+        "Memory-map the entry ids and embeddings files"
+        dimensions = self.metadata["dimensions"]
+        if dimensions is None or not self.ids_path.exists() or not self.embeddings_path.exists():
+            return
+
+        num_rows = self.ids_path.stat().st_size // np.dtype(np.int64).itemsize
+        row_size = dimensions * np.dtype(self.metadata["dtype"]).itemsize
+        if self.embeddings_path.stat().st_size != num_rows * row_size:
+            # Files were partially written. Start afresh, the index will be rebuilt on the next sync
+            logger.warning(f"Vector index at {self.directory} is corrupted. Resetting it")
+            self.reset()
+            return
+
+        if num_rows == 0:
+            self.ids = np.empty(0, dtype=np.int64)
+            self.embeddings = np.empty((0, dimensions), dtype=self.metadata["dtype"])
+            return
+        self.ids = np.memmap(self.ids_path, dtype=np.int64, mode="r+", shape=(num_rows,))
+        self.embeddings = np.memmap(
+            self.embeddings_path, dtype=self.metadata["dtype"], mode="r", shape=(num_rows, dimensions)
+        )
+
+    def reset(self):
+        with self.locked():
+            for path in [self.ids_path, self.embeddings_path]:
+                path.unlink(missing_ok=True)
+            self.metadata.update({"dimensions": None, "generation": None})
+            self._save_metadata()
+            self.ids = np.empty(0, dtype=np.int64)
+            self.embeddings = np.empty((0, 0), dtype=self.metadata["dtype"])
+
+    def get_ids(self) -> set[int]:
+        "Get ids of entries in the index"
+        with self.lock:
+            return set(self.ids[self.ids >= 0].tolist())
+
+    def add(self, ids: np.ndarray, embeddings: np.ndarray):
+        "Append normalized embeddings of entries to the index"
+        if len(ids) == 0:
+            return
+        # Normalize a copy. The caller's embeddings may be shared, e.g. cached embeddings of an unchanged entry
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True).clip(min=1e-12)
+
+        with self.locked():
+            if self.metadata["dimensions"] is None:
+                self.metadata["dimensions"] = embeddings.shape[1]
+                self._save_metadata()
+            elif self.metadata["dimensions"] != embeddings.shape[1]:
+                raise ValueError(
+                    f"Cannot add {embeddings.shape[1]} dimensional embeddings to vector index of "
+                    f"{self.metadata['dimensions']} dimensional embeddings"
+                )
+
+            with open(self.embeddings_path, "ab") as f:
+                f.write(embeddings.astype(self.metadata["dtype"]).tobytes())
+            with open(self.ids_path, "ab") as f:
+                f.write(np.asarray(ids, dtype=np.int64).tobytes())
+            self._open()
+
+    def remove(self, ids: set[int]):
+        "Mark rows of deleted entries as removed. Compact the index once most of its rows are removed"
+        if len(ids) == 0:
+            return
+        with self.locked():
+            removed_rows = np.isin(self.ids, np.fromiter(ids, dtype=np.int64))
+            if not removed_rows.any():
+                return
+            self.ids[removed_rows] = -1
+            self.ids.flush()
+            if np.count_nonzero(self.ids < 0) > len(self.ids) / 2:
+                self.compact()
+
+    def compact(self):
+        "Rewrite index without the rows of removed entries"
+        with self.locked():
+            live_rows = self.ids >= 0
+            ids, embeddings = np.array(self.ids[live_rows]), np.array(self.embeddings[live_rows])
+            for path, data in [(self.embeddings_path, embeddings), (self.ids_path, ids)]:
+                temp_path = path.with_suffix(".tmp")
+                data.tofile(temp_path)
+                os.replace(temp_path, path)
+            self._open()
+
+    def set_generation(self, generation: int):
+        with self.locked():
+            self.metadata["generation"] = generation
+            self._save_metadata()
+
+    def search(
+        self,
+        query: np.ndarray,
+        max_results: int,
+        mask: np.ndarray = None,
+        max_distance: float = np.inf,
+        chunk_size: int = 65536,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        "Find ids and cosine distances of the entries closest to the query, among the rows selected by the mask"
+        with self.lock:
+            ids, embeddings = self.ids, self.embeddings
+        if len(ids) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        # Normalize a copy. The caller's query embedding may be shared via the query embeddings cache
+        query = np.asarray(query, dtype=np.float32)
+        query = query / max(np.linalg.norm(query), 1e-12)
+
+        # Score embeddings in chunks to bound the memory used to upcast half precision embeddings
+        distances = np.empty(len(ids), dtype=np.float32)
+        for start in range(0, len(ids), chunk_size):
+            chunk = embeddings[start : start + chunk_size].astype(np.float32, copy=False)
+            distances[start : start + chunk_size] = 1 - chunk @ query
+
+        valid_rows = ids >= 0
+        if mask is not None:
+            valid_rows &= mask
+        distances[~valid_rows] = np.inf
+        distances[distances > max_distance] = np.inf
+
+        num_results = min(max_results, np.count_nonzero(np.isfinite(distances)))
+        if num_results == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        top_rows = np.argpartition(distances, num_results - 1)[:num_results]
+        top_rows = top_rows[np.argsort(distances[top_rows])]
+        return np.array(ids[top_rows]), distances[top_rows]
+
+
+class MmapVectorIndex:
+    """In-process vector search over memory-mapped embeddings of each user.
+    Avoids a database round trip to search entries on single user deployments"""
+
+    def __init__(self, path: Path, dtype: str = "float16", mask_cache_mb: int = 16):
+        self.path = resolve_absolute_path(path)
+        self.dtype = dtype
+        self.indexes: Dict[str, UserVectorIndex] = {}
+        self.lock = threading.Lock()
+        # Cache row masks of recent search filters. Masks are keyed by the index generation they were computed for
+        self.filter_masks = SizedLRU(capacity_bytes=mask_cache_mb * 1024 * 1024, sizeof=lambda mask: mask.nbytes)
+
+    def get(self, user_uuid, search_model_id: int) -> UserVectorIndex:
+        key = f"{user_uuid}/{search_model_id}"
+        with self.lock:
+            if key not in self.indexes:
+                self.indexes[key] = UserVectorIndex(self.path / key, self.dtype)
+            return self.indexes[key]
+
+
+def initialize_vector_index() -> Optional[MmapVectorIndex]:
+    "Initialize in-process vector index if configured via environment variables. Else search in the database"
+    backend_type = os.getenv("KHOJ_VECTOR_SEARCH_BACKEND", "postgres")
+    if backend_type == "mmap":
+        index_path = Path(os.getenv("KHOJ_VECTOR_INDEX_PATH", "~/.khoj/vector_index"))
+        return MmapVectorIndex(index_path, dtype=os.getenv("KHOJ_VECTOR_INDEX_DTYPE", "float16"))
+    elif backend_type != "postgres":
+        logger.warning(f"Unknown vector search backend: {backend_type}. Searching in database instead")
+    return None
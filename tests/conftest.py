@@ -10,6 +10,8 @@ from khoj.configure import (
     configure_middleware,
     configure_routes,
     configure_search_types,
+    load_cross_encoder_model,
+    load_embeddings_model,
 )
 from khoj.database.models import (
     GithubConfig,
@@ -28,7 +30,7 @@ from khoj.search_type import image_search, text_search
 from khoj.utils import fs_syncer, state
 from khoj.utils.config import SearchModels
 from khoj.utils.constants import web_directory
-from khoj.utils.helpers import resolve_absolute_path
+from khoj.utils.helpers import ModelRegistry, resolve_absolute_path
 from khoj.utils.rawconfig import (
     ContentConfig,
     ImageContentConfig,
@@ -52,9 +54,9 @@ def enable_db_access_for_all_tests(db):
 
 @pytest.fixture(scope="session")
 def search_config() -> SearchConfig:
-    state.embeddings_model = dict()
+    state.embeddings_model = ModelRegistry(load_embeddings_model)
     state.embeddings_model["default"] = EmbeddingsModel()
-    state.cross_encoder_model = dict()
+    state.cross_encoder_model = ModelRegistry(load_cross_encoder_model)
     state.cross_encoder_model["default"] = CrossEncoderModel()
 
     model_dir = resolve_absolute_path("~/.khoj/search")
@@ -326,9 +328,9 @@ def client(
     state.config.content_type = content_config
     state.config.search_type = search_config
     state.SearchType = configure_search_types()
-    state.embeddings_model = dict()
+    state.embeddings_model = ModelRegistry(load_embeddings_model)
     state.embeddings_model["default"] = EmbeddingsModel()
-    state.cross_encoder_model = dict()
+    state.cross_encoder_model = ModelRegistry(load_cross_encoder_model)
     state.cross_encoder_model["default"] = CrossEncoderModel()
 
     # These lines help us Mock the Search models for these search types
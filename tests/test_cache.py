@@ -0,0 +1,54 @@
+# Standard Packages
+from types import SimpleNamespace
+
+import pytest
+
+# Internal Packages
+from khoj.utils.cache import (
+    InMemoryCacheBackend,
+    SearchResultCache,
+    SqliteCacheBackend,
+)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def cache_backend(request, tmp_path):
+    if request.param == "sqlite":
+        return SqliteCacheBackend(capacity_bytes=1024, path=tmp_path / "cache.sqlite3")
+    return InMemoryCacheBackend(capacity_bytes=1024)
+
+
+# Test
+# ----------------------------------------------------------------------------------------------------
+def test_search_result_cache_invalidated_on_index_update(cache_backend):
+    # Arrange
+    cache = SearchResultCache(cache_backend)
+    user = SimpleNamespace(uuid="user-uuid", index_generation=0)
+    cache.set(user, "query", ["result"])
+
+    # Act
+    cached_results = cache.get(user, "query")
+    user.index_generation += 1
+    stale_results = cache.get(user, "query")
+
+    # Assert
+    assert cached_results == ["result"]
+    assert stale_results is None
+    assert cache.hits == 1 and cache.misses == 1
+
+
+# ----------------------------------------------------------------------------------------------------
+def test_cache_backend_evicts_least_recently_used_results_over_memory_budget(cache_backend):
+    # Arrange
+    large_result = "x" * 400
+
+    # Act
+    cache_backend.set("a", large_result)
+    cache_backend.set("b", large_result)
+    cache_backend.get("a")  # accessing 'a' makes it the most recently used result
+    cache_backend.set("c", large_result)  # so 'b' is evicted from the cache instead of 'a'
+
+    # Assert
+    assert cache_backend.get("a") == large_result
+    assert cache_backend.get("b") is None
+    assert cache_backend.get("c") == large_result
@@ -1,4 +1,6 @@
 # Standard Modules
+import time
+from datetime import datetime, timedelta, timezone
 from io import BytesIO
 from urllib.parse import quote
 
@@ -8,9 +10,10 @@ from fastapi.testclient import TestClient
 from PIL import Image
 
 from khoj.configure import configure_routes, configure_search_types
-from khoj.database.adapters import EntryAdapters
-from khoj.database.models import KhojApiUser, KhojUser
+from khoj.database.adapters import EntryAdapters, IndexedFileAdapters, IndexJobAdapters
+from khoj.database.models import IndexJob, KhojApiUser, KhojUser
 from khoj.processor.content.org_mode.org_to_entries import OrgToEntries
+from khoj.routers import indexer
 from khoj.search_type import image_search, text_search
 from khoj.utils import state
 from khoj.utils.rawconfig import ContentConfig, SearchConfig
@@ -197,6 +200,160 @@ def test_index_update(client):
     assert response.status_code == 200
 
 
+# ----------------------------------------------------------------------------------------------------
+@pytest.mark.django_db(transaction=True)
+def test_index_sync_requests_only_changed_files(client):
+    # Arrange
+    headers = {"Authorization": "Bearer kk-secret"}
+    client.post("/api/v1/index/update", files=get_sample_files_data(), headers=headers)
+    file_hashes = [
+        {"path": "path/to/filename.org", "hash": IndexedFileAdapters.hash_content("* practicing piano")},
+        {"path": "path/to/filename1.org", "hash": IndexedFileAdapters.hash_content("* changed content")},
+        {"path": "path/to/new_filename.org", "hash": IndexedFileAdapters.hash_content("* new file")},
+    ]
+
+    # Act
+    response = client.post("/api/v1/index/sync", json={"files": file_hashes}, headers=headers)
+
+    # Assert
+    assert response.status_code == 200
+    # Indexed files missing on the client are not deleted. Other clients of the user may have indexed them
+    assert response.json() == {"upload": ["path/to/filename1.org", "path/to/new_filename.org"]}
+
+
+# ----------------------------------------------------------------------------------------------------
+@pytest.mark.django_db(transaction=True)
+def test_index_update_in_background(client):
+    # Arrange
+    files = get_sample_files_data()
+    headers = {"Authorization": "Bearer kk-secret"}
+
+    # Act
+    response = client.post("/api/v1/index/update?wait=false", files=files, headers=headers)
+    job_id = response.json()["job_id"]
+    for _ in range(120):
+        job = client.get(f"/api/v1/index/jobs/{job_id}", headers=headers).json()
+        if job["status"] in ["completed", "failed"]:
+            break
+        time.sleep(0.5)
+
+    # Assert
+    assert response.status_code == 202
+    assert job["status"] == "completed"
+    assert job["num_files"] == len(files)
+    assert job_id in [job["job_id"] for job in client.get("/api/v1/index/jobs", headers=headers).json()]
+
+
+# ----------------------------------------------------------------------------------------------------
+@pytest.mark.django_db(transaction=True)
+def test_index_jobs_of_user_coalesced(default_user: KhojUser, tmp_path):
+    # Arrange
+    old_spool_path = tmp_path / "old_a"
+    old_spool_path.write_text("* Old A")
+    IndexJobAdapters.enqueue_job(default_user, files={"org": {"a.org": str(old_spool_path)}})
+
+    # Act
+    job = IndexJobAdapters.enqueue_job(default_user, files={"org": {"a.org": "new_a", "b.org": "b"}})
+    markdown_job = IndexJobAdapters.enqueue_job(
+        default_user, content_type="markdown", files={"markdown": {"c.md": "c"}}
+    )
+
+    # Assert
+    assert IndexJob.objects.filter(user=default_user, status=IndexJob.Status.QUEUED).count() == 2
+    assert job.files == {"org": {"a.org": "new_a", "b.org": "b"}}
+    assert job.num_files == 2
+    assert markdown_job.id != job.id
+    # Spooled file of replaced upload is removed
+    assert not old_spool_path.exists()
+
+
+# ----------------------------------------------------------------------------------------------------
+@pytest.mark.django_db(transaction=True)
+def test_index_job_not_claimed_while_job_of_user_running(default_user: KhojUser):
+    # Arrange
+    IndexJobAdapters.enqueue_job(default_user, content_type="org")
+    IndexJobAdapters.enqueue_job(default_user, content_type="markdown")
+    running_job = IndexJobAdapters.claim_next_job()
+
+    # Act
+    job_claimed_while_running = IndexJobAdapters.claim_next_job()
+    IndexJobAdapters.finish_job(running_job)
+    job_claimed_after_finish = IndexJobAdapters.claim_next_job()
+
+    # Assert
+    assert running_job.content_type == "org"
+    assert job_claimed_while_running is None
+    assert job_claimed_after_finish.content_type == "markdown"
+
+
+# ----------------------------------------------------------------------------------------------------
+@pytest.mark.django_db(transaction=True)
+def test_index_job_with_files_spooled_on_other_host_not_claimed(default_user: KhojUser):
+    # Arrange
+    IndexJobAdapters.enqueue_job(default_user, files={"org": {"a.org": "spool/a"}}, spool_host="other-host")
+    server_job = IndexJobAdapters.enqueue_job(default_user, IndexJob.Kind.SERVER)
+
+    # Act
+    claimed_job = IndexJobAdapters.claim_next_job(spool_host="this-host")
+    IndexJobAdapters.finish_job(claimed_job)
+    job_claimed_after = IndexJobAdapters.claim_next_job(spool_host="this-host")
+    job_claimed_on_spool_host = IndexJobAdapters.claim_next_job(spool_host="other-host")
+
+    # Assert
+    # Jobs without spooled files can run on any host
+    assert claimed_job.id == server_job.id
+    assert job_claimed_after is None
+    assert job_claimed_on_spool_host.files == {"org": {"a.org": "spool/a"}}
+
+
+# ----------------------------------------------------------------------------------------------------
+@pytest.mark.django_db(transaction=True)
+def test_running_index_job_with_heartbeat_not_requeued(default_user: KhojUser):
+    # Arrange
+    IndexJobAdapters.enqueue_job(default_user)
+    job = IndexJobAdapters.claim_next_job()
+    stale_after = timedelta(minutes=10)
+    IndexJob.objects.filter(id=job.id).update(updated_at=datetime.now(tz=timezone.utc) - 2 * stale_after)
+
+    # Act
+    IndexJobAdapters.heartbeat_job(job.id)
+    IndexJobAdapters.claim_next_job(stale_after)
+
+    # Assert
+    job.refresh_from_db()
+    assert job.status == IndexJob.Status.RUNNING
+
+
+# ----------------------------------------------------------------------------------------------------
+@pytest.mark.parametrize("job_error", [None, "Failed to index files"])
+@pytest.mark.django_db(transaction=True)
+def test_spooled_files_removed_after_index_job(default_user: KhojUser, tmp_path, monkeypatch, job_error):
+    # Arrange
+    spool_directory = tmp_path / "spool"
+    spool_directory.mkdir()
+    (spool_directory / "a").write_text("* A")
+    (spool_directory / "b").write_text("# B")
+    IndexJobAdapters.enqueue_job(
+        default_user,
+        files={"org": {"a.org": str(spool_directory / "a")}, "markdown": {"b.md": str(spool_directory / "b")}},
+    )
+
+    def index_files(job):
+        if job_error:
+            raise RuntimeError(job_error)
+
+    monkeypatch.setattr(indexer, "index_files", index_files)
+
+    # Act
+    job = IndexJobAdapters.claim_next_job()
+    indexer.run_index_job(job)
+
+    # Assert
+    job.refresh_from_db()
+    assert job.status == (IndexJob.Status.FAILED if job_error else IndexJob.Status.COMPLETED)
+    assert list(spool_directory.iterdir()) == []
+
+
 # ----------------------------------------------------------------------------------------------------
 @pytest.mark.django_db(transaction=True)
 def test_regenerate_with_valid_content_type(client):
@@ -323,6 +480,25 @@ def test_notes_search(client, search_config: SearchConfig, sample_org_data, defa
     assert "git clone https://github.com/khoj-ai/khoj" in search_result, "Expected 'git clone' in search result"
 
 
+# ----------------------------------------------------------------------------------------------------
+@pytest.mark.django_db(transaction=True)
+def test_notes_search_with_hybrid_ranking(client, sample_org_data, default_user: KhojUser):
+    # Arrange
+    headers = {"Authorization": "Bearer kk-secret"}
+    text_search.setup(OrgToEntries, sample_org_data, regenerate=False, user=default_user)
+    user_query = quote("git clone khoj")
+
+    # Act
+    response = client.get(f"/api/search?q={user_query}&n=1&t=org&hybrid=true", headers=headers)
+
+    # Assert
+    assert response.status_code == 200
+
+    assert len(response.json()) == 1, "Expected only 1 result"
+    search_result = response.json()[0]["entry"]
+    assert "git clone https://github.com/khoj-ai/khoj" in search_result, "Expected 'git clone' in search result"
+
+
 # ----------------------------------------------------------------------------------------------------
 @pytest.mark.django_db(transaction=True)
 def test_notes_search_no_results(client, search_config: SearchConfig, sample_org_data, default_user: KhojUser):
@@ -0,0 +1,158 @@
+# Standard Packages
+import os
+import stat
+import threading
+import time
+from multiprocessing import AuthenticationError
+
+import numpy as np
+import pytest
+
+# Internal Packages
+from khoj.processor.embeddings import (
+    CrossEncoderModel,
+    EmbeddingsModel,
+    OnnxSentenceEncoder,
+    cross_scores_cache,
+)
+from khoj.processor.inference import (
+    InferenceClient,
+    InferenceServer,
+    RemoteCrossEncoderModel,
+    RemoteEmbeddingsModel,
+)
+from khoj.utils.helpers import ModelRegistry
+from khoj.utils.rawconfig import SearchResponse
+
+
+@pytest.fixture(scope="module")
+def torch_embeddings_model():
+    return EmbeddingsModel(backend="torch")
+
+
+# Test
+# ----------------------------------------------------------------------------------------------------
+@pytest.mark.parametrize("backend,tolerance", [("onnx", 1e-3), ("onnx-int8", 5e-2)])
+def test_onnx_backend_matches_torch_backend_scores(torch_embeddings_model, backend, tolerance, tmp_path, monkeypatch):
+    # Arrange
+    monkeypatch.setenv("KHOJ_ONNX_MODELS_DIR", str(tmp_path))
+    onnx_embeddings_model = EmbeddingsModel(backend=backend)
+    query = "How do I install Khoj on Emacs?"
+    docs = [
+        "Install the khoj package from MELPA and add (use-package khoj) to your Emacs config",
+        "Khoj can be installed with pip install khoj-assistant",
+        "The Tango is a partner dance that originated in Argentina",
+        "A short note",
+    ]
+
+    # Act
+    torch_scores = np.array(torch_embeddings_model.embed_documents(docs)) @ torch_embeddings_model.embed_query(query)
+    onnx_scores = np.array(onnx_embeddings_model.embed_documents(docs)) @ onnx_embeddings_model.embed_query(query)
+
+    # Assert
+    assert onnx_embeddings_model.dimensions == torch_embeddings_model.dimensions
+    assert onnx_scores == pytest.approx(torch_scores, abs=tolerance)
+    assert np.argsort(-onnx_scores)[0] == np.argsort(-torch_scores)[0]
+
+
+# ----------------------------------------------------------------------------------------------------
+def test_onnx_backend_rejects_models_with_unsupported_modules():
+    # Arrange
+    Transformer, Pooling, Normalize, Dense = [
+        type(name, (), {}) for name in ["Transformer", "Pooling", "Normalize", "Dense"]
+    ]
+
+    # Act & Assert
+    assert OnnxSentenceEncoder.has_normalize_module([Transformer(), Pooling(), Normalize()])
+    assert not OnnxSentenceEncoder.has_normalize_module([Transformer(), Pooling()])
+    # Dense layers after pooling are not run by the ONNX backend
+    with pytest.raises(ValueError):
+        OnnxSentenceEncoder.has_normalize_module([Transformer(), Pooling(), Dense(), Normalize()])
+
+
+# ----------------------------------------------------------------------------------------------------
+def test_onnx_model_exported_once_by_concurrent_workers(torch_embeddings_model, tmp_path, monkeypatch):
+    # Arrange
+    exports = []
+
+    def export_transformer(sentence_transformer, model_path):
+        exports.append(model_path)
+        model_path.write_bytes(b"onnx model")
+
+    monkeypatch.setattr(OnnxSentenceEncoder, "export_transformer", export_transformer)
+    sentence_transformer = torch_embeddings_model.embeddings_model
+    model_path = tmp_path / "model" / "model.onnx"
+
+    # Act
+    workers = [
+        threading.Thread(target=OnnxSentenceEncoder.export, args=(sentence_transformer, model_path)) for _ in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    # Assert
+    # Model is written to a temporary file and moved into place once exported
+    assert len(exports) == 1 and exports[0] != model_path
+    assert model_path.read_bytes() == b"onnx model"
+
+
+# ----------------------------------------------------------------------------------------------------
+def test_cross_encoder_reuses_cached_scores():
+    # Arrange
+    cross_encoder_model = CrossEncoderModel()
+    cross_scores_cache.clear()
+    query = "How do I install Khoj on Emacs?"
+    hits = [
+        SearchResponse(entry=entry, score=0.5, corpus_id=str(idx), additional={"compiled": entry})
+        for idx, entry in enumerate(["Install khoj from MELPA", "The Tango is a partner dance"])
+    ]
+
+    # Act
+    scores = cross_encoder_model.predict(query, hits)
+    hits_before = cross_scores_cache.hits
+    cached_scores = cross_encoder_model.predict(query, hits[::-1])
+
+    # Assert
+    assert cached_scores == pytest.approx(scores[::-1])
+    assert cross_scores_cache.hits - hits_before == 2
+    assert scores[0] > scores[1]
+
+
+# ----------------------------------------------------------------------------------------------------
+def test_remote_models_match_in_process_models(torch_embeddings_model, tmp_path, monkeypatch):
+    # Arrange
+    monkeypatch.delenv("KHOJ_INFERENCE_AUTHKEY", raising=False)
+    cross_encoder_model = CrossEncoderModel()
+    embeddings_models = ModelRegistry(lambda name: torch_embeddings_model)
+    cross_encoder_models = ModelRegistry(lambda name: cross_encoder_model)
+    server = InferenceServer(tmp_path / "inference.sock", embeddings_models, cross_encoder_models)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = InferenceClient(tmp_path / "inference.sock")
+    unauthenticated_client = InferenceClient(tmp_path / "inference.sock", authkey=b"wrong key")
+    deadline = time.monotonic() + 10
+    while not server.socket_path.exists():
+        assert time.monotonic() < deadline, "Inference server did not start"
+        time.sleep(0.01)
+    query = "How do I install Khoj on Emacs?"
+    hits = [
+        SearchResponse(entry=entry, score=0.5, corpus_id=str(idx), additional={"compiled": entry})
+        for idx, entry in enumerate(["Install khoj from MELPA", "The Tango is a partner dance"])
+    ]
+
+    # Act
+    remote_embeddings_model = RemoteEmbeddingsModel("default", client)
+    remote_cross_encoder_model = RemoteCrossEncoderModel("default", client)
+
+    # Assert
+    assert remote_embeddings_model.dimensions == torch_embeddings_model.dimensions
+    assert remote_embeddings_model.embed_query(query) == pytest.approx(torch_embeddings_model.embed_query(query))
+    assert remote_cross_encoder_model.predict(query, hits) == pytest.approx(cross_encoder_model.predict(query, hits))
+    with pytest.raises(ValueError):
+        client.call("generate", "default")
+    with pytest.raises(AuthenticationError):
+        unauthenticated_client.call("dimensions", "default")
+    # Only the user of the inference server can access its socket and key
+    assert stat.S_IMODE(os.stat(server.socket_path).st_mode) & 0o077 == 0
+    assert stat.S_IMODE(os.stat(tmp_path / "inference.key").st_mode) & 0o077 == 0
@@ -87,6 +87,51 @@ def test_get_file_filter_terms():
     assert filter_terms == ["file 1\\.org", "/path/to/dir/.*\\.org"]
 
 
+def test_get_file_path_matchers():
+    # Arrange
+    file_filter = FileFilter()
+    q_with_filter_terms = 'head tail file:"file 1.org" file:"/path/to/file.org" file:"*.org" file:"/path/to/dir/*"'
+
+    # Act
+    matchers = file_filter.get_file_path_matchers(q_with_filter_terms)
+
+    # Assert
+    assert matchers == [
+        {"contains": "file 1.org"},
+        {"contains": "/path/to/file.org"},
+        {"contains": ".org"},
+        {"contains": "/path/to/dir/"},
+    ]
+
+
+def test_relative_file_path_matcher_matches_anywhere_in_file_path():
+    # Arrange
+    file_filter = FileFilter()
+    q_with_filter_terms = 'head tail file:"notes"'
+
+    # Act
+    matchers = file_filter.get_file_path_matchers(q_with_filter_terms)
+
+    # Assert
+    assert matchers == [{"contains": "notes"}]
+
+
+def test_get_file_path_matchers_falls_back_to_regex_for_complex_filters():
+    # Arrange
+    file_filter = FileFilter()
+    q_with_filter_terms = 'head tail file:"/path/to/dir/*.org" file:"*/notes/*.org" file:"notes (1).org"'
+
+    # Act
+    matchers = file_filter.get_file_path_matchers(q_with_filter_terms)
+
+    # Assert
+    assert matchers == [
+        {"regex": "/path/to/dir/.*\\.org"},
+        {"regex": ".*/notes/.*\\.org"},
+        {"regex": "notes (1)\\.org"},
+    ]
+
+
 def arrange_content():
     entries = [
         Entry(compiled="", raw="First Entry", file="file 1.org"),
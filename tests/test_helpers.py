@@ -1,10 +1,13 @@
+import asyncio
 import secrets
+import threading
 
 import numpy as np
 import psutil
 import pytest
 from scipy.stats import linregress
 
+from khoj.processor.content.markdown.markdown_to_entries import MarkdownToEntries
 from khoj.processor.embeddings import EmbeddingsModel
 from khoj.utils import helpers
 
@@ -54,6 +57,29 @@ def test_lru_cache():
     assert cache == {"b": 2, "d": 4}
 
 
+def test_sized_lru_cache():
+    # Test initializing cache with memory budget for two items
+    cache = helpers.SizedLRU(capacity_bytes=4, sizeof=lambda item: 1)
+    cache["a"] = 1
+    cache["b"] = 2
+    assert len(cache) == 2 and cache.size_bytes == 4
+
+    # Test delete least recently used item from cache on memory budget overflow
+    cache.get("a")  # accessing 'a' makes it the most recently used item
+    cache["c"] = 3  # so 'b' is deleted from the cache instead of 'a'
+    assert "a" in cache and "c" in cache and "b" not in cache
+    assert cache.size_bytes == 4
+
+    # Test cache hits and misses are counted
+    assert cache.get("b") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    # Test items larger than the memory budget are not cached
+    large_cache = helpers.SizedLRU(capacity_bytes=1, sizeof=len)
+    large_cache["a"] = "large item"
+    assert len(large_cache) == 0
+
+
 @pytest.mark.skip(reason="Memory leak exists on GPU, MPS devices")
 def test_encode_docs_memory_leak():
     # Arrange
@@ -80,3 +106,142 @@ def test_encode_docs_memory_leak():
     # If slope is positive memory utilization is increasing
     # Positive threshold of 2, from observing memory usage trend on MPS vs CPU device
     assert slope < 2, f"Memory leak suspected on {device}. Memory usage increased at ~{slope:.2f} MB per iteration"
+
+
+@pytest.mark.anyio
+async def test_run_in_cpu_executor_runs_off_event_loop_thread():
+    # Act
+    thread_name = await helpers.run_in_cpu_executor(lambda: threading.current_thread().name)
+    result = await helpers.run_in_cpu_executor(max, 1, 3, key=lambda x: -x)
+
+    # Assert
+    assert thread_name.startswith("khoj-cpu")
+    assert thread_name != threading.current_thread().name
+    assert result == 1
+
+
+def test_micro_batcher_coalesces_concurrent_calls():
+    # Arrange
+    processed_batches = []
+
+    def process_batch(items):
+        processed_batches.append(items)
+        return [item * 2 for item in items]
+
+    batcher = helpers.MicroBatcher(process_batch, max_batch_size=4, max_wait_ms=50)
+
+    # Act
+    futures = [batcher.submit(item) for item in range(6)]
+    results = [future.result(timeout=5) for future in futures]
+
+    # Assert
+    assert results == [0, 2, 4, 6, 8, 10]
+    assert processed_batches == [[0, 1, 2, 3], [4, 5]]
+    assert batcher.stats()["batches"] == 2 and batcher.stats()["mean_batch_fill"] == 0.75
+
+
+def test_micro_batcher_propagates_errors_to_callers():
+    # Arrange
+    def process_batch(items):
+        raise ValueError("Failed to process batch")
+
+    batcher = helpers.MicroBatcher(process_batch)
+
+    # Act & Assert
+    with pytest.raises(ValueError):
+        batcher(1)
+
+
+def test_micro_batcher_serves_calls_after_cancelled_call():
+    # Arrange
+    batch_started, release_batch = threading.Event(), threading.Event()
+
+    def process_batch(items):
+        batch_started.set()
+        release_batch.wait(timeout=5)
+        return [item * 2 for item in items]
+
+    batcher = helpers.MicroBatcher(process_batch)
+
+    async def cancel_pending_call():
+        task = asyncio.ensure_future(batcher.acall(1))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    # Act
+    # Keep worker busy so the cancelled call is still pending when it is cancelled
+    busy_future = batcher.submit(0)
+    batch_started.wait(timeout=5)
+    asyncio.run(cancel_pending_call())
+    release_batch.set()
+
+    # Assert
+    assert busy_future.result(timeout=5) == 0
+    assert batcher.submit(2).result(timeout=5) == 4
+    assert batcher._worker.is_alive()
+
+
+def test_model_registry_loads_models_on_first_use_within_memory_budget():
+    # Arrange
+    loaded_models = []
+
+    class FakeModel:
+        memory_bytes = 40
+
+        def __init__(self, name):
+            self.name = name
+            self.closed = False
+
+        def close(self):
+            self.closed = True
+
+    def load_model(name):
+        loaded_models.append(name)
+        return FakeModel(name)
+
+    registry = helpers.ModelRegistry(load_model, capacity_bytes=100)
+
+    # Act
+    first_model = registry["first"]
+    second_model = registry["second"]
+    registry["first"]
+    registry["third"]
+
+    # Assert
+    assert loaded_models == ["first", "second", "third"]
+    # Least recently used model evicted to stay within memory budget
+    assert "second" not in registry and "first" in registry and "third" in registry
+    assert registry["first"] is first_model
+    assert second_model.closed and not first_model.closed
+
+
+def test_evicted_embeddings_model_still_encodes_queries():
+    # Arrange
+    registry = helpers.ModelRegistry(lambda name: EmbeddingsModel(), capacity_bytes=0)
+    evicted_model = registry["first"]
+    registry["second"]
+
+    # Act
+    # Requests may still hold a reference to the model when it is evicted
+    query_embeddings = evicted_model.embed_query("What is the meaning of life?")
+
+    # Assert
+    assert "first" not in registry
+    assert len(query_embeddings) == evicted_model.dimensions
+
+
+def test_parse_files_in_parallel_preserves_order_of_files(monkeypatch):
+    # Arrange
+    monkeypatch.setattr(helpers, "parse_workers", 2)
+    markdown_files = {f"notes/{idx}.md": f"# Note {idx}\nBody of note {idx}" for idx in range(50)}
+    markdown_files["notes/invalid.md"] = None
+
+    # Act
+    parsed_files = helpers.parse_files(MarkdownToEntries.extract_markdown_file_entries, markdown_files, chunk_size=8)
+
+    # Assert
+    assert [file for file, _, _ in parsed_files] == list(markdown_files)
+    assert parsed_files[7][1] == ["# Note 7\nBody of note 7"]
+    assert parsed_files[-1][1] is None and "TypeError" in parsed_files[-1][2]
@@ -5,13 +5,23 @@ import os
 from pathlib import Path
 
 import pytest
-
-from khoj.database.models import Entry, GithubConfig, KhojUser, LocalOrgConfig
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from khoj.database.adapters import (
+    EntryAdapters,
+    IndexedFileAdapters,
+    get_user_search_model_or_default,
+)
+from khoj.database.models import Entry, EntryDates, GithubConfig, KhojUser, LocalOrgConfig
 from khoj.processor.content.github.github_to_entries import GithubToEntries
 from khoj.processor.content.org_mode.org_to_entries import OrgToEntries
+from khoj.processor.content.plaintext.plaintext_to_entries import PlaintextToEntries
 from khoj.search_type import text_search
+from khoj.utils import state
 from khoj.utils.fs_syncer import collect_files, get_org_files
-from khoj.utils.rawconfig import ContentConfig, SearchConfig
+from khoj.utils.rawconfig import ContentConfig, SearchConfig, SearchResponse
 
 logger = logging.getLogger(__name__)
 
@@ -171,6 +181,192 @@ async def test_text_search(search_config: SearchConfig):
     assert "Emacs load path" in search_result, 'Expected "Emacs load path" in entry'
 
 
+# ----------------------------------------------------------------------------------------------------
+@pytest.mark.django_db
+@pytest.mark.anyio
+async def test_text_search_with_vector_index(search_config: SearchConfig):
+    # Arrange
+    default_user = await KhojUser.objects.acreate(
+        username="test_user", password="test_password", email="test@example.com"
+    )
+    org_config = await LocalOrgConfig.objects.acreate(
+        input_files=None,
+        input_filter=["tests/data/org/*.org"],
+        index_heading_entries=False,
+        user=default_user,
+    )
+    data = get_org_files(org_config)
+
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, text_search.setup, OrgToEntries, data, True, True, default_user)
+
+    search_model = await sync_to_async(get_user_search_model_or_default)(default_user)
+    dimensions = state.embeddings_model[search_model.name].dimensions
+    await sync_to_async(EntryAdapters.set_search_model_dimensions)(search_model, dimensions)
+
+    query = "Load Khoj on Emacs?"
+
+    # Act
+    hits = await text_search.query(default_user, query)
+    results = text_search.collate_results(hits)
+    results = sorted(results, key=lambda x: float(x.score))[:1]
+
+    # Assert
+    assert await Entry.objects.filter(user=default_user, search_model=search_model).aexists()
+    assert "Emacs load path" in results[0].entry, 'Expected "Emacs load path" in entry'
+
+
+# ----------------------------------------------------------------------------------------------------
+@pytest.mark.django_db
+@pytest.mark.anyio
+async def test_text_search_with_vector_index_finds_entries_of_user_among_closer_entries_of_others(
+    search_config: SearchConfig, monkeypatch
+):
+    # Arrange
+    monkeypatch.setattr(state, "vector_search_ef", 1)
+    other_user = await KhojUser.objects.acreate(username="other_user", password="password", email="other@example.com")
+    default_user = await KhojUser.objects.acreate(
+        username="test_user", password="test_password", email="test@example.com"
+    )
+    other_data = {
+        "emacs.org": "".join(f"* Load Khoj on Emacs, variant {i}\nAdd khoj.el to load path\n" for i in range(50))
+    }
+    user_data = {"garden.org": "* Water the tomatoes\nTomatoes need water daily\n* Prune the roses\nPrune in spring\n"}
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, text_search.setup, OrgToEntries, other_data, True, True, other_user)
+    await loop.run_in_executor(None, text_search.setup, OrgToEntries, user_data, True, True, default_user)
+
+    search_model = await sync_to_async(get_user_search_model_or_default)(default_user)
+    dimensions = state.embeddings_model[search_model.name].dimensions
+    await sync_to_async(EntryAdapters.set_search_model_dimensions)(search_model, dimensions)
+
+    # Act
+    # Entries of the other user are closer to the query than any entry of the user
+    hits = await text_search.query(default_user, "Load Khoj on Emacs?")
+
+    # Assert
+    assert len(hits) == 2
+    assert all(hit.user_id == default_user.id for hit in hits)
+
+
+# ----------------------------------------------------------------------------------------------------
+@pytest.mark.django_db
+@pytest.mark.anyio
+@pytest.mark.parametrize("storage", ["halfvec", "binary"])
+async def test_text_search_with_quantized_embeddings(search_config: SearchConfig, storage: str):
+    # Arrange
+    default_user = await KhojUser.objects.acreate(
+        username="test_user", password="test_password", email="test@example.com"
+    )
+    org_config = await LocalOrgConfig.objects.acreate(
+        input_files=None,
+        input_filter=["tests/data/org/*.org"],
+        index_heading_entries=False,
+        user=default_user,
+    )
+    data = get_org_files(org_config)
+
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, text_search.setup, OrgToEntries, data, True, True, default_user)
+
+    query = "Load Khoj on Emacs?"
+    exact_hits = await text_search.query(default_user, query)
+
+    search_model = await sync_to_async(get_user_search_model_or_default)(default_user)
+    dimensions = state.embeddings_model[search_model.name].dimensions
+    await sync_to_async(EntryAdapters.set_search_model_dimensions)(search_model, dimensions)
+    await sync_to_async(EntryAdapters.set_search_model_storage)(search_model, storage)
+
+    # Act
+    hits = await text_search.query(default_user, query)
+
+    # Assert
+    # Rescoring candidates by their full precision embeddings should give the same results as exact search
+    assert [hit.id for hit in hits] == [hit.id for hit in exact_hits]
+    assert [hit.distance for hit in hits] == pytest.approx([hit.distance for hit in exact_hits])
+
+
+# ----------------------------------------------------------------------------------------------------
+@pytest.mark.django_db
+@pytest.mark.anyio
+async def test_text_search_batch_matches_individual_queries(search_config: SearchConfig):
+    # Arrange
+    default_user = await KhojUser.objects.acreate(
+        username="test_user", password="test_password", email="test@example.com"
+    )
+    org_config = await LocalOrgConfig.objects.acreate(
+        input_files=None,
+        input_filter=["tests/data/org/*.org"],
+        index_heading_entries=False,
+        user=default_user,
+    )
+    data = get_org_files(org_config)
+
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, text_search.setup, OrgToEntries, data, True, True, default_user)
+
+    queries = ["Load Khoj on Emacs?", "How to install Khoj?"]
+
+    # Act
+    hits_by_query = await text_search.query_batch(default_user, queries)
+    individual_hits = [await text_search.query(default_user, query) for query in queries]
+
+    # Assert
+    assert len(hits_by_query) == len(queries)
+    for batch_hits, hits in zip(hits_by_query, individual_hits):
+        assert [hit.corpus_id for hit in batch_hits] == [hit.corpus_id for hit in hits]
+
+
+# ----------------------------------------------------------------------------------------------------
+@pytest.mark.django_db
+@pytest.mark.anyio
+async def test_text_search_batch_applies_filters_of_each_query(search_config: SearchConfig):
+    # Arrange
+    default_user = await KhojUser.objects.acreate(
+        username="test_user", password="test_password", email="test@example.com"
+    )
+    data = {
+        "journal.org": (
+            "* Went hiking in the mountains\n<2020-05-01 Fri>\n"
+            "* Went hiking along the coast\n<2022-06-01 Wed>\n"
+            "* Went hiking in the forest\n<2023-07-01 Sat>\n"
+        )
+    }
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, text_search.setup, OrgToEntries, data, True, True, default_user)
+
+    # Inferred queries contain their own date filters
+    queries = ["Where did I go hiking? dt>='2022-01-01' dt<'2023-01-01'", "Where did I go hiking?"]
+
+    # Act
+    hits_by_query = await text_search.query_batch(default_user, queries)
+
+    # Assert
+    assert len(hits_by_query[0]) == 1 and "along the coast" in hits_by_query[0][0].raw
+    assert len(hits_by_query[1]) == 3
+
+
+# ----------------------------------------------------------------------------------------------------
+def test_rerank_skipped_when_bi_encoder_ranking_is_decisive(monkeypatch):
+    # Arrange
+    monkeypatch.setattr(state, "rerank_skip_margin", 0.1)
+    decisive_hits = [
+        SearchResponse(entry="second", score=0.4, corpus_id="2", additional={"compiled": "second"}),
+        SearchResponse(entry="first", score=0.1, corpus_id="1", additional={"compiled": "first"}),
+    ]
+    skipped_before = text_search.rerank_stats["skipped"]
+
+    # Act
+    results = text_search.rerank_and_sort_results(
+        decisive_hits, query="query", rank_results=True, search_model_name="default"
+    )
+
+    # Assert
+    assert [result.entry for result in results] == ["first", "second"]
+    assert all(result.cross_score is None for result in results)
+    assert text_search.rerank_stats["skipped"] == skipped_before + 1
+
+
 # ----------------------------------------------------------------------------------------------------
 @pytest.mark.django_db
 def test_entry_chunking_by_max_tokens(org_config_with_only_new_file: LocalOrgConfig, default_user: KhojUser, caplog):
@@ -391,6 +587,205 @@ def test_update_index_with_new_entry(content_config: ContentConfig, new_org_file
     verify_embeddings(14, default_user)
 
 
+# ----------------------------------------------------------------------------------------------------
+@pytest.mark.django_db
+def test_update_index_queries_independent_of_number_of_files(default_user: KhojUser):
+    # Arrange
+    def get_org_notes(num_files: int, version: int):
+        return {f"notes/{idx}.org": f"* Note {idx} version {version}\nBody of note {idx}" for idx in range(num_files)}
+
+    text_search.setup(OrgToEntries, get_org_notes(20, version=1), regenerate=False, user=default_user)
+
+    # Act
+    with CaptureQueriesContext(connection) as few_files_queries:
+        text_search.setup(OrgToEntries, get_org_notes(2, version=2), regenerate=False, user=default_user)
+    with CaptureQueriesContext(connection) as many_files_queries:
+        text_search.setup(OrgToEntries, get_org_notes(20, version=3), regenerate=False, user=default_user)
+
+    # Assert
+    assert len(many_files_queries) == len(few_files_queries)
+    assert set(Entry.objects.filter(user=default_user).values_list("file_path", flat=True)) == set(
+        get_org_notes(20, version=3)
+    )
+    assert not Entry.objects.filter(user=default_user, raw__contains="version 1").exists()
+
+
+# ----------------------------------------------------------------------------------------------------
+@pytest.mark.django_db
+def test_update_index_skips_parsing_unchanged_files(default_user: KhojUser, monkeypatch):
+    # Arrange
+    org_notes = {f"notes/{idx}.org": f"* Note {idx}\nBody of note {idx}" for idx in range(3)}
+    text_search.setup(OrgToEntries, org_notes, regenerate=False, user=default_user)
+
+    parsed_files = []
+    extract_org_entries = OrgToEntries.extract_org_entries
+
+    def spy_extract_org_entries(org_files):
+        parsed_files.extend(org_files)
+        return extract_org_entries(org_files)
+
+    monkeypatch.setattr(OrgToEntries, "extract_org_entries", staticmethod(spy_extract_org_entries))
+    org_notes["notes/0.org"] = "* Note 0\nUpdated body of note 0"
+
+    # Act
+    text_search.setup(OrgToEntries, org_notes, regenerate=False, user=default_user)
+
+    # Assert
+    assert parsed_files == ["notes/0.org"]
+    assert Entry.objects.filter(user=default_user, raw__contains="Updated body of note 0").exists()
+    assert Entry.objects.filter(user=default_user, file_path="notes/2.org").exists()
+
+
+# ----------------------------------------------------------------------------------------------------
+@pytest.mark.django_db
+def test_collect_files_skips_reading_files_unchanged_since_indexed(
+    org_config_with_only_new_file: LocalOrgConfig, default_user: KhojUser
+):
+    # Arrange
+    new_file_to_index = Path(org_config_with_only_new_file.input_files[0])
+    new_file_to_index.write_text("* Heading\n- List item\n")
+    text_search.setup(OrgToEntries, collect_files(user=default_user)["org"], regenerate=False, user=default_user)
+    # Stats of file are recorded on the sync after its content is indexed
+    collect_files(user=default_user)
+
+    # Act
+    unchanged_org_files = collect_files(user=default_user)["org"]
+    new_file_to_index.write_text("* Heading\n- Updated list item\n")
+    changed_org_files = collect_files(user=default_user)["org"]
+
+    # Assert
+    assert unchanged_org_files == {}
+    assert changed_org_files == {str(new_file_to_index): "* Heading\n- Updated list item\n"}
+
+
+# ----------------------------------------------------------------------------------------------------
+@pytest.mark.django_db
+def test_update_index_skips_unchanged_html_files(default_user: KhojUser):
+    # Arrange
+    html_files = {"notes/page.html": "<html><body><h1>Page</h1><p>Body of web page</p></body></html>"}
+    text_search.setup(PlaintextToEntries, html_files, regenerate=False, user=default_user)
+
+    # Act
+    unchanged_files = IndexedFileAdapters.get_unchanged_files(default_user, html_files)
+
+    # Assert
+    # Manifest hashes original html content, not the text extracted from it
+    assert unchanged_files == {"notes/page.html"}
+    assert html_files["notes/page.html"].startswith("<html>")
+
+
+# ----------------------------------------------------------------------------------------------------
+@pytest.mark.django_db
+def test_regenerate_index_of_unchanged_files_keeps_entries(content_config: ContentConfig, default_user: KhojUser):
+    # Arrange
+    text_search.setup(OrgToEntries, collect_files(user=default_user)["org"], regenerate=True, user=default_user)
+    # Record stats of indexed files to skip reading them on later syncs
+    collect_files(user=default_user)
+    num_indexed_entries = Entry.objects.filter(user=default_user).count()
+
+    # Act
+    org_files = collect_files(user=default_user, regenerate=True)["org"]
+    text_search.setup(OrgToEntries, org_files, regenerate=True, user=default_user)
+
+    # Assert
+    assert num_indexed_entries > 0
+    assert Entry.objects.filter(user=default_user).count() == num_indexed_entries
+
+
+# ----------------------------------------------------------------------------------------------------
+@pytest.mark.django_db
+def test_regenerate_index_reuses_cached_embeddings(default_user: KhojUser, monkeypatch):
+    # Arrange
+    org_notes = {f"notes/{idx}.org": f"* Cached note {idx}\nBody of cached note {idx}" for idx in range(5)}
+    text_search.setup(OrgToEntries, org_notes, regenerate=True, user=default_user)
+    indexed_embeddings = dict(Entry.objects.filter(user=default_user).values_list("hashed_value", "embeddings"))
+
+    embeddings_model = state.embeddings_model[get_user_search_model_or_default(default_user).name]
+    embedded_texts = []
+    embed_documents = embeddings_model.embed_documents
+
+    def spy_embed_documents(docs):
+        embedded_texts.extend(docs)
+        return embed_documents(docs)
+
+    monkeypatch.setattr(embeddings_model, "embed_documents", spy_embed_documents)
+
+    # Act
+    text_search.setup(OrgToEntries, org_notes, regenerate=True, user=default_user)
+
+    # Assert
+    assert embedded_texts == []
+    regenerated_embeddings = dict(Entry.objects.filter(user=default_user).values_list("hashed_value", "embeddings"))
+    assert regenerated_embeddings.keys() == indexed_embeddings.keys()
+    for hashed_value, embeddings in regenerated_embeddings.items():
+        assert list(embeddings) == pytest.approx(list(indexed_embeddings[hashed_value]))
+
+
+# ----------------------------------------------------------------------------------------------------
+@pytest.mark.django_db
+def test_update_index_keeps_added_batches_when_interrupted(default_user: KhojUser, monkeypatch):
+    # Arrange
+    org_notes = {
+        f"notes/{idx}.org": f"* Note {idx}\nBody of note {idx} on 2024-01-{idx % 28 + 1:02d}" for idx in range(250)
+    }
+    embeddings_model = state.embeddings_model[get_user_search_model_or_default(default_user).name]
+    embed_documents = embeddings_model.embed_documents
+    num_embed_calls = 0
+
+    def embed_documents_until_interrupted(docs):
+        nonlocal num_embed_calls
+        num_embed_calls += 1
+        if num_embed_calls > 1:
+            raise RuntimeError("Indexing interrupted")
+        return embed_documents(docs)
+
+    monkeypatch.setattr(state, "index_pipeline_depth", 2)
+    monkeypatch.setattr(embeddings_model, "embed_documents", embed_documents_until_interrupted)
+
+    # Act
+    with pytest.raises(RuntimeError):
+        text_search.setup(OrgToEntries, org_notes, regenerate=False, user=default_user)
+    monkeypatch.setattr(embeddings_model, "embed_documents", embed_documents)
+    text_search.setup(OrgToEntries, org_notes, regenerate=False, user=default_user)
+
+    # Assert
+    # First batch of entries was added before indexing was interrupted. So only the remaining entries are embedded later
+    assert num_embed_calls == 2
+    assert Entry.objects.filter(user=default_user).count() == 250
+    assert EntryDates.objects.filter(entry__user=default_user).count() == 250
+
+
+# ----------------------------------------------------------------------------------------------------
+@pytest.mark.django_db
+def test_index_entries_with_date_bounds(org_config_with_only_new_file: LocalOrgConfig, default_user: KhojUser):
+    # Arrange
+    new_file_to_index = Path(org_config_with_only_new_file.input_files[0])
+    with open(new_file_to_index, "w") as f:
+        f.write(
+            "* Planned trip to Kilimanjaro\n- Booked flights on 2023-01-05 and returning on 2023-03-10\n"
+            "* Picked up groceries on 2023-02-14\n"
+            "* Someday maybe learn the Tango\n"
+        )
+    data = get_org_files(org_config_with_only_new_file)
+
+    # Act
+    text_search.setup(OrgToEntries, data, regenerate=True, user=default_user)
+
+    # Assert
+    trip_entry = Entry.objects.get(user=default_user, raw__contains="Kilimanjaro")
+    assert (trip_entry.min_date.isoformat(), trip_entry.max_date.isoformat()) == ("2023-01-05", "2023-03-10")
+    undated_entry = Entry.objects.get(user=default_user, raw__contains="Tango")
+    assert undated_entry.min_date is None and undated_entry.max_date is None
+
+    # Entries spanning the date range but without any date in it should not match
+    assert list(EntryAdapters.apply_filters(default_user, 'dt>="2023-01-20" dt<="2023-01-31"')) == []
+    filtered_entries = EntryAdapters.apply_filters(default_user, 'dt>="2023-02-01" dt<="2023-03-31"')
+    assert {entry.id for entry in filtered_entries} == {
+        trip_entry.id,
+        Entry.objects.get(user=default_user, raw__contains="groceries").id,
+    }
+
+
 # ----------------------------------------------------------------------------------------------------
 @pytest.mark.skipif(os.getenv("GITHUB_PAT_TOKEN") is None, reason="GITHUB_PAT_TOKEN not set")
 def test_text_search_setup_github(content_config: ContentConfig, default_user: KhojUser):
@@ -0,0 +1,126 @@
+# Standard Packages
+import threading
+
+import numpy as np
+import pytest
+
+# Internal Packages
+from khoj.utils.vector_index import UserVectorIndex
+
+
+@pytest.fixture(params=["float16", "float32"])
+def vector_index(request, tmp_path):
+    return UserVectorIndex(tmp_path / "user" / "1", dtype=request.param)
+
+
+# Test
+# ----------------------------------------------------------------------------------------------------
+def test_search_vector_index_returns_closest_entries(vector_index: UserVectorIndex):
+    # Arrange
+    vector_index.add(np.array([10, 20, 30]), np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.7, 0.7, 0.0]]))
+
+    # Act
+    ids, distances = vector_index.search(np.array([1.0, 0.1, 0.0]), max_results=2)
+
+    # Assert
+    assert ids.tolist() == [10, 30]
+    assert distances == pytest.approx([1 - 1 / np.sqrt(1.01), 1 - 1.1 / np.sqrt(2 * 1.01)], abs=1e-3)
+
+
+# ----------------------------------------------------------------------------------------------------
+def test_search_vector_index_with_mask_and_max_distance(vector_index: UserVectorIndex):
+    # Arrange
+    vector_index.add(np.array([10, 20, 30]), np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.7, 0.7, 0.0]]))
+    query = np.array([1.0, 0.0, 0.0])
+
+    # Act
+    masked_ids, _ = vector_index.search(query, max_results=3, mask=np.array([False, True, True]))
+    nearby_ids, _ = vector_index.search(query, max_results=3, max_distance=0.5)
+
+    # Assert
+    assert masked_ids.tolist() == [30, 20]
+    assert nearby_ids.tolist() == [10, 30]
+
+
+# ----------------------------------------------------------------------------------------------------
+def test_vector_index_does_not_modify_embeddings_of_caller(vector_index: UserVectorIndex):
+    # Arrange
+    embeddings = np.array([[3.0, 4.0, 0.0], [0.0, 2.0, 0.0]], dtype=np.float32)
+    query = np.array([2.0, 0.0, 0.0], dtype=np.float32)
+
+    # Act
+    vector_index.add(np.array([10, 20]), embeddings)
+    vector_index.search(query, max_results=2)
+
+    # Assert
+    assert embeddings.tolist() == [[3.0, 4.0, 0.0], [0.0, 2.0, 0.0]]
+    assert query.tolist() == [2.0, 0.0, 0.0]
+
+
+# ----------------------------------------------------------------------------------------------------
+def test_removed_entries_excluded_from_vector_index(vector_index: UserVectorIndex):
+    # Arrange
+    vector_index.add(np.array([10, 20]), np.array([[1.0, 0.0], [0.0, 1.0]]))
+    vector_index.add(np.array([30]), np.array([[0.7, 0.7]]))
+
+    # Act
+    vector_index.remove({10})
+    ids_after_removal, _ = vector_index.search(np.array([1.0, 0.0]), max_results=3)
+    # Removing most entries compacts the index
+    vector_index.remove({30})
+
+    # Assert
+    assert ids_after_removal.tolist() == [30, 20]
+    assert vector_index.ids.tolist() == [20]
+    assert vector_index.get_ids() == {20}
+
+
+# ----------------------------------------------------------------------------------------------------
+def test_vector_index_persists_across_instances(vector_index: UserVectorIndex):
+    # Arrange
+    vector_index.add(np.array([10, 20]), np.array([[1.0, 0.0], [0.0, 1.0]]))
+    vector_index.set_generation(3)
+
+    # Act
+    reopened_index = UserVectorIndex(vector_index.directory)
+    ids, _ = reopened_index.search(np.array([0.0, 1.0]), max_results=1)
+
+    # Assert
+    assert reopened_index.generation == 3
+    assert reopened_index.embeddings.dtype == vector_index.embeddings.dtype
+    assert ids.tolist() == [20]
+
+
+# ----------------------------------------------------------------------------------------------------
+def test_concurrent_syncs_of_vector_index_from_separate_instances_add_entries_once(vector_index: UserVectorIndex):
+    "Separate instances on the same index directory emulate server processes syncing the same user concurrently"
+    # Arrange
+    instances = [UserVectorIndex(vector_index.directory) for _ in range(4)]
+    current_ids = set(range(100))
+    embeddings = {id: [1.0, float(id)] for id in current_ids}
+    start = threading.Barrier(len(instances))
+
+    def sync(instance: UserVectorIndex):
+        start.wait()
+        with instance.locked():
+            if instance.generation == 1:
+                return
+            missing_ids = sorted(current_ids - instance.get_ids())
+            for batch_start in range(0, len(missing_ids), 10):
+                batch = missing_ids[batch_start : batch_start + 10]
+                instance.add(np.array(batch), np.array([embeddings[id] for id in batch]))
+            instance.set_generation(1)
+
+    # Act
+    threads = [threading.Thread(target=sync, args=(instance,)) for instance in instances]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with vector_index.locked():
+        indexed_ids = vector_index.ids.tolist()
+
+    # Assert
+    assert sorted(indexed_ids) == sorted(current_ids)
+    assert vector_index.embeddings.shape == (len(current_ids), 2)
+    assert vector_index.generation == 1
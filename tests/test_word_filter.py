@@ -73,6 +73,18 @@ def test_get_word_filter_terms():
     assert filter_terms == ["+include_word", "-exclude_word"]
 
 
+# ----------------------------------------------------------------------------------------------------
+def test_escape_like_special_characters_in_word():
+    # Arrange
+    word_filter = WordFilter()
+
+    # Act
+    escaped_word = word_filter.escape_like("include_word-100%")
+
+    # Assert
+    assert escaped_word == "include\\_word-100\\%"
+
+
 def arrange_content():
     entries = [
         Entry(compiled="", raw="Minimal Entry"),